@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2019-2021 Lovac42
+# Support: https://github.com/lovac42/SpellingPolice
+# License: GNU GPL, version 3 or later; http://www.gnu.org/copyleft/gpl.html
+
+
+# Synthetic, deterministic .bdic fixtures and word samples.
+
+
+import random
+
+from spelling_police.bdicwriter import BDictWriter
+
+
+# the first bytes of chromium's en-US-10-1.bdic: signature, version 2.0
+# and the .aff section right after the 32 byte header
+REAL_HEADER = b"BDic\x02\x00\x00\x00\x20\x00\x00\x00"
+
+SIZES = {
+    "small": 2000,
+    "medium": 20000,
+    "large": 80000,
+}
+
+ONSETS = ["", "b", "br", "c", "ch", "d", "f", "g", "gr", "h", "k", "l", "m",
+    "n", "p", "pr", "qu", "r", "s", "sh", "st", "t", "th", "tr", "v", "w"]
+VOWELS = ["a", "e", "i", "o", "u", "ea", "ou", "ai", "y"]
+CODAS = ["", "", "n", "r", "s", "t", "l", "m", "nd", "st", "ck", "ng"]
+
+AFFIX_GROUPS = ["S", "SD", "SDG", "SG", "U", "USD"]
+
+AFFIX_RULES = [
+    "SFX S Y 3",
+    "SFX S 0 s [^sxy]",
+    "SFX S 0 es [sx]",
+    "SFX S y ies [^aeiou]y",
+    "SFX D Y 2",
+    "SFX D 0 ed [^e]",
+    "SFX D 0 d e",
+    "SFX G Y 2",
+    "SFX G 0 ing [^e]",
+    "SFX G e ing e",
+    "PFX U Y 1",
+    "PFX U 0 un .",
+]
+
+
+def syllable(rnd):
+    return rnd.choice(ONSETS) + rnd.choice(VOWELS) + rnd.choice(CODAS)
+
+
+def makeStems(n, seed=42):
+    rnd = random.Random(seed)
+    stems = set()
+    while len(stems) < n:
+        stems.add("".join(syllable(rnd) for _ in range(rnd.randint(1, 4))))
+    return sorted(stems)
+
+
+def writeFixture(path, n, seed=42):
+    "Writes a dictionary of n stems, returns the stems"
+    rnd = random.Random(seed)
+    w = BDictWriter()
+    w.comment = "synthetic fixture, %d stems"%n
+    w.affixGroups = list(AFFIX_GROUPS)
+    w.affixRules = list(AFFIX_RULES)
+    w.otherCommands = ["SET UTF-8", "TRY esianrtolcdugmphbyfvkwz"]
+    stems = makeStems(n, seed)
+    for s in stems:
+        w.addWord(s, [rnd.randint(0, len(AFFIX_GROUPS))])
+    w.write(path)
+    checkHeader(path)
+    return stems
+
+
+def checkHeader(path):
+    "Fixtures must start like a real dictionary, or chromium won't load them"
+    with open(path, "rb") as f:
+        head = f.read(len(REAL_HEADER))
+    if head != REAL_HEADER:
+        raise ValueError("%s: header %r is not chromium's %r"%(
+            path, head, REAL_HEADER))
+
+
+def writeHunspell(dicPath, affPath, stems, seed=42):
+    "The same kind of dictionary as a hunspell .dic/.aff pair"
+    rnd = random.Random(seed)
+    with open(affPath, "w", encoding="utf-8") as f:
+        f.write("SET UTF-8\nTRY esianrtolcdugmphbyfvkwz\n")
+        f.write("\n".join(AFFIX_RULES) + "\n")
+    with open(dicPath, "w", encoding="utf-8") as f:
+        f.write("%d\n"%len(stems))
+        for s in stems:
+            g = rnd.randint(0, len(AFFIX_GROUPS))
+            f.write(s + ("/" + AFFIX_GROUPS[g-1] if g else "") + "\n")
+
+
+def misspell(word, rnd):
+    i = rnd.randrange(len(word))
+    op = rnd.randrange(3)
+    if op == 0:
+        return word[:i] + word[i+1:] or word + "x"
+    if op == 1:
+        return word[:i] + rnd.choice("aeiouxz") + word[i:]
+    return word[:i] + "q" + word[i+1:]
+
+
+def sampleWords(stems, n, errorRate=0.2, seed=7):
+    "Mostly correct words with some misspellings, like real text"
+    rnd = random.Random(seed)
+    out = []
+    for _ in range(n):
+        w = rnd.choice(stems)
+        if rnd.random() < errorRate:
+            w = misspell(w, rnd)
+        elif rnd.random() < 0.3:
+            w = w + rnd.choice(["s", "ed", "ing"])
+        out.append(w)
+    return out
+
+
+FIELDS = [
+    "The <b>mitochondria</b> is the powerhouse of the cell.<br>See also: "
+    "<i>chloroplast</i>&nbsp;(plants)",
+    "{{c1::Paris::capital}} is the capital of {{c2::France}}.",
+    "<div>Der Hund l&auml;uft schnell &amp; bellt.</div><div><br></div>",
+    "[sound:pronunciation_word_1234.mp3] 漢字[かんじ] kanji",
+    "Einstein's equation [$]E = mc^2[/$] relates mass and energy.",
+    "<ul><li>first item</li><li>second itme with a typo</li></ul>",
+    "<img src=\"paste-1234567890.jpg\"> <span style=\"color: "
+    "rgb(255, 0, 0);\">red text</span> and \\(x^2\\) MathJax",
+]
@@ -0,0 +1,398 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2019-2021 Lovac42
+# Support: https://github.com/lovac42/SpellingPolice
+# License: GNU GPL, version 3 or later; http://www.gnu.org/copyleft/gpl.html
+
+
+# Headless benchmarks for the addon, run from the repository root:
+#
+#   python bench/run.py --out bench.json
+#   python bench/run.py --baseline bench.json --threshold 0.15
+#
+# aqt and anki are replaced by the stubs in stubs.py and the dictionaries
+# are synthetic (fixtures.py). Times are per operation, lower is better.
+# With --baseline, benchmarks whose median got slower by more than the
+# threshold are reported and the exit code is 1.
+
+
+import argparse, json, os, platform, re, shutil, sys, tempfile, time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, os.pardir, "src"))
+sys.path.insert(0, HERE)
+
+import stubs
+
+
+BENCHMARKS = []
+
+def benchmark(fn):
+    BENCHMARKS.append(fn)
+    return fn
+
+
+def stats(samples, n=1):
+    "samples: ns per batch of n operations"
+    per = sorted(s / n / 1000.0 for s in samples)
+    mid = per[len(per)//2]
+    return {
+        "runs": len(per),
+        "ops_per_run": n,
+        "median_us": round(mid, 3),
+        "p95_us": round(per[min(len(per)-1, int(len(per)*0.95))], 3),
+        "min_us": round(per[0], 3),
+        "mean_us": round(sum(per) / len(per), 3),
+        "ops_per_s": round(1e6 / mid, 1) if mid else None,
+    }
+
+
+def timeEach(fn, args, warmup=10):
+    "Times fn(arg) once per arg"
+    clock = time.perf_counter_ns
+    for a in args[:warmup]:
+        fn(a)
+    samples = []
+    for a in args:
+        t = clock()
+        fn(a)
+        samples.append(clock() - t)
+    return stats(samples)
+
+
+def timeBatch(fn, items, repeat=5, n=None):
+    "Times fn over all items, repeat times. n: operations per item batch"
+    clock = time.perf_counter_ns
+    samples = []
+    for _ in range(repeat):
+        t = clock()
+        for i in items:
+            fn(i)
+        samples.append(clock() - t)
+    return stats(samples, n or len(items))
+
+
+def timeOnce(fn):
+    t = time.perf_counter_ns()
+    ret = fn()
+    return stats([time.perf_counter_ns() - t]), ret
+
+
+class Context:
+    def __init__(self, base, sizes):
+        self.base = base
+        self.dictDir = os.path.join(base, "dictionaries")
+        self.cacheDir = os.path.join(self.dictDir, "spelling_police_cache")
+        self.sizes = sizes
+        self.fixtures = {} # size: (path, stems)
+
+
+def waitForCatalog(catalog, timeout=120):
+    end = time.time() + timeout
+    while time.time() < end:
+        stubs.processEvents()
+        if not catalog.isChecking():
+            break
+        time.sleep(0.01)
+
+
+# Python side engines
+
+@benchmark
+def lookups(ctx):
+    from spelling_police.bdic import BDict
+    from spelling_police.dawg import Dawg, compileDictionary
+    from spelling_police.verdictcache import VerdictCache
+    from spelling_police import hashset
+    from fixtures import sampleWords
+
+    for size, (path, stems) in ctx.fixtures.items():
+        words = sampleWords(stems, 5000)
+        with BDict(path) as d:
+            yield "lookup/%s/bdict_isCorrect"%size, timeBatch(d.isCorrect, words)
+
+        st, compiled = timeOnce(lambda: compileDictionary(path, ctx.cacheDir, True))
+        yield "build/%s/dawg_compile"%size, st
+        with Dawg(compiled) as d:
+            yield "lookup/%s/dawg_isCorrect"%size, timeBatch(d.isCorrect, words)
+            yield "lookup/%s/dawg_prefix"%size, timeBatch(
+                lambda w: next(d.words(w[:3]), None), words[:1000])
+
+        # real text repeats words, the cache is filled on the first repeat
+        with BDict(path) as d:
+            cache = VerdictCache("bench")
+            yield "lookup/%s/cached_isCorrect"%size, timeBatch(
+                lambda w: cache.isCorrect(w, d.isCorrect), words)
+
+        if hashset.HAVE_NUMPY:
+            st, _ = timeOnce(lambda: hashset.buildHashes(path, True))
+            yield "build/%s/hash_array"%size, st
+            batch = hashset.BatchChecker.load([path])
+            yield "lookup/%s/batch_contains"%size, timeBatch(
+                batch.contains, [words], 5, len(words))
+
+
+@benchmark
+def conversion(ctx):
+    from concurrent.futures import ProcessPoolExecutor
+    from spelling_police.dicconvert import convertDictionary
+    from fixtures import writeHunspell, checkHeader
+
+    folder = os.path.join(ctx.base, "hunspell")
+    os.makedirs(folder, exist_ok=True)
+    for size, (path, stems) in ctx.fixtures.items():
+        dic = os.path.join(folder, size + ".dic")
+        aff = os.path.join(folder, size + ".aff")
+        out = os.path.join(folder, size + ".bdic")
+        writeHunspell(dic, aff, stems)
+        st, _ = timeOnce(lambda: convertDictionary(dic, aff, out))
+        checkHeader(out)
+        yield "build/%s/dic_convert"%size, st
+        with ProcessPoolExecutor() as ex:
+            st, _ = timeOnce(lambda: convertDictionary(dic, aff, out, ex))
+        yield "build/%s/dic_convert_parallel"%size, st
+
+
+@benchmark
+def frequencies(ctx):
+    from collections import Counter
+    from spelling_police.wordfreq import FrequencyTable
+    from fixtures import sampleWords
+
+    for size, (path, stems) in ctx.fixtures.items():
+        table = FrequencyTable(os.path.join(ctx.base, "wordfreq-%s.bin"%size))
+        words = sampleWords(stems, 20000)
+        st, _ = timeOnce(lambda: table.add(Counter(words)))
+        yield "build/%s/frequency_table"%size, st
+        sugs = [words[i:i+8] for i in range(0, 8000, 8)]
+        yield "lookup/%s/frequency_rank"%size, timeBatch(
+            lambda s: table.rank(s, 5), sugs)
+        note = " ".join(words[:40])
+        yield "lookup/%s/frequency_note_update"%size, timeBatch(
+            lambda i: table.update(note, note + " " + words[i]), range(1000))
+        table.close()
+
+
+# the regex chain the tokenizer replaced, for reference
+RE_OLD_CLOZE = re.compile(r"\{\{c\d+::(.*?)(?:::[^}]*?)?\}\}", re.S)
+RE_OLD_SKIP = re.compile(
+    r"(?is)<(style|script)\b.*?</\1>"
+    r"|\[(latex|\$\$?)\].*?\[/\2\]"
+    r"|\[sound:[^\]]*\]"
+    r"|<[^>]*>"
+    r"|&[#\w]+;"
+)
+RE_OLD_WORD = re.compile(r"[^\W\d_]+(?:['’][^\W\d_]+)*")
+
+def regexChain(html):
+    text = RE_OLD_CLOZE.sub(r"\1", html)
+    text = RE_OLD_SKIP.sub(" ", text)
+    return RE_OLD_WORD.findall(text)
+
+
+@benchmark
+def tokenizers(ctx):
+    from spelling_police.tokenizer import tokenize, spans
+    from fixtures import FIELDS
+
+    long = ["".join(FIELDS[i % len(FIELDS)] for i in range(40))] * 20
+    for name, fields in (("fields", FIELDS * 100), ("long_field", long)):
+        yield "tokenize/%s/regex_chain"%name, timeBatch(regexChain, fields)
+        yield "tokenize/%s/tokenize"%name, timeBatch(tokenize, fields)
+        yield "tokenize/%s/spans"%name, timeBatch(
+            lambda f: list(spans(f)), fields)
+
+
+@benchmark
+def suggestions(ctx):
+    from spelling_police.symspell import SymSpellIndex, buildIndex
+    from fixtures import sampleWords
+
+    for size, (path, stems) in ctx.fixtures.items():
+        idx = os.path.join(ctx.cacheDir, "bench-%s.idx"%size)
+        st, _ = timeOnce(lambda: buildIndex([path], idx, cacheDir=ctx.cacheDir))
+        yield "build/%s/symspell_index"%size, st
+        index = SymSpellIndex(idx)
+        typos = sampleWords(stems, 500, errorRate=1.0)
+        yield "suggest/%s/symspell_lookup"%size, timeBatch(index.lookup, typos, 3)
+        index.close()
+
+
+# Addon hooks
+
+@benchmark
+def webviews(ctx):
+    profile = stubs.DEFAULT_PROFILE
+    before = dict(profile.calls)
+    n = 2000
+    r = timeEach(lambda _: stubs.AnkiWebView(),
+        list(range(n)), warmup=0)
+    for k, v in profile.calls.items():
+        r[k+"_per_op"] = round((v - before[k]) / float(n), 3)
+    r["state"] = dict(ctx.addon.spellState.stats)
+    yield "hooks/setupBDIC_webview_init", r
+
+
+@benchmark
+def contextMenu(ctx):
+    sp = ctx.addon
+    web = stubs.AnkiWebView()
+    web._page.menuData = stubs.ContextMenuData(
+        "helo", ["hello", "help", "hell", "hero", "halo"])
+    stubs.DEFAULT_PROFILE.enabled = True
+
+    def run(_):
+        menu = stubs.QMenu()
+        menu.addAction("Copy")
+        sp.onContextMenuEvent(web, menu)
+
+    for name, conf in (
+        ("plain", {"duck_mode": False}),
+        ("duck_mode", {"duck_mode": True, "suggestion_engine": "chromium"}),
+        ("duck_mode_symspell", {"duck_mode": True, "suggestion_engine": "symspell"}),
+    ):
+        if name.endswith("symspell") and not ctx.symspellIndex:
+            continue
+        sp.conf.config.update(conf)
+        yield "hooks/contextmenu_%s"%name, timeEach(run, list(range(2000)))
+    sp.conf.config.update({"duck_mode": False, "suggestion_engine": "chromium"})
+
+
+@benchmark
+def dictionaryDialog(ctx):
+    from spelling_police import dict as dictmod
+    from spelling_police.catalog import DictionaryCatalog, CATALOG_NAME
+    from fixtures import writeFixture
+
+    # hundreds of files, mostly disabled
+    for i in range(300):
+        p = os.path.join(ctx.dictDir, "xx-%03d.bdic"%i)
+        writeFixture(p, 50, seed=i)
+        if i >= 10:
+            os.rename(p, p+".disabled")
+
+    catalog = dictmod.getCatalog()
+    st, _ = timeOnce(catalog.refresh)
+    waitForCatalog(catalog)
+    yield "catalog/refresh_300_new_files", st
+
+    os.remove(os.path.join(ctx.dictDir, CATALOG_NAME))
+    def cold():
+        c = DictionaryCatalog()
+        waitForCatalog(c)
+    st, _ = timeOnce(cold)
+    yield "catalog/cold_inspect_300_files", st
+
+    yield "catalog/refresh_unchanged_300", timeEach(
+        lambda _: catalog.refresh(), list(range(50)))
+    dialog = dictmod.DictionaryDialog()
+    yield "dialog/update_300_files", timeEach(
+        lambda _: dialog._update(), list(range(50)))
+    yield "dialog/open_300_files", timeEach(
+        lambda _: dictmod.DictionaryDialog().done(0), list(range(20)), warmup=2)
+
+
+# Driver
+
+def run(args):
+    sizes = args.sizes.split(",")
+    base = tempfile.mkdtemp(prefix="spbench-")
+    ctx = Context(base, sizes)
+    os.makedirs(ctx.dictDir)
+    results = {}
+    try:
+        stubs.install(base)
+        from fixtures import writeFixture, SIZES
+        for size in sizes:
+            path = os.path.join(ctx.dictDir, "bench-%s.bdic"%size)
+            ctx.fixtures[size] = (path, writeFixture(path, SIZES[size]))
+
+        # the package is imported with the fixture writer, already timed
+        from spelling_police.startup import timer
+        from spelling_police import spellpopo
+        ctx.addon = spellpopo
+        spellpopo.STARTUP_LOG = os.path.join(base, "startup_times.json")
+        stubs.runHook("profileLoaded")
+        from spelling_police.catalog import getCatalog
+        waitForCatalog(getCatalog())
+        ctx.symspellIndex = None
+        for phase, ms in timer.phases.items():
+            results["startup/"+phase] = r = stats([ms * 1e6])
+            print("%-45s %12.3f us"%("startup/"+phase, r["median_us"]))
+
+        for fn in BENCHMARKS:
+            if args.only and fn.__name__ not in args.only.split(","):
+                continue
+            for name, r in fn(ctx):
+                results[name] = r
+                print("%-45s %12.3f us  (p95 %.3f)"%(
+                    name, r["median_us"], r["p95_us"]), flush=True)
+                if name.startswith("build/") and name.endswith("symspell_index"):
+                    _loadIndex(ctx, spellpopo)
+    finally:
+        shutil.rmtree(base, ignore_errors=True)
+
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "sizes": sizes,
+        },
+        "results": results,
+    }
+
+
+def _loadIndex(ctx, spellpopo):
+    "Hands the last symspell index to the addon for the context menu bench"
+    from spelling_police.symspell import SymSpellIndex
+    idx = sorted(f for f in os.listdir(ctx.cacheDir) if f.endswith(".idx"))
+    if idx:
+        path = os.path.join(ctx.cacheDir, idx[-1])
+        # update() would open the suggestion cache along with the index
+        spellpopo.suggester._resetCache("bench", 2)
+        spellpopo.suggester._setIndex(SymSpellIndex(path), path)
+        ctx.symspellIndex = path
+
+
+def compare(results, baseline, threshold):
+    "Returns the names of benchmarks that regressed"
+    regressed = []
+    print("\n%-45s %12s %12s %8s"%("benchmark", "baseline", "current", "change"))
+    for name, r in sorted(results["results"].items()):
+        old = baseline["results"].get(name)
+        if not old or not old.get("median_us"):
+            continue
+        change = (r["median_us"] - old["median_us"]) / old["median_us"]
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressed.append(name)
+        print("%-45s %12.3f %12.3f %+7.1f%%%s"%(
+            name, old["median_us"], r["median_us"], change*100, flag))
+    return regressed
+
+
+def main():
+    ap = argparse.ArgumentParser(description="SpellingPolice benchmarks")
+    ap.add_argument("--sizes", default="small,medium,large",
+        help="fixture sizes to run (small, medium, large)")
+    ap.add_argument("--only", help="comma separated benchmark functions")
+    ap.add_argument("--out", help="write results as JSON to this file")
+    ap.add_argument("--baseline", help="JSON results to compare against")
+    ap.add_argument("--threshold", type=float, default=0.15,
+        help="relative slowdown counted as a regression")
+    args = ap.parse_args()
+
+    results = run(args)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=1, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,374 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2019-2021 Lovac42
+# Support: https://github.com/lovac42/SpellingPolice
+# License: GNU GPL, version 3 or later; http://www.gnu.org/copyleft/gpl.html
+
+
+# Minimal stand-ins for the aqt and anki modules, enough to import the
+# addon and drive its hooks without Qt or a display. Calls into the web
+# profile are counted so benchmarks can report them.
+
+
+import json, queue, sys, threading, types
+
+
+# emits from other threads are delivered by processEvents, like queued
+# connections in Qt
+_events = queue.Queue()
+
+def processEvents():
+    while True:
+        try:
+            fn, args = _events.get_nowait()
+        except queue.Empty:
+            return
+        fn(*args)
+
+
+class BoundSignal:
+    def __init__(self):
+        self.slots = []
+
+    def connect(self, fn):
+        self.slots.append(fn)
+
+    def disconnect(self, fn=None):
+        if fn is None:
+            self.slots = []
+        elif fn in self.slots:
+            self.slots.remove(fn)
+
+    def emit(self, *args):
+        queued = threading.current_thread() is not threading.main_thread()
+        for fn in list(self.slots):
+            if queued:
+                _events.put((fn, args))
+            else:
+                fn(*args)
+
+
+class pyqtSignal:
+    def __init__(self, *types):
+        pass
+
+    def __set_name__(self, owner, name):
+        self.name = "_signal_" + name
+
+    def __get__(self, obj, owner):
+        if obj is None:
+            return self
+        return obj.__dict__.setdefault(self.name, BoundSignal())
+
+
+class Anything:
+    "Accepts any constructor args and method calls"
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return Anything()
+
+    def __call__(self, *args, **kwargs):
+        return Anything()
+
+    def __bool__(self):
+        return False
+
+
+class QObject(Anything):
+    def __bool__(self):
+        return True
+
+
+class QTimer(QObject):
+    timeout = pyqtSignal()
+
+    @staticmethod
+    def singleShot(ms, fn):
+        fn()
+
+
+class QFileSystemWatcher(QObject):
+    directoryChanged = pyqtSignal(str)
+
+
+class QFont(Anything):
+    def setBold(self, b):
+        self.bold = b
+
+
+class QAction(QObject):
+    triggered = pyqtSignal()
+
+    def __init__(self, text="", parent=None):
+        self._text = text
+        self._font = QFont()
+
+    def text(self):
+        return self._text
+
+    def font(self):
+        return self._font
+
+    def setFont(self, f):
+        self._font = f
+
+
+class QMenu(QObject):
+    def __init__(self, title="", parent=None):
+        self._actions = []
+
+    def actions(self):
+        return list(self._actions)
+
+    def addAction(self, a, *args):
+        if not isinstance(a, QAction):
+            a = QAction(a)
+        self._actions.append(a)
+        return a
+
+    def insertAction(self, before, a):
+        if a in self._actions:
+            self._actions.remove(a)
+        self._actions.insert(self._actions.index(before), a)
+
+    def addSeparator(self):
+        return self.addAction(QAction("-"))
+
+    def insertSeparator(self, before):
+        a = QAction("-")
+        self._actions.insert(self._actions.index(before), a)
+        return a
+
+    def addMenu(self, title):
+        m = QMenu(title)
+        self._actions.append(QAction(title))
+        return m
+
+
+class QListWidgetItem(Anything):
+    def __init__(self, text=""):
+        self._text = text
+        self._data = {}
+        self._selected = False
+
+    def text(self):
+        return self._text
+
+    def setText(self, t):
+        self._text = t
+
+    def data(self, role):
+        return self._data.get(role)
+
+    def setData(self, role, value):
+        self._data[role] = value
+
+    def isSelected(self):
+        return self._selected
+
+    def setSelected(self, b):
+        self._selected = b
+
+
+class QListWidget(QObject):
+    itemDoubleClicked = pyqtSignal()
+
+    def __init__(self, *args):
+        self._items = []
+
+    def clear(self):
+        self._items = []
+
+    def addItem(self, item):
+        self._items.append(item)
+
+    def count(self):
+        return len(self._items)
+
+    def item(self, i):
+        return self._items[i]
+
+
+class QPushButton(QObject):
+    clicked = pyqtSignal()
+
+
+class QDialog(QObject):
+    def exec_(self):
+        return 0
+
+    def done(self, r):
+        pass
+
+
+class Qt:
+    UserRole = 0x100
+    WindowModal = 1
+    NonModal = 0
+    ApplicationShortcut = 2
+
+
+class QAbstractItemView:
+    ExtendedSelection = 3
+
+
+class Profile:
+    "QWebEngineProfile, counts the calls that make chromium reload"
+
+    def __init__(self):
+        self.enabled = False
+        self.languages = []
+        self.calls = {"setSpellCheckEnabled": 0, "setSpellCheckLanguages": 0}
+
+    def isSpellCheckEnabled(self):
+        return self.enabled
+
+    def setSpellCheckEnabled(self, b):
+        self.calls["setSpellCheckEnabled"] += 1
+        self.enabled = b
+
+    def spellCheckLanguages(self):
+        return list(self.languages)
+
+    def setSpellCheckLanguages(self, langs):
+        self.calls["setSpellCheckLanguages"] += 1
+        self.languages = list(langs)
+
+
+class ContextMenuData:
+    def __init__(self, word="", suggestions=()):
+        self.word = word
+        self.suggestions = list(suggestions)
+
+    def misspelledWord(self):
+        return self.word
+
+    def spellCheckerSuggestions(self):
+        return list(self.suggestions)
+
+
+DEFAULT_PROFILE = Profile()
+
+
+class Page:
+    def __init__(self):
+        self.menuData = ContextMenuData()
+        self.replaced = []
+
+    def profile(self):
+        return DEFAULT_PROFILE
+
+    def contextMenuData(self):
+        return self.menuData
+
+    def replaceMisspelledWord(self, w):
+        self.replaced.append(w)
+
+
+class AnkiWebView(QObject):
+    def __init__(self, parent=None, title="default"):
+        self._page = Page()
+        self.title = title
+
+
+class ProfileManager:
+    def __init__(self, base):
+        self.base = base
+        self.name = "User 1"
+
+    def profileFolder(self):
+        return self.base
+
+
+class MainWindow(Anything):
+    def __init__(self, base):
+        self.pm = ProfileManager(base)
+        self.form = types.SimpleNamespace(menuTools=QMenu("Tools"))
+        self.web = AnkiWebView()
+        self.state = "deckBrowser"
+        self.col = None
+        self.addonManager = Anything()
+        self.progress = Anything()
+
+
+# anki.hooks
+
+_hooks = {}
+
+def addHook(name, fn):
+    _hooks.setdefault(name, []).append(fn)
+
+def remHook(name, fn):
+    if fn in _hooks.get(name, []):
+        _hooks[name].remove(fn)
+
+def runHook(name, *args):
+    for fn in list(_hooks.get(name, [])):
+        fn(*args)
+
+def runFilter(name, arg, *args):
+    for fn in list(_hooks.get(name, [])):
+        arg = fn(arg, *args)
+    return arg
+
+def wrap(old, new, pos="after"):
+    def repl(*args, **kwargs):
+        if pos == "after":
+            old(*args, **kwargs)
+            return new(*args, **kwargs)
+        elif pos == "before":
+            new(*args, **kwargs)
+            return old(*args, **kwargs)
+        return new(_old=old, *args, **kwargs)
+    return repl
+
+
+def install(base):
+    "Puts the stub modules in sys.modules, returns the fake main window"
+    mw = MainWindow(base)
+
+    def module(name, **attrs):
+        m = types.ModuleType(name)
+        m.__dict__.update(attrs)
+        sys.modules[name] = m
+        return m
+
+    qt = dict(
+        qtminor=15, qtmajor=5, pyqtSignal=pyqtSignal,
+        QObject=QObject, QTimer=QTimer, QFileSystemWatcher=QFileSystemWatcher,
+        QAction=QAction, QMenu=QMenu, QFont=QFont, QDialog=QDialog,
+        QListWidget=QListWidget, QListWidgetItem=QListWidgetItem,
+        QPushButton=QPushButton, Qt=Qt, QAbstractItemView=QAbstractItemView,
+    )
+    for name in ("QVBoxLayout", "QHBoxLayout", "QBrush", "QColor", "QLabel",
+            "QProgressDialog", "QTableWidget", "QTableWidgetItem",
+            "QKeySequence", "QShortcut", "QFileDialog", "QLineEdit",
+            "QInputDialog", "QCheckBox", "QComboBox", "QDialogButtonBox",
+            "QHeaderView", "QPlainTextEdit", "QThread", "QApplication",
+            "QWebEngineProfile", "QWebEngineScript", "QActionGroup"):
+        qt[name] = type(name, (Anything,), {})
+
+    module("aqt", mw=mw, moduleDir=base)
+    module("aqt.qt", **qt)
+    module("aqt.webview", AnkiWebView=AnkiWebView)
+    module("aqt.editor", Editor=type("Editor", (Anything,),
+            {"onBridgeCmd": lambda self, cmd: None}),
+        EditorWebView=type("EditorWebView", (AnkiWebView,), {}))
+    module("aqt.reviewer", Reviewer=type("Reviewer", (Anything,), {}))
+    noop = lambda *a, **k: None
+    module("aqt.utils", showInfo=noop, showText=noop, showWarning=noop,
+        tooltip=noop, openFolder=noop, getText=lambda *a, **k: ("", False),
+        askUser=lambda *a, **k: False)
+    module("anki", version="2.1.35")
+    module("anki.hooks", addHook=addHook, remHook=remHook, runHook=runHook,
+        runFilter=runFilter, wrap=wrap, _hooks=_hooks)
+    module("anki.lang", _=lambda s: s)
+    module("anki.notes", Note=type("Note", (Anything,),
+            {"flush": lambda self, *args, **kwargs: None}))
+    module("anki.utils", json=json)
+    sys.modules["aqt"].qt = sys.modules["aqt.qt"]
+    return mw
@@ -9,4 +9,11 @@
 
 #from .lib.com.lovac42.anki.others import safety_first
 
-from . import spellpopo
+import sys
+
+# python -m spelling_police runs without anki
+if "aqt" in sys.modules:
+    from .startup import timer
+    timer.start("import")
+    from . import spellpopo
+    timer.stop("import")
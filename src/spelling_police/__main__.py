@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2019-2021 Lovac42
+# Support: https://github.com/lovac42/SpellingPolice
+# License: GNU GPL, version 3 or later; http://www.gnu.org/copyleft/gpl.html
+
+
+# Headless checker, no Qt or aqt needed:
+#
+#   python -m spelling_police -d ~/dictionaries deck.apkg notes.tsv words.txt
+#
+# Plain text is checked line by line, .csv/.tsv row by row and .apkg note
+# by note. Input is read in chunks that are checked in a process pool, at
+# most a few chunks are held in memory. Misspellings are printed as JSON
+# lines, or with --summary as a count per word. Exits with 1 if anything
+# was misspelled.
+
+
+import argparse, csv, json, os, shutil, sqlite3, sys, tempfile, zipfile
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+
+from .checker import FIELD_SEP, initWorker, checkNotes
+from .dawg import compileAll
+from .hashset import buildAll
+from .verdictcache import CACHE_NAME
+
+
+TEXT, CSV, TSV, APKG = "text", "csv", "tsv", "apkg"
+
+EXTENSIONS = {
+    ".csv": CSV,
+    ".tsv": TSV,
+    ".apkg": APKG,
+    ".colpkg": APKG,
+}
+
+
+def inputType(path, forced=None):
+    if forced:
+        return forced
+    return EXTENSIONS.get(os.path.splitext(path)[1].lower(), TEXT)
+
+
+def readText(f):
+    for i, line in enumerate(f, 1):
+        yield i, None, line.rstrip("\r\n")
+
+
+def readDelimited(f, delimiter):
+    lines = iter(f)
+    # anki exports start with "#key:value" lines
+    n = 0
+    for line in lines:
+        n += 1
+        if not line.startswith("#"):
+            lines = _chain(line, lines)
+            break
+        if line.lower().startswith("#separator:"):
+            sep = line.split(":", 1)[1].strip().lower()
+            delimiter = {"tab": "\t", "comma": ",", "semicolon": ";",
+                "pipe": "|", "space": " "}.get(sep, delimiter)
+    else:
+        return
+    for i, row in enumerate(csv.reader(lines, delimiter=delimiter), n):
+        yield i, None, FIELD_SEP.join(row)
+
+
+def _chain(first, rest):
+    yield first
+    yield from rest
+
+
+def fieldNames(db):
+    "{mid: [field names]} for the old and the new collection schema"
+    try:
+        (models,) = db.execute("select models from col").fetchone()
+        if models:
+            return {int(mid): [f["name"] for f in m["flds"]]
+                for mid, m in json.loads(models).items()}
+    except (sqlite3.Error, ValueError, TypeError):
+        pass
+    ret = {}
+    try:
+        for ntid, ord, name in db.execute(
+                "select ntid, ord, name from fields order by ntid, ord"):
+            ret.setdefault(ntid, []).append(name)
+    except sqlite3.Error:
+        pass
+    return ret
+
+
+def readApkg(path, names):
+    with zipfile.ZipFile(path) as z:
+        members = set(z.namelist())
+        if "collection.anki21b" in members:
+            try:
+                import zstandard
+            except ImportError:
+                raise SystemExit("%s: needs the zstandard module, or export "
+                    "with 'support older Anki versions'"%path)
+            opener = lambda: zstandard.ZstdDecompressor().stream_reader(
+                z.open("collection.anki21b"))
+        else:
+            for name in ("collection.anki21", "collection.anki2"):
+                if name in members:
+                    opener = lambda: z.open(name)
+                    break
+            else:
+                raise SystemExit("%s: no collection in package"%path)
+
+        fd, tmp = tempfile.mkstemp(suffix=".anki2")
+        try:
+            with os.fdopen(fd, "wb") as out, opener() as src:
+                shutil.copyfileobj(src, out, 1 << 20)
+            db = sqlite3.connect(tmp)
+            try:
+                names.update(fieldNames(db))
+                for row in db.execute("select id, mid, flds from notes"):
+                    yield row
+            finally:
+                db.close()
+        finally:
+            os.remove(tmp)
+
+
+def readInput(path, kind, names):
+    if kind == APKG:
+        yield from readApkg(path, names)
+        return
+    f = (sys.stdin if path == "-"
+        else open(path, encoding="utf-8-sig", errors="replace", newline=""))
+    try:
+        if kind == CSV:
+            yield from readDelimited(f, ",")
+        elif kind == TSV:
+            yield from readDelimited(f, "\t")
+        else:
+            yield from readText(f)
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def chunks(rows, size):
+    buf = []
+    for r in rows:
+        buf.append(r)
+        if len(buf) >= size:
+            yield buf
+            buf = []
+    if buf:
+        yield buf
+
+
+def checkAll(rows, paths, cacheDir, workers, chunkSize):
+    "Yields checkNotes results in input order"
+    # word verdicts are kept next to the compiled dictionaries
+    verdictDb = os.path.join(cacheDir, CACHE_NAME) if cacheDir else None
+    if workers <= 1:
+        initWorker(paths, cacheDir, verdictDb)
+        for c in chunks(rows, chunkSize):
+            yield checkNotes(c)
+        return
+    with ProcessPoolExecutor(workers, initializer=initWorker,
+            initargs=(paths, cacheDir, verdictDb)) as ex:
+        pending = deque()
+        for c in chunks(rows, chunkSize):
+            pending.append(ex.submit(checkNotes, c))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def findDictionaries(dictDir, langs=None):
+    ret = []
+    for fn in sorted(os.listdir(dictDir)):
+        if not fn.lower().endswith(".bdic") or fn.startswith("_sp_"):
+            continue
+        if langs and fn[:-5] not in langs:
+            continue
+        ret.append(os.path.join(dictDir, fn))
+    return ret
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m spelling_police",
+        description="Checks text, csv/tsv exports and .apkg packages "
+            "against .bdic dictionaries.")
+    ap.add_argument("inputs", nargs="+", help="files to check, - for stdin")
+    ap.add_argument("-d", "--dictionaries", required=True,
+        help="folder with the .bdic files")
+    ap.add_argument("-l", "--languages",
+        help="comma separated dictionary names, default all in the folder")
+    ap.add_argument("-t", "--type", choices=(TEXT, CSV, TSV, APKG),
+        help="input type, default by file extension")
+    ap.add_argument("-c", "--cache", help="folder for compiled dictionaries")
+    ap.add_argument("--compile", action="store_true",
+        help="compile the dictionaries into --cache first, and with numpy "
+            "write their hash arrays next to them")
+    ap.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+        help="worker processes")
+    ap.add_argument("--chunk", type=int, default=500, help="rows per task")
+    ap.add_argument("-s", "--summary", action="store_true",
+        help="print misspelled words with counts instead of JSON lines")
+    args = ap.parse_args(argv)
+
+    langs = set(args.languages.split(",")) if args.languages else None
+    paths = findDictionaries(args.dictionaries, langs)
+    if not paths:
+        ap.error("no dictionaries found in %s"%args.dictionaries)
+    cacheDir = args.cache
+    if cacheDir is None:
+        default = os.path.join(args.dictionaries, "spelling_police_cache")
+        cacheDir = default if os.path.isdir(default) else None
+    if args.compile:
+        if not cacheDir:
+            ap.error("--compile needs --cache")
+        compileAll(paths, cacheDir)
+        buildAll(paths)
+
+    counts = Counter()
+    total = bad = 0
+    out = sys.stdout
+    for path in args.inputs:
+        kind = inputType(path, args.type)
+        names = {}
+        n = [0]
+        def rows():
+            for row in readInput(path, kind, names):
+                n[0] += 1
+                yield row
+        for result in checkAll(rows(), paths, cacheDir,
+                args.jobs, args.chunk):
+            for id, mid, fields in result:
+                bad += 1
+                for ord, words in fields:
+                    if args.summary:
+                        counts.update(words)
+                        continue
+                    rec = {"file": path, "id": id, "field": ord, "words": words}
+                    fnames = names.get(mid)
+                    if fnames and ord < len(fnames):
+                        rec["field_name"] = fnames[ord]
+                    out.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        total += n[0]
+
+    if args.summary:
+        for w, c in counts.most_common():
+            out.write("%6d  %s\n"%(c, w))
+        out.write("%d of %d records with misspellings, %d distinct words\n"%(
+            bad, total, len(counts)))
+    out.flush()
+    return 1 if bad else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2019-2021 Lovac42
+# Support: https://github.com/lovac42/SpellingPolice
+# License: GNU GPL, version 3 or later; http://www.gnu.org/copyleft/gpl.html
+
+
+import os, json
+from collections import defaultdict
+from aqt import mw
+from aqt.qt import *
+from aqt.utils import showInfo, showText, tooltip
+
+from .const import *
+from .checker import makeExecutor, initWorker, checkNotes
+from .auditcache import AuditCache, dictFingerprint
+from . import verdictcache
+
+
+CHUNK_SIZE = 500
+
+MAX_PENDING = 8 # chunks in flight, bounds memory use
+
+REPORT_LIMIT = 500 # lines shown per section
+
+
+class AuditJob:
+    running = None
+
+    def __init__(self, dictMan, personal):
+        self.dictMan = dictMan
+        self.personal = personal
+        self.lastId = 0
+        self.done = 0
+        self.reused = 0
+        self.exhausted = False
+        self.pending = {} # future: cache keys of its notes
+        self.failed = [] # nids of chunks that couldn't be checked
+        self.words = defaultdict(set) # word: nids
+        self.counts = defaultdict(int) # word: occurrences
+        self.notes = {} # nid: (mid, [(ord, words)])
+        self.fieldNames = {}
+
+    def start(self):
+        if AuditJob.running:
+            tooltip("An audit is already running.")
+            return
+        if not mw.col:
+            return
+        dicts = self.dictMan.getDictionaries()
+        if not dicts:
+            showInfo("No dictionaries are enabled.")
+            return
+
+        paths = [os.path.join(DICT_DIR, d+".bdic") for d in dicts]
+        self.cache = AuditCache(DICT_DIR, mw.pm.name,
+            dictFingerprint(DICT_DIR, dicts))
+        self.total = mw.col.db.scalar("select count() from notes")
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        self.executor = makeExecutor(initializer=initWorker, initargs=(
+            paths, CACHE_DIR, os.path.join(CACHE_DIR, verdictcache.CACHE_NAME)))
+
+        self.progress = QProgressDialog(
+            "Checking notes...", "Cancel", 0, self.total, mw)
+        self.progress.setWindowTitle("Spelling Audit")
+        self.progress.setWindowModality(Qt.NonModal)
+        self.progress.setMinimumDuration(0)
+        self.progress.show()
+
+        self.timer = QTimer(mw)
+        self.timer.timeout.connect(self._pump)
+        self.timer.start(20)
+        AuditJob.running = self
+
+    def _pump(self):
+        if self.progress.wasCanceled() or not mw.col:
+            self._stop()
+            tooltip("Spelling audit cancelled.")
+            return
+
+        for f in [f for f in self.pending if f.done()]:
+            self._merge(f, self.pending.pop(f))
+
+        while not self.exhausted and len(self.pending) < MAX_PENDING:
+            rows = self._nextChunk()
+            if not rows:
+                self.exhausted = True
+                break
+            hits, todo, keys = self.cache.split(rows)
+            self._add(hits)
+            self.done += len(hits)
+            self.reused += len(hits)
+            if todo:
+                f = self.executor.submit(checkNotes, todo)
+                self.pending[f] = keys
+
+        self.progress.setValue(self.done)
+        if self.exhausted and not self.pending:
+            self._stop()
+            self._report()
+
+    def _nextChunk(self):
+        rows = mw.col.db.all(
+            "select id, mid, mod, flds from notes where id > ? "
+            "order by id limit ?", self.lastId, CHUNK_SIZE)
+        if rows:
+            self.cache.prune(self.lastId, rows[-1][0], [r[0] for r in rows])
+            self.lastId = rows[-1][0]
+        else:
+            self.cache.prune(self.lastId, 1<<62, [])
+        return rows
+
+    def _merge(self, future, keys):
+        self.done += len(keys)
+        try:
+            results = future.result()
+        except Exception as e:
+            print("SpellingPolice: audit chunk failed: %s"%e)
+            self.failed += [k[0] for k in keys]
+            return
+        self.cache.store(keys, results)
+        self._add(results)
+
+    def _add(self, results):
+        # the cache has what the dictionaries found, the personal list
+        # is checked on top, so adding words doesn't invalidate it
+        for nid, mid, bad in results:
+            bad = [(ord, [w for w in words if w not in self.personal])
+                for ord, words in bad]
+            bad = [(ord, words) for ord, words in bad if words]
+            if not bad:
+                continue
+            self.notes[nid] = (mid, bad)
+            for ord, words in bad:
+                for w in words:
+                    self.words[w].add(nid)
+                    self.counts[w] += 1
+
+    def _stop(self):
+        self.timer.stop()
+        for f in self.pending:
+            f.cancel()
+        self.executor.shutdown(wait=False)
+        self.cache.close()
+        self.progress.hide()
+        AuditJob.running = None
+
+
+    def _fieldName(self, mid, ord):
+        key = (mid, ord)
+        if key not in self.fieldNames:
+            try:
+                name = mw.col.models.get(mid)["flds"][ord]["name"]
+            except (TypeError, IndexError, KeyError):
+                name = str(ord)
+            self.fieldNames[key] = name
+        return self.fieldNames[key]
+
+    def _report(self):
+        words = sorted(self.words, key=lambda w: -self.counts[w])
+        report = {
+            "notes_checked": self.done - len(self.failed),
+            "notes_failed": self.failed,
+            "words": {
+                w: {"count": self.counts[w], "notes": sorted(self.words[w])}
+                for w in words
+            },
+            "notes": {
+                str(nid): {
+                    self._fieldName(mid, ord): ws for ord, ws in bad
+                } for nid, (mid, bad) in self.notes.items()
+            },
+        }
+        path = os.path.join(mw.pm.profileFolder(), "spelling_audit.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=1)
+
+        lines = [
+            "%d notes checked, %d with misspellings, %d distinct words."%(
+                self.done - len(self.failed), len(self.notes), len(words)),
+            "%d unchanged notes taken from the cache."%self.reused,
+        ]
+        if self.failed:
+            lines.append("%d notes could not be checked, they are listed "
+                "in the full report."%len(self.failed))
+        lines += [
+            "Full report: %s"%path,
+            "Tools > Spelling Police > Replace misspelling fixes a word in all of its notes.",
+            "",
+            "Misspelled words (occurrences / notes):",
+        ]
+        for w in words[:REPORT_LIMIT]:
+            lines.append("  %s\t%d / %d"%(w, self.counts[w], len(self.words[w])))
+        lines += ["", "Notes (nid, field: words):"]
+        for nid, fields in list(report["notes"].items())[:REPORT_LIMIT]:
+            for fld, ws in fields.items():
+                lines.append("  %s\t%s: %s"%(nid, fld, ", ".join(ws)))
+        showText("\n".join(lines), title="Spelling Audit")
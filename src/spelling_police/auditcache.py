@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2019-2021 Lovac42
+# Support: https://github.com/lovac42/SpellingPolice
+# License: GNU GPL, version 3 or later; http://www.gnu.org/copyleft/gpl.html
+
+
+# Persistent audit results, so a re-audit only checks notes that changed.
+# Rows are keyed by profile and note id and hold the note mod time, a hash
+# of the fields and the misspellings found. All rows belong to the
+# dictionary set recorded in the meta table and are dropped when it changes.
+# The words table indexes the misspellings by word, for replacing them.
+
+
+import hashlib, json, os, sqlite3
+
+
+CACHE_NAME = "spelling_police_audit.db"
+
+
+def fieldHash(flds):
+    return hashlib.blake2b(flds.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def dictFingerprint(dictDir, names):
+    "Identifies a set of enabled dictionaries, including file changes"
+    return pathsFingerprint([os.path.join(dictDir, n+".bdic") for n in names])
+
+
+def pathsFingerprint(paths):
+    "dictFingerprint of dictionary files given by path"
+    h = hashlib.sha1()
+    for name, p in sorted((os.path.basename(p)[:-5], p) for p in paths):
+        h.update(name.encode("utf-8"))
+        try:
+            st = os.stat(p)
+            h.update(b"%d:%d"%(st.st_size, int(st.st_mtime)))
+        except OSError:
+            h.update(b"missing")
+    return h.hexdigest()
+
+
+class AuditCache:
+    def __init__(self, dictDir, profile, fingerprint):
+        self.profile = profile
+        self.db = sqlite3.connect(os.path.join(dictDir, CACHE_NAME))
+        hasIndex = self.db.execute("select count() from sqlite_master "
+            "where type='table' and name='words'").fetchone()[0]
+        self.db.executescript("""
+create table if not exists meta (key text primary key, value text);
+create table if not exists notes (
+    profile text not null,
+    nid integer not null,
+    mod integer not null,
+    hash text not null,
+    result text not null,
+    primary key (profile, nid)
+);
+create table if not exists words (
+    profile text not null,
+    word text not null,
+    nid integer not null,
+    primary key (profile, word, nid)
+) without rowid;
+create index if not exists ix_words_nid on words (profile, nid);""")
+        if not hasIndex:
+            # results from before the index, check everything once more
+            self.db.execute("delete from notes")
+            self.db.commit()
+        row = self.db.execute(
+            "select value from meta where key='fingerprint'").fetchone()
+        if fingerprint and (not row or row[0] != fingerprint):
+            self.db.execute("delete from notes")
+            self.db.execute("delete from words")
+            self.db.execute("insert or replace into meta values "
+                "('fingerprint', ?)", (fingerprint,))
+            self.db.commit()
+
+    def close(self):
+        self.db.commit()
+        self.db.close()
+
+    def split(self, rows):
+        """rows: list of (nid, mid, mod, flds)
+        returns (cached results, rows to check, cache keys of those rows)"""
+        cached = {
+            nid: (mod, h, res) for nid, mod, h, res in self.db.execute(
+                "select nid, mod, hash, result from notes where profile=? "
+                "and nid in (%s)"%",".join("%d"%r[0] for r in rows),
+                (self.profile,))
+        }
+        hits, todo, keys, touched = [], [], [], []
+        for nid, mid, mod, flds in rows:
+            c = cached.get(nid)
+            if c and c[0] == mod:
+                hits.append((nid, mid, json.loads(c[2])))
+                continue
+            h = fieldHash(flds)
+            if c and c[1] == h:
+                hits.append((nid, mid, json.loads(c[2])))
+                touched.append((mod, self.profile, nid))
+                continue
+            todo.append((nid, mid, flds))
+            keys.append((nid, mod, h))
+        if touched:
+            self.db.executemany(
+                "update notes set mod=? where profile=? and nid=?", touched)
+        return hits, todo, keys
+
+    def store(self, keys, results):
+        "keys: (nid, mod, hash) of all checked notes, results: bad notes only"
+        bad = {nid: b for nid, _, b in results}
+        self.db.executemany(
+            "insert or replace into notes values (?,?,?,?,?)",
+            [(self.profile, nid, mod, h, json.dumps(bad.get(nid, [])))
+                for nid, mod, h in keys])
+        self.db.executemany("delete from words where profile=? and nid=?",
+            [(self.profile, nid) for nid, _, _ in keys])
+        self.db.executemany("insert or ignore into words values (?,?,?)",
+            [(self.profile, w, nid) for nid, fields in bad.items()
+                for _, words in fields for w in words])
+
+    def prune(self, lo, hi, nids):
+        "Drop rows of deleted notes with ids in (lo, hi]"
+        for table in ("notes", "words"):
+            self.db.execute(
+                "delete from %s where profile=? and nid>? and nid<=? "
+                "and nid not in (%s)"%(table, ",".join("%d"%n for n in nids)),
+                (self.profile, lo, hi))
+
+    def notesWith(self, word):
+        "Ids of the notes the last audit found word in"
+        return [nid for (nid,) in self.db.execute(
+            "select nid from words where profile=? and word=?",
+            (self.profile, word))]
+
+    def wordCounts(self):
+        "[(word, notes)] of the last audit, most notes first"
+        return self.db.execute(
+            "select word, count() from words where profile=? "
+            "group by word order by count() desc, word", (self.profile,)).fetchall()
+
+    def forget(self, word, nids):
+        "Drops word from the index of notes it was replaced in"
+        self.db.executemany(
+            "delete from words where profile=? and word=? and nid=?",
+            [(self.profile, word, nid) for nid in nids])
+
+    def commit(self):
+        self.db.commit()
+
+
+def invalidate(dictDir):
+    path = os.path.join(dictDir, CACHE_NAME)
+    if not os.path.exists(path):
+        return
+    try:
+        db = sqlite3.connect(path)
+        db.execute("delete from meta where key='fingerprint'")
+        db.execute("delete from notes")
+        db.execute("delete from words")
+        db.commit()
+        db.close()
+    except sqlite3.Error as e:
+        print("SpellingPolice: can't clear audit cache: %s"%e)
@@ -0,0 +1,541 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2019-2021 Lovac42
+# Support: https://github.com/lovac42/SpellingPolice
+# License: GNU GPL, version 3 or later; http://www.gnu.org/copyleft/gpl.html
+
+
+# Reader for chromium's BDICT format (third_party/hunspell/google/bdict.h).
+# The file is memory mapped and the word trie is walked straight from the
+# mapped buffer, nothing is copied into python objects except the (small)
+# affix rule tables, and those only on first use.
+#
+# This module must not import aqt, it is also used by worker processes
+# and the command line checker.
+
+
+import hashlib, mmap, re, struct
+
+
+SIGNATURE = 0x63694442 # "BDic", the first bytes of every chromium .bdic
+
+HEADER_V1 = struct.Struct("<IHHII")
+HEADER_V2 = struct.Struct("<IHHII16s")
+AFF_HEADER = struct.Struct("<IIII")
+
+U16 = struct.Struct("<H")
+U32 = struct.Struct("<I")
+
+LEAF_NODE_TYPE_MASK = 0x80
+LEAF_NODE_TYPE_VALUE = 0
+LEAF_NODE_ADDITIONAL_MASK = 0xC0
+LEAF_NODE_ADDITIONAL_VALUE = 0x40
+LEAF_NODE_FOLLOWING_MASK = 0xA0
+LEAF_NODE_FOLLOWING_VALUE = 0x20
+LEAF_NODE_FIRST_BYTE_AFFIX_MASK = 0x1F
+LEAF_NODE_FOLLOWING_LIST_TERMINATOR = 0xFFFF
+FIRST_AFFIX_IS_UNUSED = 0x1FFF
+
+LOOKUP_NODE_TYPE_MASK = 0xFC
+LOOKUP_NODE_TYPE_VALUE = 0xC0
+LOOKUP_NODE_0TH_MASK = 0x01
+LOOKUP_NODE_32BIT_MASK = 0x02
+
+LIST_NODE_TYPE_MASK = 0xE0
+LIST_NODE_TYPE_VALUE = 0xE0
+LIST_NODE_16BIT_MASK = 0x10
+LIST_NODE_COUNT_MASK = 0x0F
+
+
+RE_LANG = re.compile(r"^([a-z]{2,3})(?:[-_]([A-Za-z]{2,4}))?(?=[-_.]|$)")
+
+
+class BDictError(ValueError):
+    pass
+
+
+class AffixRule:
+    __slots__ = ("flag", "prefix", "cross", "strip", "add", "cond", "contFlags")
+
+    def __init__(self, flag, prefix, cross, strip, add, cond, contFlags):
+        self.flag = flag
+        self.prefix = prefix
+        self.cross = cross
+        self.strip = strip
+        self.add = add
+        self.cond = cond
+        self.contFlags = contFlags
+
+    def matchesStem(self, stem):
+        return self.cond is None or self.cond.search(stem) is not None
+
+    def apply(self, stem):
+        "Returns the affixed form of stem or None if the rule doesn't apply"
+        if not self.matchesStem(stem):
+            return None
+        if self.prefix:
+            if not stem.startswith(self.strip):
+                return None
+            return self.add + stem[len(self.strip):]
+        if not stem.endswith(self.strip):
+            return None
+        return stem[:len(stem)-len(self.strip)] + self.add
+
+
+def parseFlags(s, mode):
+    if not s:
+        return ()
+    if mode == "long":
+        return tuple(s[i:i+2] for i in range(0, len(s), 2))
+    if mode == "num":
+        return tuple(i.strip() for i in s.split(",") if i.strip())
+    return tuple(s) # "char" and "UTF-8"
+
+
+def compileCondition(cond, prefix):
+    if not cond or cond == ".":
+        return None
+    try:
+        return re.compile("^"+cond if prefix else cond+"$")
+    except re.error:
+        return re.compile("^"+re.escape(cond) if prefix else re.escape(cond)+"$")
+
+
+def readHeader(buf):
+    "Returns (major, minor, aff_offset, dic_offset, digest) for the buffer"
+    if len(buf) < HEADER_V1.size:
+        raise BDictError("File too small for a BDICT header")
+    sig, major, minor, aff, dic = HEADER_V1.unpack_from(buf, 0)
+    if sig != SIGNATURE:
+        raise BDictError("Not a BDICT file")
+    digest = None
+    if major >= 2:
+        if len(buf) < HEADER_V2.size:
+            raise BDictError("Truncated BDICT header")
+        digest = HEADER_V2.unpack_from(buf, 0)[5]
+    if not (0 < aff <= dic <= len(buf)):
+        raise BDictError("Bad section offsets in BDICT header")
+    return major, minor, aff, dic, digest
+
+
+class BDict:
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            try:
+                self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError: # empty file
+                raise BDictError("Empty dictionary file")
+        try:
+            (self.major, self.minor, self._aff,
+                self._dic, self.digest) = readHeader(self._mm)
+        except:
+            self._mm.close()
+            raise
+        self._affix = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+
+    def __contains__(self, word):
+        return self.isCorrect(word)
+
+
+    # Raw sections
+
+    def _strings(self, pos, end=None):
+        "NUL terminated strings starting at pos, ending with an empty one"
+        mm = self._mm
+        end = end or self._dic
+        while pos < end:
+            nul = mm.find(b"\0", pos, end)
+            if nul < 0 or nul == pos:
+                return
+            yield mm[pos:nul].decode("utf-8", "replace")
+            pos = nul + 1
+
+    def affixGroups(self):
+        grp, _, _, _ = AFF_HEADER.unpack_from(self._mm, self._aff)
+        lines = self._strings(grp)
+        next(lines, None) # magic "AF <count>" line
+        return [l[3:] if l.startswith("AF ") else l for l in lines]
+
+    def affixRules(self):
+        _, rules, _, _ = AFF_HEADER.unpack_from(self._mm, self._aff)
+        return list(self._strings(rules))
+
+    def replacements(self):
+        _, _, rep, _ = AFF_HEADER.unpack_from(self._mm, self._aff)
+        it = self._strings(rep)
+        return list(zip(it, it))
+
+    def otherCommands(self):
+        _, _, _, other = AFF_HEADER.unpack_from(self._mm, self._aff)
+        return list(self._strings(other))
+
+
+    # Affix tables, parsed on first use
+
+    def _loadAffix(self):
+        mode = "char"
+        special = {}
+        for line in self.otherCommands():
+            parts = line.split()
+            if len(parts) < 2:
+                continue
+            if parts[0] == "FLAG":
+                mode = parts[1]
+            elif parts[0] in ("NEEDAFFIX", "FORBIDDENWORD", "PSEUDOROOT"):
+                special[parts[0]] = parts[1]
+
+        groups = [()] # affix id 0 means no affixes
+        for g in self.affixGroups():
+            groups.append(frozenset(parseFlags(g.strip(), mode)))
+
+        prefixes, suffixes = [], []
+        cross = {}
+        for line in self.affixRules():
+            parts = line.split()
+            if len(parts) < 4 or parts[0] not in ("PFX", "SFX"):
+                continue
+            isPfx = parts[0] == "PFX"
+            flag = parts[1]
+            if len(parts) == 4 and parts[3].isdigit() and parts[2] in "YN":
+                cross[(isPfx, flag)] = parts[2] == "Y"
+                continue
+            strip = "" if parts[2] == "0" else parts[2]
+            add, _, cont = parts[3].partition("/")
+            add = "" if add == "0" else add
+            cond = compileCondition(parts[4] if len(parts) > 4 else ".", isPfx)
+            rule = AffixRule(flag, isPfx, cross.get((isPfx, flag), False),
+                strip, add, cond, frozenset(parseFlags(cont, mode)))
+            (prefixes if isPfx else suffixes).append(rule)
+
+        needAffix = special.get("NEEDAFFIX") or special.get("PSEUDOROOT")
+        self._affix = (mode, groups, prefixes, suffixes,
+            needAffix, special.get("FORBIDDENWORD"))
+        return self._affix
+
+    def flagMode(self):
+        return (self._affix or self._loadAffix())[0]
+
+    def prefixRules(self):
+        return (self._affix or self._loadAffix())[2]
+
+    def suffixRules(self):
+        return (self._affix or self._loadAffix())[3]
+
+
+    # Trie access
+
+    def _find(self, key):
+        "Returns the affix ids stored for key (bytes) or None"
+        mm = self._mm
+        dic = self._dic
+        pos = dic
+        i = 0
+        n = len(key)
+        while True:
+            b = mm[pos]
+            if b & LEAF_NODE_TYPE_MASK == LEAF_NODE_TYPE_VALUE:
+                return self._leaf(pos, key, i)
+
+            c = key[i] if i < n else 0
+            if b & LOOKUP_NODE_TYPE_MASK == LOOKUP_NODE_TYPE_VALUE:
+                is32 = b & LOOKUP_NODE_32BIT_MASK
+                size = 4 if is32 else 2
+                table = pos + 3
+                if b & LOOKUP_NODE_0TH_MASK:
+                    zth = table
+                    table += size
+                    if c == 0:
+                        off = self._offset(zth, is32)
+                        if not off:
+                            return None
+                        pos = dic + off if is32 else pos + off
+                        continue
+                if c == 0:
+                    return None
+                idx = c - mm[pos+1]
+                if idx < 0 or idx >= mm[pos+2]:
+                    return None
+                off = self._offset(table + idx*size, is32)
+                if not off:
+                    return None
+                pos = dic + off if is32 else pos + off
+
+            elif b & LIST_NODE_TYPE_MASK == LIST_NODE_TYPE_VALUE:
+                itemSize = 3 if b & LIST_NODE_16BIT_MASK else 2
+                count = b & LIST_NODE_COUNT_MASK
+                start = pos + 1
+                end = start + count * itemSize
+                for p in range(start, end, itemSize):
+                    if mm[p] == c:
+                        if itemSize == 3:
+                            off = U16.unpack_from(mm, p+1)[0]
+                        else:
+                            off = mm[p+1]
+                        pos = end + off
+                        break
+                else:
+                    return None
+            else:
+                raise BDictError("Corrupt node at offset %d"%pos)
+
+            if c == 0:
+                continue
+            i += 1
+
+    def _offset(self, pos, is32):
+        if is32:
+            return U32.unpack_from(self._mm, pos)[0]
+        return U16.unpack_from(self._mm, pos)[0]
+
+    def _leaf(self, pos, key, i):
+        mm = self._mm
+        b = mm[pos]
+        ids = []
+        first = ((b & LEAF_NODE_FIRST_BYTE_AFFIX_MASK) << 8) | mm[pos+1]
+        if first != FIRST_AFFIX_IS_UNUSED:
+            ids.append(first)
+        pos += 2
+        if b & LEAF_NODE_ADDITIONAL_MASK == LEAF_NODE_ADDITIONAL_VALUE:
+            nul = mm.find(b"\0", pos)
+            if nul < 0:
+                raise BDictError("Truncated leaf at offset %d"%pos)
+            if key is not None and mm[pos:nul] != key[i:]:
+                return None
+            pos = nul + 1
+        elif key is not None and i != len(key):
+            return None
+        if b & LEAF_NODE_FOLLOWING_MASK == LEAF_NODE_FOLLOWING_VALUE:
+            while True:
+                aid = U16.unpack_from(mm, pos)[0]
+                if aid == LEAF_NODE_FOLLOWING_LIST_TERMINATOR:
+                    break
+                ids.append(aid)
+                pos += 2
+        return ids
+
+    def _walk(self):
+        "Yields (word bytes, affix ids) for every stem, in trie order"
+        mm = self._mm
+        dic = self._dic
+        stack = [(dic, b"")]
+        while stack:
+            pos, prefix = stack.pop()
+            b = mm[pos]
+            if b & LEAF_NODE_TYPE_MASK == LEAF_NODE_TYPE_VALUE:
+                add = b""
+                if b & LEAF_NODE_ADDITIONAL_MASK == LEAF_NODE_ADDITIONAL_VALUE:
+                    nul = mm.find(b"\0", pos+2)
+                    if nul < 0:
+                        raise BDictError("Truncated leaf at offset %d"%pos)
+                    add = mm[pos+2:nul]
+                yield prefix + add, self._leaf(pos, None, 0)
+                continue
+
+            children = []
+            if b & LOOKUP_NODE_TYPE_MASK == LOOKUP_NODE_TYPE_VALUE:
+                is32 = b & LOOKUP_NODE_32BIT_MASK
+                size = 4 if is32 else 2
+                table = pos + 3
+                if b & LOOKUP_NODE_0TH_MASK:
+                    off = self._offset(table, is32)
+                    if off:
+                        children.append((0, off))
+                    table += size
+                first = mm[pos+1]
+                for k in range(mm[pos+2]):
+                    off = self._offset(table + k*size, is32)
+                    if off:
+                        children.append((first + k, off))
+                base = dic if is32 else pos
+            elif b & LIST_NODE_TYPE_MASK == LIST_NODE_TYPE_VALUE:
+                itemSize = 3 if b & LIST_NODE_16BIT_MASK else 2
+                end = pos + 1 + (b & LIST_NODE_COUNT_MASK) * itemSize
+                for p in range(pos+1, end, itemSize):
+                    if itemSize == 3:
+                        off = U16.unpack_from(mm, p+1)[0]
+                    else:
+                        off = mm[p+1]
+                    children.append((mm[p], off))
+                base = end
+            else:
+                raise BDictError("Corrupt node at offset %d"%pos)
+
+            for c, off in reversed(children):
+                if base + off <= pos:
+                    raise BDictError("Bad child offset at %d"%pos)
+                stack.append((base + off, prefix + bytes((c,)) if c else prefix))
+
+    def words(self):
+        for w, _ in self._walk():
+            yield w.decode("utf-8", "replace")
+
+    def entries(self):
+        "Yields (word, set of affix flags) for every stem"
+        groups = (self._affix or self._loadAffix())[1]
+        for w, ids in self._walk():
+            yield w.decode("utf-8", "replace"), self._flagsFor(ids, groups)
+
+    def _flagsFor(self, ids, groups):
+        if len(ids) == 1:
+            return groups[ids[0]] if ids[0] < len(groups) else frozenset()
+        flags = set()
+        for i in ids:
+            if i < len(groups):
+                flags.update(groups[i])
+        return flags
+
+    def stemFlags(self, stem):
+        "Affix flags of stem, or None if stem is not in the dictionary"
+        ids = self._find(stem.encode("utf-8"))
+        if ids is None:
+            return None
+        return self._flagsFor(ids, (self._affix or self._loadAffix())[1])
+
+
+    def expand(self):
+        "Yields every word form: stems and their prefix/suffix expansions"
+        _, _, prefixes, suffixes, needAffix, forbidden = (
+            self._affix or self._loadAffix())
+        pfxByFlag, sfxByFlag = {}, {}
+        for r in prefixes:
+            pfxByFlag.setdefault(r.flag, []).append(r)
+        for r in suffixes:
+            sfxByFlag.setdefault(r.flag, []).append(r)
+
+        for stem, flags in self.entries():
+            if forbidden and forbidden in flags:
+                continue
+            if not (needAffix and needAffix in flags):
+                yield stem
+            if not flags:
+                continue
+            sfxForms = []
+            for f in flags:
+                for r in sfxByFlag.get(f, ()):
+                    form = r.apply(stem)
+                    if form:
+                        yield form
+                        if r.cross:
+                            sfxForms.append(form)
+            for f in flags:
+                for r in pfxByFlag.get(f, ()):
+                    form = r.apply(stem)
+                    if form:
+                        yield form
+                        if r.cross:
+                            for sf in sfxForms:
+                                form = r.apply(sf)
+                                if form:
+                                    yield form
+
+
+    # Spell checking
+
+    def isCorrect(self, word):
+        word = word.strip()
+        if not word:
+            return True
+        for w in caseVariants(word):
+            if self._check(w):
+                return True
+        return False
+
+    def _check(self, word):
+        _, _, prefixes, suffixes, needAffix, forbidden = (
+            self._affix or self._loadAffix())
+
+        flags = self.stemFlags(word)
+        if flags is not None:
+            if forbidden and forbidden in flags:
+                return False
+            if not (needAffix and needAffix in flags):
+                return True
+
+        if self._checkSuffix(word, suffixes, None, forbidden):
+            return True
+
+        for pfx in prefixes:
+            if not word.startswith(pfx.add) or len(word) <= len(pfx.add):
+                continue
+            stem = pfx.strip + word[len(pfx.add):]
+            if not pfx.matchesStem(stem):
+                continue
+            flags = self.stemFlags(stem)
+            if flags and pfx.flag in flags and not (forbidden and forbidden in flags):
+                return True
+            if pfx.cross and self._checkSuffix(stem, suffixes, pfx, forbidden):
+                return True
+        return False
+
+    def _checkSuffix(self, word, suffixes, pfx, forbidden):
+        for sfx in suffixes:
+            if pfx and not sfx.cross:
+                continue
+            if not word.endswith(sfx.add) or len(word) <= len(sfx.add):
+                continue
+            stem = word[:len(word)-len(sfx.add)] + sfx.strip
+            if not sfx.matchesStem(stem):
+                continue
+            flags = self.stemFlags(stem)
+            if not flags or sfx.flag not in flags:
+                continue
+            if forbidden and forbidden in flags:
+                continue
+            if pfx and pfx.flag not in flags and pfx.flag not in sfx.contFlags:
+                continue
+            return True
+        return False
+
+
+def caseVariants(word):
+    yield word
+    lower = word.lower()
+    if lower == word:
+        return
+    if word.isupper():
+        yield lower
+        yield word[:1] + lower[1:]
+    elif word[:1].isupper() and word[1:] == lower[1:]:
+        yield lower
+
+
+def detectLanguage(fileName):
+    "Language tag from chromium style names, e.g. en-US-3-0.bdic"
+    m = RE_LANG.match(fileName)
+    if not m:
+        return None
+    if m.group(2):
+        return "%s-%s"%(m.group(1), m.group(2))
+    return m.group(1)
+
+
+def inspectDictionary(path):
+    "Header info and integrity of a .bdic file, never raises"
+    info = {"version": None, "md5": None, "words": 0, "valid": False, "error": None}
+    try:
+        with BDict(path) as d:
+            info["version"] = "%d.%d"%(d.major, d.minor)
+            if d.digest:
+                info["md5"] = d.digest.hex()
+                mv = memoryview(d._mm)[HEADER_V2.size:]
+                ok = hashlib.md5(mv).digest() == d.digest
+                mv.release()
+                if not ok:
+                    info["error"] = "Checksum mismatch"
+                    return info
+            info["words"] = sum(1 for _ in d._walk())
+            info["valid"] = True
+    except (OSError, ValueError, IndexError, struct.error) as e:
+        info["error"] = str(e) or e.__class__.__name__
+    return info
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2019-2021 Lovac42
+# Support: https://github.com/lovac42/SpellingPolice
+# License: GNU GPL, version 3 or later; http://www.gnu.org/copyleft/gpl.html
+
+
+# Merges several .bdic files into one, so chromium runs a single hunspell.
+#
+# The flags of every input are renumbered into one FLAG num space. Affix
+# classes with identical rules share a number, so the en-* variants end
+# up with mostly the same flags and their common words collapse into one
+# entry. A word keeps one affix group per input it came from, hunspell
+# treats those like homonyms, so rules of different inputs never combine.
+# Marker flags like NEEDAFFIX or FORBIDDENWORD map to one flag each.
+#
+# Must not import aqt, merges run in a worker process.
+
+
+import hashlib, os
+
+from .bdic import BDict, parseFlags
+from .bdicwriter import BDictWriter, LEAF_NODE_MAX_FIRST_AFFIX_ID
+
+
+# commands whose argument is a flag
+MARKERS = ("NEEDAFFIX", "PSEUDOROOT", "FORBIDDENWORD", "KEEPCASE",
+    "NOSUGGEST", "ONLYINCOMPOUND", "COMPOUNDFLAG", "COMPOUNDBEGIN",
+    "COMPOUNDMIDDLE", "COMPOUNDEND", "COMPOUNDPERMITFLAG",
+    "COMPOUNDFORBIDFLAG", "CIRCUMFIX", "FORCEUCASE", "WARN", "SUBSTANDARD")
+
+# taken from the first input that has them
+SINGLE = ("LANG", "IGNORE", "COMPOUNDMIN", "COMPOUNDWORDMAX", "MAXNGRAMSUGS",
+    "NOSPLITSUGS", "ONLYMAXDIFF", "MAXDIFF", "FULLSTRIP", "CHECKSHARPS",
+    "COMPLEXPREFIXES")
+
+# character sets, merged
+CHARS = ("TRY", "WORDCHARS")
+
+
+def inputKey(paths):
+    "Identifies the merge result by the contents of its inputs"
+    h = hashlib.sha1()
+    for p in paths:
+        st = os.stat(p)
+        with BDict(p) as d:
+            digest = d.digest or b""
+        h.update(os.path.basename(p).encode("utf-8"))
+        h.update(digest or b"%d:%d"%(st.st_size, st.st_mtime_ns))
+    return h.hexdigest()[:16]
+
+
+class _Merge:
+    def __init__(self):
+        self.flags = {}    # rule signature or marker: new flag number
+        self.rules = []
+        self.groups = {}   # frozenset of new flags: affix id
+        self.groupList = []
+        self.others = {}   # command: line
+        self.chars = {}    # command: chars in order
+        self.keys = []
+        self.reps = []
+        self._reps = set()
+
+    def flag(self, key):
+        n = self.flags.get(key)
+        if n is None:
+            n = self.flags[key] = len(self.flags) + 1
+        return n
+
+    def group(self, flags):
+        if not flags:
+            return 0
+        flags = frozenset(flags)
+        i = self.groups.get(flags)
+        if i is None:
+            self.groupList.append(",".join(str(f) for f in sorted(flags)))
+            i = self.groups[flags] = len(self.groupList)
+        return i
+
+    def addInput(self, idx, d):
+        mode = d.flagMode()
+        local = {} # old flag: new flag
+
+        for line in d.otherCommands():
+            parts = line.split()
+            if not parts or parts[0] in ("FLAG", "SET", "AF"):
+                continue
+            cmd = parts[0]
+            if cmd in MARKERS and len(parts) > 1:
+                local[parts[1]] = self.flag(("marker", cmd))
+            elif cmd in CHARS and len(parts) > 1:
+                seen = self.chars.setdefault(cmd, [])
+                for c in parts[1]:
+                    if c not in seen:
+                        seen.append(c)
+            elif cmd == "KEY" and len(parts) > 1:
+                for k in parts[1].split("|"):
+                    if k not in self.keys:
+                        self.keys.append(k)
+            elif cmd in SINGLE:
+                self.others.setdefault(cmd, line)
+            elif cmd not in MARKERS:
+                self.others.setdefault(line, line)
+
+        for pair in d.replacements():
+            if pair not in self._reps:
+                self._reps.add(pair)
+                self.reps.append(pair)
+
+        # rules grouped by class, a class is shared when its rules match
+        classes = {}
+        order = []
+        for line in d.affixRules():
+            parts = line.split()
+            if len(parts) < 4 or parts[0] not in ("PFX", "SFX"):
+                continue
+            k = (parts[0], parts[1])
+            if k not in classes:
+                classes[k] = []
+                order.append(k)
+            classes[k].append(parts)
+        for k in order:
+            body = classes[k]
+            hasCont = any("/" in p[3] for p in body if not p[3].isdigit())
+            sig = (k[0], tuple(tuple(p[2:]) for p in body),
+                idx if hasCont else None)
+            local.setdefault(k[1], self.flag(sig))
+
+        for (kind, old) in order:
+            new = str(local[old])
+            for parts in classes[(kind, old)]:
+                parts = list(parts)
+                parts[1] = new
+                if not (len(parts) == 4 and parts[3].isdigit()):
+                    add, sep, cont = parts[3].partition("/")
+                    if sep:
+                        cont = [str(local[f]) for f in parseFlags(cont, mode)
+                            if f in local]
+                        parts[3] = add + ("/" + ",".join(cont) if cont else "")
+                self.rules.append(" ".join(parts))
+
+        # affix ids of this input to merged affix ids
+        ids = [0]
+        for g in d.affixGroups():
+            ids.append(self.group(
+                local[f] for f in parseFlags(g.strip(), mode) if f in local))
+        return ids
+
+    def commands(self):
+        ret = ["SET UTF-8", "FLAG num"]
+        for cmd, chars in self.chars.items():
+            ret.append("%s %s"%(cmd, "".join(chars)))
+        if self.keys:
+            ret.append("KEY " + "|".join(self.keys))
+        ret.extend(self.others.values())
+        for key, n in self.flags.items():
+            if key[0] == "marker":
+                ret.append("%s %d"%(key[1], n))
+        return ret
+
+
+def mergeDictionaries(paths, outPath):
+    "Writes the merge of paths to outPath, returns the word count"
+    m = _Merge()
+    w = BDictWriter()
+    # rules can't be finished before all inputs are seen, but the words
+    # only need the affix id map of their input
+    for idx, p in enumerate(paths):
+        with BDict(p) as d:
+            ids = m.addInput(idx, d)
+            for word, old in d._walk():
+                new = [ids[i] if i < len(ids) else 0 for i in old] or [0]
+                w.addWord(bytes(word), new)
+
+    if len(m.groupList) > LEAF_NODE_MAX_FIRST_AFFIX_ID:
+        raise ValueError("Too many affix groups to merge: %d"%len(m.groupList))
+    w.comment = "merged from " + ", ".join(os.path.basename(p) for p in paths)
+    w.affixGroups = m.groupList
+    w.affixRules = m.rules
+    w.replacements = m.reps
+    w.otherCommands = m.commands()
+    w.write(outPath)
+    return w.wordCount()
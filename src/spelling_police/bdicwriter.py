@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2019-2021 Lovac42
+# Support: https://github.com/lovac42/SpellingPolice
+# License: GNU GPL, version 3 or later; http://www.gnu.org/copyleft/gpl.html
+
+
+# Writer for chromium's BDICT format, the counterpart of bdic.py.
+# Like bdic.py, this must not import aqt.
+
+
+import hashlib
+
+from .bdic import *
+from .fileutil import replacing
+
+
+LEAF_NODE_MAX_FIRST_AFFIX_ID = 0x1FFE
+MAX_AFFIXES_PER_WORD = 32
+LIST_NODE_MAX_ITEMS = 15
+
+
+class BDictWriter:
+    def __init__(self):
+        self.comment = ""
+        self.affixGroups = [] # flag strings, affix id = index + 1
+        self.affixRules = []
+        self.replacements = []
+        self.otherCommands = []
+        self._words = {}
+        self._root = None
+
+    def addWord(self, word, affixIds=(0,)):
+        key = word.encode("utf-8") if isinstance(word, str) else word
+        if not key or b"\0" in key:
+            return
+        ids = self._words.setdefault(key, [])
+        for i in affixIds:
+            if i not in ids and len(ids) < MAX_AFFIXES_PER_WORD:
+                ids.append(i)
+
+    def addWords(self, words):
+        for w in words:
+            self.addWord(w)
+
+    def wordCount(self):
+        return len(self._words)
+
+    def setRoot(self, node):
+        "A trie built elsewhere, (pieces, size, fixups), replaces the words"
+        self._root = node
+
+    def getBDict(self):
+        aff = self._serializeAff(HEADER_V2.size)
+        if self._root:
+            dic = joinPieces(self._root[0], self._root[2])
+        else:
+            dic = serializeTrie(sorted(self._words.items()))
+        data = aff + dic
+        header = HEADER_V2.pack(SIGNATURE, 2, 0, HEADER_V2.size,
+            HEADER_V2.size + len(aff), hashlib.md5(data).digest())
+        return header + data
+
+    def write(self, path):
+        # write then rename, chromium may have the old file open
+        data = self.getBDict()
+        with replacing(path) as f:
+            f.write(data)
+
+    def _serializeAff(self, base):
+        out = bytearray(AFF_HEADER.size)
+        out += b"\n" + self.comment.encode("utf-8") + b"\n"
+
+        groupOffset = base + len(out)
+        out += ("AF %d"%len(self.affixGroups)).encode("utf-8") + b"\0"
+        out += stringList("AF "+g for g in self.affixGroups)
+
+        ruleOffset = base + len(out)
+        out += stringList(self.affixRules)
+
+        repOffset = base + len(out)
+        out += stringList(s for pair in self.replacements for s in pair)
+
+        otherOffset = base + len(out)
+        out += stringList(self.otherCommands)
+
+        AFF_HEADER.pack_into(out, 0, groupOffset, ruleOffset,
+            repOffset, otherOffset)
+        return bytes(out)
+
+
+def stringList(strings):
+    out = bytearray()
+    for s in strings:
+        out += s.encode("utf-8") + b"\0"
+    out += b"\0"
+    return out
+
+
+# Trie serialization
+#
+# Nodes are built bottom up. Each call returns (pieces, size, fixups) where
+# pieces is a list of byte chunks and fixups are the 32-bit lookup offsets
+# that must be relocated once the final position of the node is known.
+
+def serializeTrie(items, base=0):
+    "items: sorted list of (word bytes, affix ids)"
+    if not items:
+        # an empty dictionary still needs a root node
+        pieces, size, fixups = serializeLookup([], 0)
+    else:
+        pieces, size, fixups = buildNode(items, 0, len(items), 0)
+    return joinPieces(pieces, fixups, base)
+
+
+def joinPieces(pieces, fixups, base=0):
+    for chunk, idx, value in fixups:
+        U32.pack_into(chunk, idx, value + base)
+    return b"".join(pieces)
+
+
+def buildNode(items, lo, hi, depth):
+    if hi - lo == 1:
+        key, ids = items[lo]
+        return serializeLeaf(key[depth:], ids)
+
+    groups = []
+    i = lo
+    if len(items[i][0]) == depth:
+        groups.append((0, i, i+1))
+        i += 1
+    while i < hi:
+        c = items[i][0][depth]
+        j = i + 1
+        while j < hi and items[j][0][depth] == c:
+            j += 1
+        groups.append((c, i, j))
+        i = j
+
+    children = [
+        (c, buildNode(items, a, b, depth+1 if c else depth))
+        for c, a, b in groups
+    ]
+    return serializeChildren(children)
+
+
+def serializeChildren(children):
+    "children: sorted list of (char, (pieces, size, fixups))"
+    if len(children) <= LIST_NODE_MAX_ITEMS:
+        node = serializeList(children)
+        if node:
+            return node
+    return serializeLookup(children, sum(n[1] for _, n in children))
+
+
+def serializeLeaf(addition, ids):
+    ids = list(ids) or [0]
+    first = ids[0]
+    rest = ids[1:]
+    if first > LEAF_NODE_MAX_FIRST_AFFIX_ID:
+        first = FIRST_AFFIX_IS_UNUSED
+        rest = ids
+    idByte = (first >> 8) & LEAF_NODE_FIRST_BYTE_AFFIX_MASK
+    if addition:
+        idByte |= LEAF_NODE_ADDITIONAL_VALUE
+    if rest:
+        idByte |= LEAF_NODE_FOLLOWING_VALUE
+    out = bytearray((idByte, first & 0xFF))
+    if addition:
+        out += addition + b"\0"
+    if rest:
+        for i in rest:
+            out += U16.pack(i)
+        out += U16.pack(LEAF_NODE_FOLLOWING_LIST_TERMINATOR)
+    return [out], len(out), []
+
+
+def serializeList(children):
+    offsets = []
+    total = 0
+    for _, (_, size, _) in children:
+        offsets.append(total)
+        total += size
+    if offsets[-1] > 0xFFFF:
+        return None
+    is16 = offsets[-1] > 0xFF
+
+    head = bytearray((LIST_NODE_TYPE_VALUE
+        | (LIST_NODE_16BIT_MASK if is16 else 0) | len(children),))
+    for (c, _), off in zip(children, offsets):
+        head.append(c)
+        head += U16.pack(off) if is16 else bytes((off,))
+    return embed(head, children)
+
+
+def serializeLookup(children, total):
+    zth = children[0][1] if children and children[0][0] == 0 else None
+    rest = children[1:] if zth else children
+    first = rest[0][0] if rest else 1
+    size = rest[-1][0] - first + 1 if rest else 0
+
+    for is32 in (False, True):
+        width = 4 if is32 else 2
+        headSize = 3 + (width if zth else 0) + size * width
+        if is32 or headSize + total <= 0xFFFF:
+            break
+
+    idByte = LOOKUP_NODE_TYPE_VALUE
+    if zth:
+        idByte |= LOOKUP_NODE_0TH_MASK
+    if is32:
+        idByte |= LOOKUP_NODE_32BIT_MASK
+    head = bytearray((idByte, first, size))
+    head += bytes(headSize - 3)
+
+    fixups = []
+    offset = headSize
+    table = 3 + (width if zth else 0)
+    for c, (_, childSize, _) in children:
+        idx = 3 if c == 0 else table + (c - first) * width
+        if is32:
+            fixups.append([head, idx, offset])
+        else:
+            U16.pack_into(head, idx, offset)
+        offset += childSize
+    pieces, size, childFixups = embed(head, children)
+    return pieces, size, fixups + childFixups
+
+
+def embed(head, children):
+    pieces = [head]
+    fixups = []
+    pos = len(head)
+    for _, (p, size, fx) in children:
+        for f in fx:
+            f[2] += pos
+        pieces.extend(p)
+        fixups.extend(fx)
+        pos += size
+    return pieces, pos, fixups
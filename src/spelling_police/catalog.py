@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2019-2021 Lovac42
+# Support: https://github.com/lovac42/SpellingPolice
+# License: GNU GPL, version 3 or later; http://www.gnu.org/copyleft/gpl.html
+
+
+# Persistent catalog of the dictionary folder.
+#
+# Records are keyed by the file name without the .disabled suffix, so
+# enabling or disabling a dictionary (a rename) keeps its record. A file
+# is inspected once, in a background thread, and again only when its size
+# or mtime changes. A QFileSystemWatcher on the folder triggers refreshes.
+# The add-on writes to the folder too, its caches, journals, temporary and
+# generated files, so a change only counts if the dictionaries or hunspell
+# sources in it changed, otherwise each write would trigger another.
+
+
+import os, re, json
+from concurrent.futures import ThreadPoolExecutor
+from aqt.qt import *
+
+from .const import *
+from .bdic import inspectDictionary, detectLanguage
+from .timing import timings
+
+
+CATALOG_NAME = "spelling_police_catalog.json"
+CATALOG_VERSION = 2 # records of older versions are inspected again
+
+# files a change of the folder is about
+RE_WATCHED = re.compile(r'\.(bdic|bdic\.disabled|dic|aff)$', re.I)
+
+
+class DictionaryCatalog(QObject):
+    changed = pyqtSignal()
+    # any change to the folder, after it settled
+    folderChanged = pyqtSignal()
+    _inspected = pyqtSignal(str, object, object, object)
+
+    def __init__(self):
+        QObject.__init__(self)
+        self.path = os.path.join(DICT_DIR, CATALOG_NAME)
+        self._records = self._load()
+        self._pending = set()
+        self._executor = ThreadPoolExecutor(2)
+        self._inspected.connect(self._onInspected)
+
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self._onSettled)
+        self._watcher = QFileSystemWatcher(self)
+        if os.path.isdir(DICT_DIR):
+            self._watcher.addPath(DICT_DIR)
+        self._watcher.directoryChanged.connect(self._onDirChanged)
+        self._files = self._snapshot()
+
+        self.refresh()
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if data.get("version") != CATALOG_VERSION:
+            return {}
+        return data["records"]
+
+    def _save(self):
+        try:
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump({"version": CATALOG_VERSION,
+                    "records": self._records}, f, indent=1)
+        except OSError as e:
+            print("SpellingPolice: can't save catalog: %s"%e)
+
+    def _onDirChanged(self, path):
+        # renames come in bursts, wait for them to settle
+        self._timer.start(200)
+
+    def _onSettled(self):
+        files = self._snapshot()
+        if files == self._files:
+            return # only our own files
+        self._files = files
+        self.refresh()
+        self.folderChanged.emit()
+
+    def _snapshot(self):
+        "(name, size, mtime) of the watched files, the generated ones left out"
+        try:
+            names = os.listdir(DICT_DIR)
+        except OSError:
+            return None
+        ret = set()
+        for fn in names:
+            if fn.startswith(HIDDEN_PREFIX) or not RE_WATCHED.search(fn):
+                continue
+            try:
+                st = os.stat(os.path.join(DICT_DIR, fn))
+            except OSError:
+                continue
+            ret.add((fn, st.st_size, st.st_mtime_ns))
+        return ret
+
+    def refresh(self):
+        "Syncs the records with the folder, returns True if anything changed"
+        try:
+            files = os.listdir(DICT_DIR)
+        except OSError:
+            return False
+
+        seen = set()
+        dirty = False
+        for fn in files:
+            if fn.startswith(HIDDEN_PREFIX):
+                continue
+            if RE_DICT_EXT_ENABLED.search(fn):
+                key, enabled = fn, True
+            elif RE_DICT_EXT_DISABLED.search(fn):
+                key, enabled = fn[:-9], False
+            else:
+                continue
+            try:
+                st = os.stat(os.path.join(DICT_DIR, fn))
+            except OSError:
+                continue
+            seen.add(key)
+            rec = self._records.get(key)
+            if (rec and rec["size"] == st.st_size
+                    and rec["mtime"] == st.st_mtime_ns):
+                if rec["file"] != fn or rec["enabled"] != enabled:
+                    rec["file"] = fn
+                    rec["enabled"] = enabled
+                    dirty = True
+                if not rec["checked"]: # interrupted last time
+                    self._inspect(key, fn, st.st_size, st.st_mtime_ns)
+                continue
+            self._records[key] = {
+                "file": fn,
+                "enabled": enabled,
+                "size": st.st_size,
+                "mtime": st.st_mtime_ns,
+                "language": detectLanguage(key),
+                "checked": False,
+            }
+            dirty = True
+            self._inspect(key, fn, st.st_size, st.st_mtime_ns)
+
+        for key in list(self._records):
+            if key not in seen:
+                del self._records[key]
+                dirty = True
+
+        if dirty:
+            self._save()
+            timings.count("catalog.changed")
+            self.changed.emit()
+        return dirty
+
+    def _inspect(self, key, fn, size, mtime):
+        if (key, size, mtime) in self._pending:
+            return
+        self._pending.add((key, size, mtime))
+        path = os.path.join(DICT_DIR, fn)
+        f = self._executor.submit(inspectDictionary, path)
+        # emitted from the worker thread, delivered on the main thread
+        f.add_done_callback(lambda f: self._inspected.emit(
+            key, size, mtime, f.result()))
+
+    def _onInspected(self, key, size, mtime, info):
+        self._pending.discard((key, size, mtime))
+        rec = self._records.get(key)
+        if not rec or rec["size"] != size or rec["mtime"] != mtime:
+            return # changed again meanwhile
+        rec.update(info)
+        rec["checked"] = True
+        self._save()
+        self.changed.emit()
+
+    def entries(self):
+        "Records sorted enabled first, like the folder listing of old"
+        return sorted(self._records.values(),
+            key=lambda r: (not r["enabled"], r["file"].lower()))
+
+    def enabled(self):
+        return [r["file"][:-5] for r in self.entries() if r["enabled"]]
+
+    def isChecking(self):
+        return bool(self._pending)
+
+
+_catalog = None
+
+def getCatalog():
+    global _catalog
+    if _catalog is None:
+        _catalog = DictionaryCatalog()
+    return _catalog
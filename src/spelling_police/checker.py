@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2019-2021 Lovac42
+# Support: https://github.com/lovac42/SpellingPolice
+# License: GNU GPL, version 3 or later; http://www.gnu.org/copyleft/gpl.html
+
+
+# Python side spell checking over one or more .bdic files.
+# Used from worker processes, must not import aqt.
+
+
+import multiprocessing, os, sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from .bdic import BDict, BDictError
+from .dawg import Dawg, compiledPath, isFresh
+from .tokenizer import tokenize
+from .auditcache import pathsFingerprint
+from .verdictcache import VerdictCache
+from .hashset import BatchChecker
+
+
+FIELD_SEP = "\x1f"
+
+class SpellChecker:
+    """A word is correct if any of the dictionaries accepts it.
+    Compiled dictionaries in cacheDir are used when they are up to date.
+    With a VerdictCache every word is looked up only once, with a
+    BatchChecker many words are looked up at once."""
+
+    def __init__(self, paths, cacheDir=None, verdicts=None, batch=None):
+        self.verdicts = verdicts
+        self.batch = batch
+        self.dicts = []
+        for p in paths:
+            try:
+                self.dicts.append(openDictionary(p, cacheDir))
+            except (OSError, ValueError) as e:
+                print("SpellingPolice: can't load %s: %s"%(p, e))
+
+    def close(self):
+        for d in self.dicts:
+            d.close()
+        self.dicts = []
+        if self.verdicts:
+            self.verdicts.close()
+
+    def isCorrect(self, word):
+        if self.verdicts:
+            return self.verdicts.isCorrect(word, self._check)
+        return self._check(word)
+
+    def _check(self, word):
+        for d in self.dicts:
+            if d.isCorrect(word):
+                return True
+        return not self.dicts
+
+    def misspelled(self, words, seen=None):
+        if self.verdicts:
+            self.verdicts.prefetch(words)
+            return [w for w in words if not self.isCorrect(w)]
+        seen = {} if seen is None else seen
+        bad = []
+        for w in words:
+            ok = seen.get(w)
+            if ok is None:
+                ok = seen[w] = self.isCorrect(w)
+            if not ok:
+                bad.append(w)
+        return bad
+
+    def checkMany(self, words):
+        "{word: verdict} for many words"
+        words = set(words)
+        ret = {}
+        v = self.verdicts
+        if v:
+            v.prefetch(words)
+            for w in words:
+                ok = v.known(w)
+                if ok is not None:
+                    ret[w] = ok
+            todo = [w for w in words if w not in ret]
+        else:
+            todo = list(words)
+        if self.batch and todo:
+            found = self.batch.contains(todo)
+            for w, hit in zip(todo, found):
+                if hit:
+                    ret[w] = True
+            rest = [w for w, hit in zip(todo, found) if not hit]
+        else:
+            rest = todo
+        for w in rest:
+            ret[w] = self._check(w)
+        if v:
+            for w in todo:
+                v.put(w, ret[w])
+        return ret
+
+
+def openDictionary(path, cacheDir=None):
+    if cacheDir:
+        compiled = compiledPath(path, cacheDir)
+        if isFresh(compiled, path):
+            return Dawg(compiled)
+    return BDict(path)
+
+
+# Worker process side
+
+_checker = None
+
+
+def initWorker(paths, cacheDir=None, verdictDb=None):
+    "verdictDb: sqlite file that keeps word verdicts across runs"
+    global _checker
+    verdicts = VerdictCache(pathsFingerprint(paths), verdictDb)
+    _checker = SpellChecker(paths, cacheDir, verdicts, BatchChecker.load(paths))
+
+
+def checkNotes(rows):
+    """rows: list of (nid, mid, flds)
+    returns list of (nid, mid, [(field ord, [misspelled words])])"""
+    notes = [(nid, mid, [tokenize(f) for f in flds.split(FIELD_SEP)])
+        for nid, mid, flds in rows]
+    # the words of the whole chunk in one go
+    ok = _checker.checkMany(w for _, _, fields in notes
+        for words in fields for w in words)
+    ret = []
+    for nid, mid, fields in notes:
+        bad = []
+        for ord, words in enumerate(fields):
+            words = [w for w in words if not ok[w]]
+            if words:
+                bad.append((ord, words))
+        if bad:
+            ret.append((nid, mid, bad))
+    if _checker.verdicts:
+        _checker.verdicts.flush()
+    return ret
+
+
+def makeExecutor(workers=None, initializer=None, initargs=()):
+    """Process pool for use inside Anki.
+    Spawning from inside a frozen Anki would start another Anki,
+    so only fork is used, with a single thread as fallback."""
+    workers = workers or max(1, (os.cpu_count() or 2) - 1)
+    if hasattr(os, "fork") and sys.platform != "darwin":
+        try:
+            return ProcessPoolExecutor(workers,
+                mp_context=multiprocessing.get_context("fork"),
+                initializer=initializer, initargs=initargs)
+        except (OSError, ValueError):
+            pass
+    return ThreadPoolExecutor(1, initializer=initializer, initargs=initargs)
@@ -32,6 +32,11 @@ class Config():
     def has(self, key):
         return self.config.get(key)!=None
 
+    def save(self):
+        "Writes the config back, for settings changed from the addon"
+        if getattr(mw.addonManager, "writeConfig", None):
+            mw.addonManager.writeConfig(__name__, self.config)
+
 
     def _onProfileLoaded(self):
         if ANKI21: # or ccbc
@@ -22,18 +22,29 @@ RE_DICT_EXT_ENABLED = re.compile(r'\.bdic$', re.I)
 
 RE_DICT_EXT_DISABLED = re.compile(r'\.bdic\.disabled$', re.I)
 
+# generated dictionaries, not listed in the dialog
+HIDDEN_PREFIX = "_sp_"
+
 if not ALT_BUILD_VERSION:
     DICT_DIR = os.path.join(mw.pm.base, "dictionaries")
 else:
     from aqt import moduleDir
     # Wins only, prob won't work on mac or linux w/o permission
     DICT_DIR = os.path.join(moduleDir, "qtwebengine_dictionaries")
+# read when chromium starts, so this one can't wait for the profile
 os.environ["QTWEBENGINE_DICTIONARIES_PATH"] = DICT_DIR
 
-try:
-    Path(DICT_DIR).mkdir(parents=True, exist_ok=True)
-except:
-    print("Can't create dictionary folder, check permissions.")
+CACHE_DIR = os.path.join(DICT_DIR, "spelling_police_cache")
+
+
+def ensureDictDir():
+    "Creates the dictionary folder, on profile load rather than import"
+    try:
+        Path(DICT_DIR).mkdir(parents=True, exist_ok=True)
+        return True
+    except:
+        print("Can't create dictionary folder, check permissions.")
+        return False
 
 
 ALT_BUILD_INSTRUCTIONS = """\
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2019-2021 Lovac42
+# Support: https://github.com/lovac42/SpellingPolice
+# License: GNU GPL, version 3 or later; http://www.gnu.org/copyleft/gpl.html
+
+
+from concurrent.futures import ThreadPoolExecutor
+from aqt.qt import *
+
+from .const import *
+from .checker import makeExecutor
+from .dicconvert import convertAll, findSources
+from .catalog import getCatalog
+
+
+class DictionaryConverter(QObject):
+    "Converts hunspell .dic/.aff pairs dropped into the folder, in the background"
+
+    # names of the written dictionaries
+    converted = pyqtSignal(object)
+    _done = pyqtSignal(object)
+
+    def __init__(self):
+        QObject.__init__(self)
+        self._running = False
+        self._again = False
+        # emitted from the worker thread, delivered on the main thread
+        self._done.connect(self._finished)
+
+    def update(self):
+        if self._running:
+            self._again = True
+            return
+        if not findSources(DICT_DIR):
+            return
+        self._running = True
+        ex = ThreadPoolExecutor(1)
+        f = ex.submit(self._run)
+        f.add_done_callback(self._emit)
+        ex.shutdown(wait=False)
+
+    def _run(self):
+        # the sub-tries are built in a process pool
+        pool = makeExecutor()
+        try:
+            return convertAll(DICT_DIR, CACHE_DIR, pool)
+        finally:
+            pool.shutdown()
+
+    def _emit(self, future):
+        try:
+            names = future.result()
+        except Exception as e:
+            print("SpellingPolice: can't convert dictionaries: %s"%e)
+            names = []
+        self._done.emit(names)
+
+    def _finished(self, names):
+        self._running = False
+        if names:
+            # the watcher would notice too, but only after a delay
+            getCatalog().refresh()
+            self.converted.emit(names)
+        if self._again:
+            self._again = False
+            self.update()
@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2019-2021 Lovac42
+# Support: https://github.com/lovac42/SpellingPolice
+# License: GNU GPL, version 3 or later; http://www.gnu.org/copyleft/gpl.html
+
+
+# Compiled dictionaries: every word form of a .bdic with the affix rules
+# already applied, stored as a minimized automaton (DAWG) over utf-8 bytes.
+#
+# The automaton is a flat array of 64-bit edges, mapped read-only so all
+# processes share one copy. The edges of a node are contiguous and sorted:
+#   bits 0-7    label byte
+#   bit  8      a word ends after this edge
+#   bit  9      last edge of the node
+#   bits 10-41  index of the first edge of the target node, 0 = no edges
+#
+# The header keeps the size, mtime and digest of the source file, the
+# compiled file is rebuilt only when those change.
+#
+# Must not import aqt.
+
+
+import mmap, os, struct
+from array import array
+
+from .bdic import BDict, SIGNATURE, HEADER_V2, caseVariants
+
+
+MAGIC = b"SPDW"
+VERSION = 1
+HEADER = struct.Struct("<4sHHIIQQQQ16s") # 64 bytes, keeps the edges aligned
+
+FINAL = 1 << 8
+LAST = 1 << 9
+TARGET_SHIFT = 10
+
+
+class _Node:
+    __slots__ = ("edges", "final")
+
+    def __init__(self):
+        self.edges = [] # sorted [label, node]
+        self.final = False
+
+    def signature(self):
+        return (self.final, tuple((l, id(n)) for l, n in self.edges))
+
+
+def buildDawg(words):
+    """Incremental construction of a minimal automaton from sorted,
+    unique byte strings (Daciuk et al. 2000). Returns (root, count)"""
+    register = {}
+    root = _Node()
+    prev = b""
+    count = 0
+
+    def minimize(node):
+        # replace the last child chain below node by registered equivalents
+        if not node.edges:
+            return
+        child = node.edges[-1][1]
+        minimize(child)
+        sig = child.signature()
+        same = register.get(sig)
+        if same is not None:
+            node.edges[-1][1] = same
+        else:
+            register[sig] = child
+
+    for w in words:
+        if w == prev:
+            continue
+        common = 0
+        n = min(len(w), len(prev))
+        while common < n and w[common] == prev[common]:
+            common += 1
+        # walk to the end of the common prefix
+        node = root
+        for c in w[:common]:
+            node = node.edges[-1][1]
+        minimize(node)
+        for c in w[common:]:
+            child = _Node()
+            node.edges.append([c, child])
+            node = child
+        node.final = True
+        prev = w
+        count += 1
+    minimize(root)
+    return root, count
+
+
+def serializeDawg(root):
+    "Returns the edge array, edge 0 is a dummy so 0 can mean 'no edges'"
+    addr = {}
+    order = []
+    stack = [root]
+    total = 1
+    while stack:
+        node = stack.pop()
+        if id(node) in addr or not node.edges:
+            continue
+        addr[id(node)] = total
+        order.append(node)
+        total += len(node.edges)
+        for _, child in node.edges:
+            stack.append(child)
+
+    edges = array("Q", bytes(8 * total))
+    for node in order:
+        pos = addr[id(node)]
+        last = len(node.edges) - 1
+        for i, (label, child) in enumerate(node.edges):
+            e = label | (addr.get(id(child), 0) << TARGET_SHIFT)
+            if child.final:
+                e |= FINAL
+            if i == last:
+                e |= LAST
+            edges[pos + i] = e
+    return edges, addr.get(id(root), 0)
+
+
+def sourceInfo(bdicPath):
+    st = os.stat(bdicPath)
+    with open(bdicPath, "rb") as f:
+        head = f.read(HEADER_V2.size)
+    digest = bytes(16)
+    if len(head) == HEADER_V2.size:
+        sig, major, _, _, _, d = HEADER_V2.unpack(head)
+        if sig == SIGNATURE and major >= 2:
+            digest = d
+    return st.st_size, st.st_mtime_ns, digest
+
+
+def compiledPath(bdicPath, cacheDir):
+    name = os.path.basename(bdicPath)
+    return os.path.join(cacheDir, name[:-5] + ".dawg")
+
+
+def isFresh(path, bdicPath):
+    try:
+        with open(path, "rb") as f:
+            head = f.read(HEADER.size)
+        magic, ver, _, _, _, _, _, size, mtime, digest = HEADER.unpack(head)
+    except (OSError, struct.error):
+        return False
+    if magic != MAGIC or ver != VERSION:
+        return False
+    try:
+        srcSize, srcMtime, srcDigest = sourceInfo(bdicPath)
+    except OSError:
+        return False
+    if (size, mtime) == (srcSize, srcMtime):
+        return True
+    if size == srcSize and digest == srcDigest and any(digest):
+        # touched but not changed, remember the new mtime
+        with open(path, "r+b") as f:
+            f.write(HEADER.pack(magic, ver, 0, *HEADER.unpack(head)[3:7],
+                size, srcMtime, digest))
+        return True
+    return False
+
+
+def compileDictionary(bdicPath, cacheDir, force=False):
+    "Compiles bdicPath into cacheDir unless it is up to date, returns the path"
+    path = compiledPath(bdicPath, cacheDir)
+    if not force and isFresh(path, bdicPath):
+        return path
+    size, mtime, digest = sourceInfo(bdicPath)
+    with BDict(bdicPath) as d:
+        words = sorted(set(w.encode("utf-8") for w in d.expand() if w))
+    root, count = buildDawg(words)
+    del words
+    edges, rootAddr = serializeDawg(root)
+
+    os.makedirs(cacheDir, exist_ok=True)
+    tmp = "%s.%d.tmp"%(path, os.getpid())
+    with open(tmp, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, 0, rootAddr, 0,
+            len(edges), count, size, mtime, digest))
+        f.write(edges.tobytes())
+    os.replace(tmp, path)
+    return path
+
+
+def compileAll(bdicPaths, cacheDir):
+    "Worker entry point"
+    ret = []
+    for p in bdicPaths:
+        try:
+            ret.append(compileDictionary(p, cacheDir))
+        except Exception as e:
+            print("SpellingPolice: can't compile %s: %s"%(p, e))
+    return ret
+
+
+class Dawg:
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, ver, _, self._root, _, nEdges, self._count,
+            _, _, _) = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or ver != VERSION:
+            self._mm.close()
+            raise ValueError("Not a compiled dictionary: %s"%path)
+        self._edges = memoryview(self._mm)[
+            HEADER.size:HEADER.size+8*nEdges].cast("Q")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        if self._mm is not None:
+            self._edges.release()
+            self._mm.close()
+            self._mm = None
+
+    def __len__(self):
+        return self._count
+
+    def _walk(self, key):
+        "Returns the edge reached by key (bytes), or None"
+        edges = self._edges
+        node = self._root
+        e = None
+        for c in key:
+            if not node:
+                return None
+            while True:
+                e = edges[node]
+                label = e & 0xFF
+                if label == c:
+                    break
+                if label > c or e & LAST:
+                    return None
+                node += 1
+            node = e >> TARGET_SHIFT
+        return e
+
+    def __contains__(self, word):
+        if not word:
+            return False
+        e = self._walk(word.encode("utf-8"))
+        return e is not None and bool(e & FINAL)
+
+    def isCorrect(self, word):
+        word = word.strip()
+        if not word:
+            return True
+        for w in caseVariants(word):
+            if w in self:
+                return True
+        return False
+
+    def hasPrefix(self, prefix):
+        return not prefix or self._walk(prefix.encode("utf-8")) is not None
+
+    def words(self, prefix=""):
+        "Yields all words starting with prefix, in byte order"
+        key = prefix.encode("utf-8")
+        if key:
+            e = self._walk(key)
+            if e is None:
+                return
+            if e & FINAL:
+                yield prefix
+            node = e >> TARGET_SHIFT
+        else:
+            node = self._root
+        edges = self._edges
+        stack = [(node, key)]
+        while stack:
+            node, path = stack.pop()
+            if node is None:
+                yield path.decode("utf-8", "replace")
+                continue
+            if not node:
+                continue
+            batch = []
+            while True:
+                e = edges[node]
+                batch.append(e)
+                if e & LAST:
+                    break
+                node += 1
+            # pushed in reverse so words come out sorted, a word before
+            # its continuations
+            for e in reversed(batch):
+                w = path + bytes((e & 0xFF,))
+                stack.append((e >> TARGET_SHIFT, w))
+                if e & FINAL:
+                    stack.append((None, w))
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2019-2021 Lovac42
+# Support: https://github.com/lovac42/SpellingPolice
+# License: GNU GPL, version 3 or later; http://www.gnu.org/copyleft/gpl.html
+
+
+import os
+from aqt.qt import *
+
+from .const import *
+from .checker import makeExecutor
+from .langid import LanguageIdentifier, buildProfiles, profilePath
+
+
+class LanguageDetector(QObject):
+    "Language profiles of the enabled dictionaries, built in the background"
+
+    _done = pyqtSignal(object, object)
+
+    def __init__(self):
+        QObject.__init__(self)
+        self.identifier = None
+        self._future = None
+        # emitted from the worker thread, delivered on the main thread
+        self._done.connect(self._built)
+
+    def update(self, dicts):
+        self.identifier = None
+        self._future = None
+        if len(dicts) < 2:
+            return # nothing to choose from
+        paths = [os.path.join(DICT_DIR, d+".bdic") for d in dicts]
+        ex = makeExecutor(1)
+        f = ex.submit(buildProfiles, paths, CACHE_DIR)
+        self._future = f
+        f.add_done_callback(lambda f: self._done.emit(f, dicts))
+        ex.shutdown(wait=False)
+
+    def _built(self, future, dicts):
+        if future is not self._future:
+            return # superseded
+        self._future = None
+        try:
+            future.result()
+            ident = LanguageIdentifier()
+            for d in dicts:
+                path = profilePath(os.path.join(DICT_DIR, d+".bdic"), CACHE_DIR)
+                if os.path.exists(path):
+                    ident.load(d, path)
+        except Exception as e:
+            print("SpellingPolice: can't load language profiles: %s"%e)
+            return
+        self.identifier = ident
+
+    def pick(self, text, candidates):
+        "Dictionaries that match the language of text, all until ready"
+        ident = self.identifier
+        if not ident:
+            return candidates
+        return ident.pick(text, candidates)
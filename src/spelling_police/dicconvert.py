@@ -0,0 +1,369 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2019-2021 Lovac42
+# Support: https://github.com/lovac42/SpellingPolice
+# License: GNU GPL, version 3 or later; http://www.gnu.org/copyleft/gpl.html
+
+
+# Converts hunspell .dic/.aff pairs into chromium .bdic files, the way
+# chromium's convert_dict does: the .aff is re-encoded to UTF-8, affix
+# flag strings become AF groups and rule continuation flags become group
+# numbers, unless the .aff already uses AF aliases.
+#
+# The .dic is streamed into bucket files by the first two bytes of each
+# word, so only one bucket is sorted in memory at a time. Buckets are
+# built into sub-tries in parallel and joined under the root, the result
+# is the same file a single sorted build would give.
+#
+# Inputs are skipped when their content hash matches the last run, the
+# hashes are kept in a json file in the cache folder.
+#
+# Must not import aqt, the tries are built in worker processes.
+
+
+import codecs, hashlib, json, os, re, shutil, tempfile
+
+from .bdicwriter import (BDictWriter, MAX_AFFIXES_PER_WORD, buildNode,
+    serializeChildren, serializeLeaf, serializeLookup)
+
+
+VERSION = 1
+STATE_NAME = "converted.json"
+
+BUFFER_BYTES = 8 << 20 # bucket lines held before they are written out
+TASK_BYTES = 1 << 20   # bucket data per worker task
+
+# SET names hunspell knows that python doesn't
+ENCODINGS = {
+    "microsoft-cp1250": "cp1250",
+    "microsoft-cp1251": "cp1251",
+    "microsoft-cp1253": "cp1253",
+    "microsoft-cp1254": "cp1254",
+    "tis620-2533": "tis-620",
+    "iscii-devanagari": "utf-8", # never used by the shipped files
+}
+
+# morphological fields, e.g. "po:noun", may follow the word
+RE_MORPH = re.compile(r"^[a-z]{2}:")
+
+
+def pyEncoding(name):
+    name = ENCODINGS.get(name.lower(), name)
+    try:
+        return codecs.lookup(name).name
+    except LookupError:
+        raise ValueError("Unknown encoding %s"%name)
+
+
+def findSet(raw):
+    "The SET encoding of the raw .aff bytes, hunspell's default otherwise"
+    for line in raw.splitlines():
+        parts = line.split()
+        if len(parts) > 1 and parts[0] == b"SET":
+            return parts[1].decode("ascii", "replace")
+    return "ISO8859-1"
+
+
+class AffixFile:
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            raw = f.read()
+        self.encoding = pyEncoding(findSet(raw))
+        text = raw.decode(self.encoding, "replace").lstrip("\ufeff")
+
+        self.aliased = False
+        self.groups = [] # flag strings, affix id = index + 1
+        self._index = {}
+        self.rules = []
+        self.replacements = []
+        self.others = ["SET UTF-8"]
+
+        seen = set() # the first AF and REP lines are counts
+        for line in text.splitlines():
+            parts = line.split()
+            if not parts or parts[0].startswith("#"):
+                continue
+            cmd = parts[0]
+            if cmd == "SET":
+                continue
+            if cmd in ("AF", "REP") and cmd not in seen:
+                seen.add(cmd)
+                continue
+            if cmd == "AF":
+                self.aliased = True
+                flags = parts[1] if len(parts) > 1 else ""
+                self.groups.append("" if flags.startswith("#") else flags)
+            elif cmd == "REP":
+                if len(parts) > 2:
+                    self.replacements.append((parts[1], parts[2]))
+            elif cmd in ("PFX", "SFX"):
+                if len(parts) > 4 and "/" in parts[3] and not self.aliased:
+                    add, _, cont = parts[3].partition("/")
+                    parts[3] = "%s/%d"%(add, self.affixId(cont))
+                self.rules.append(" ".join(parts))
+            else:
+                self.others.append(" ".join(parts))
+
+    def affixId(self, flags):
+        "Affix id of a flag string from the .dic, 0 for none"
+        if not flags:
+            return 0
+        if self.aliased:
+            return int(flags) if flags.isdigit() else 0
+        i = self._index.get(flags)
+        if i is None:
+            self.groups.append(flags)
+            i = self._index[flags] = len(self.groups)
+        return i
+
+
+def splitEntry(line):
+    "Word and flag string of a .dic line, morphological fields dropped"
+    line = line.strip()
+    if " " not in line and "\t" not in line and "\\" not in line:
+        i = line.find("/", 1)
+        return (line, "") if i < 0 else (line[:i], line[i+1:])
+    line = line.split("\t", 1)[0].strip()
+    parts = line.split(" ")
+    keep = parts[:1]
+    for p in parts[1:]:
+        if RE_MORPH.match(p):
+            break
+        keep.append(p)
+    line = " ".join(keep)
+    # a slash that is part of the word is escaped
+    i = 1
+    while True:
+        i = line.find("/", i)
+        if i < 0:
+            return line.replace("\\/", "/"), ""
+        if line[i-1] != "\\":
+            return line[:i].replace("\\/", "/"), line[i+1:]
+        i += 1
+
+
+class _Buckets:
+    "Words by their first two bytes, appended to one file each"
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.sizes = {}
+        self._lines = {}
+        self._held = 0
+
+    def add(self, word, affixId):
+        key = word[:2]
+        line = b"%s\t%d\n"%(word, affixId)
+        self._lines.setdefault(key, []).append(line)
+        self._held += len(line)
+        if self._held >= BUFFER_BYTES:
+            self.flush()
+
+    def flush(self):
+        for key, lines in self._lines.items():
+            data = b"".join(lines)
+            with open(os.path.join(self.folder, key.hex()), "ab") as f:
+                f.write(data)
+            self.sizes[key] = self.sizes.get(key, 0) + len(data)
+        self._lines = {}
+        self._held = 0
+
+    def tasks(self, size):
+        "Bucket paths in lists of about size bytes"
+        ret = [[]]
+        held = 0
+        for key in sorted(self.sizes):
+            if held >= size:
+                ret.append([])
+                held = 0
+            ret[-1].append(os.path.join(self.folder, key.hex()))
+            held += self.sizes[key]
+        return [t for t in ret if t]
+
+
+def buildBuckets(paths):
+    """Worker, builds the sub-trie of every bucket file.
+    Returns a list of (key, node, word count, the word if it's the only one)"""
+    ret = []
+    for path in paths:
+        key = bytes.fromhex(os.path.basename(path))
+        words = {}
+        with open(path, "rb") as f:
+            for line in f:
+                word, _, aid = line.rstrip(b"\n").rpartition(b"\t")
+                ids = words.setdefault(word, [])
+                aid = int(aid)
+                if aid not in ids and len(ids) < MAX_AFFIXES_PER_WORD:
+                    ids.append(aid)
+        items = sorted(words.items())
+        node = flatten(buildNode(items, 0, len(items), len(key)))
+        ret.append((key, node, len(items),
+            items[0] if len(items) == 1 else None))
+    return ret
+
+
+def flatten(node):
+    "The node as one chunk, a list of small ones is slow to pickle"
+    pieces, size, fixups = node
+    where = {}
+    pos = 0
+    for p in pieces:
+        where[id(p)] = pos
+        pos += len(p)
+    chunk = bytearray(b"".join(pieces))
+    return [chunk], size, [[chunk, where[id(c)] + idx, value]
+        for c, idx, value in fixups]
+
+
+def joinBuckets(results):
+    "The root node over the bucket sub-tries, as buildNode would make it"
+    byFirst = {}
+    for r in results:
+        byFirst.setdefault(r[0][0], []).append(r)
+    top = []
+    total = 0
+    only = None
+    for c in sorted(byFirst):
+        # the one byte word, if any, sorts first and is the 0th child
+        parts = sorted(byFirst[c], key=lambda r: r[0])
+        n = sum(r[2] for r in parts)
+        if n == 1:
+            only = parts[0][3]
+            node = serializeLeaf(only[0][1:], only[1])
+        else:
+            node = serializeChildren([(key[1] if len(key) > 1 else 0, node)
+                for key, node, _, _ in parts])
+        top.append((c, node))
+        total += n
+    if not total:
+        return serializeLookup([], 0), 0
+    if total == 1:
+        return serializeLeaf(only[0], only[1]), 1
+    return serializeChildren(top), total
+
+
+def convertDictionary(dicPath, affPath, outPath, executor=None):
+    """Writes the .bdic of a hunspell pair, returns the word count.
+    executor, if given, builds the buckets in parallel"""
+    aff = AffixFile(affPath)
+    folder = tempfile.mkdtemp(prefix="spelling_police_")
+    try:
+        buckets = _Buckets(folder)
+        with open(dicPath, encoding=aff.encoding, errors="replace") as f:
+            first = True
+            for line in f:
+                if first:
+                    first = False
+                    line = line.lstrip("\ufeff")
+                    if line.strip().isdigit(): # approximate word count
+                        continue
+                word, flags = splitEntry(line)
+                key = word.encode("utf-8")
+                if key and b"\0" not in key:
+                    buckets.add(key, aff.affixId(flags))
+        buckets.flush()
+        tasks = buckets.tasks(TASK_BYTES)
+        if executor and len(tasks) > 1:
+            parts = executor.map(buildBuckets, tasks)
+        else:
+            parts = map(buildBuckets, tasks)
+        results = [r for part in parts for r in part]
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+    if len(aff.groups) >= 0xFFFF:
+        raise ValueError("Too many affix groups: %d"%len(aff.groups))
+    root, count = joinBuckets(results)
+    w = BDictWriter()
+    w.comment = "converted from " + os.path.basename(dicPath)
+    w.affixGroups = aff.groups
+    w.affixRules = aff.rules
+    w.replacements = aff.replacements
+    w.otherCommands = aff.others
+    w.setRoot(root)
+    w.write(outPath)
+    return count
+
+
+# Folder sync
+
+def findSources(dictDir):
+    "(name, dic path, aff path) for every .dic with an .aff next to it"
+    try:
+        files = os.listdir(dictDir)
+    except OSError:
+        return []
+    lower = {fn.lower(): fn for fn in files}
+    ret = []
+    for fn in sorted(files):
+        name, ext = os.path.splitext(fn)
+        if ext.lower() != ".dic" or fn.startswith("_sp_"):
+            continue
+        aff = lower.get(name.lower() + ".aff")
+        if aff:
+            ret.append((name, os.path.join(dictDir, fn),
+                os.path.join(dictDir, aff)))
+    return ret
+
+
+def sourceHash(dicPath, affPath):
+    h = hashlib.sha1(b"%d"%VERSION)
+    for path in (affPath, dicPath):
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def _stat(path):
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+
+def outputPath(dictDir, name):
+    "The .bdic of name, or its disabled file if the user turned it off"
+    path = os.path.join(dictDir, name + ".bdic")
+    if not os.path.exists(path) and os.path.exists(path + ".disabled"):
+        return path + ".disabled"
+    return path
+
+
+def convertAll(dictDir, stateDir, executor=None):
+    "Converts the new or changed pairs in dictDir, returns their names"
+    statePath = os.path.join(stateDir, STATE_NAME)
+    try:
+        with open(statePath, encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        state = {}
+
+    written = []
+    dirty = False
+    for name, dic, aff in findSources(dictDir):
+        out = outputPath(dictDir, name)
+        exists = os.path.exists(out)
+        rec = state.get(name)
+        if exists and not rec:
+            continue # a .bdic the user put there, not ours to replace
+        try:
+            stats = [_stat(dic), _stat(aff)]
+            if exists and rec["stat"] == stats:
+                continue
+            digest = sourceHash(dic, aff)
+            if exists and rec["hash"] == digest: # touched, not changed
+                rec["stat"] = stats
+                dirty = True
+                continue
+            convertDictionary(dic, aff, out, executor)
+        except (OSError, ValueError) as e:
+            print("SpellingPolice: can't convert %s: %s"%(name, e))
+            continue
+        state[name] = {"hash": digest, "stat": stats}
+        written.append(name)
+        dirty = True
+
+    if dirty:
+        os.makedirs(stateDir, exist_ok=True)
+        with open(statePath, "w", encoding="utf-8") as f:
+            json.dump(state, f, indent=1)
+    return written
@@ -8,36 +8,111 @@ import os
 from aqt import mw
 from aqt.qt import *
 from aqt.utils import openFolder, showInfo
+from anki.hooks import runHook
 
 from .const import *
+from . import auditcache
+from .checker import makeExecutor
+from .dawg import compileAll
+from . import hashset
+from .catalog import getCatalog
+from .spellstate import SpellCheckState
+from .timing import timings
 
 
 class DictionaryManager:
     def __init__(self):
         self.setupMenu()
-
-        self._dicts = [
-            i[:-5] for i in os.listdir(DICT_DIR) if RE_DICT_EXT_ENABLED.search(i)
-        ]
+        self._enabled = getCatalog().enabled()
+        self._dicts = list(self._enabled)
+        self.sets = {} # name: dictionaries
+        self.activeSet = None
+        self.state = SpellCheckState(self._dicts)
+        self._configuring = False
+        # files added or renamed outside the dialog, e.g. by the converter
+        getCatalog().changed.connect(self._onCatalogChanged)
 
     def setupMenu(self):
         a = QAction("Dictionary Configuration", mw)
         a.triggered.connect(self.showConfig)
         mw.form.menuTools.addAction(a)
+        self.menu = mw.form.menuTools.addMenu("Spelling Police")
 
     def showConfig(self):
+        # the time the dialog is open is the user's, only the unloading
+        # and reloading of the languages around it is timed
         p=mw.web._page.profile()
         b=p.isSpellCheckEnabled()
-        p.setSpellCheckEnabled(False)
-        p.setSpellCheckLanguages({})
-        d = DictionaryDialog()
-        self._dicts = d.getDictionaries()
-        p.setSpellCheckEnabled(b)
-        p.setSpellCheckLanguages(self._dicts)
+        with timings.measure("DictionaryManager.release"):
+            self.state.setEnabled(p, False)
+            self.state.release(p)
+        self._configuring = True
+        try:
+            d = DictionaryDialog()
+        finally:
+            self._configuring = False
+        with timings.measure("DictionaryManager.reapply"):
+            self._enabled = d.getDictionaries()
+            self.state.setEnabled(p, b)
+            self._select()
+            self.state.restore(p)
+        runHook(ADDON_NAME+'.dictionariesChanged')
 
     def getDictionaries(self):
         return self._dicts
 
+    def _onCatalogChanged(self):
+        if self._configuring:
+            return # showConfig applies the dialog's list
+        enabled = getCatalog().enabled()
+        if set(enabled) == set(self._enabled):
+            return
+        self._enabled = enabled
+        self._select()
+        runHook(ADDON_NAME+'.dictionariesChanged')
+
+    def setSets(self, sets, active=None):
+        "sets: {name: [dictionaries]} from the config"
+        self.sets = sets
+        self.activeSet = active if active in sets else None
+        self._select()
+
+    def useSet(self, name):
+        """Switches to a set, None for all enabled dictionaries.
+        Files aren't touched, the editor gets the new list in one call"""
+        if name not in self.sets:
+            name = None
+        if name == self.activeSet:
+            return
+        self.activeSet = name
+        self._select()
+        runHook(ADDON_NAME+'.dictionariesChanged')
+
+    def _select(self):
+        names = self.sets.get(self.activeSet)
+        if names is None:
+            self._dicts = list(self._enabled)
+        else:
+            # only enabled files can be loaded by name
+            self._dicts = [d for d in names if d in self._enabled]
+        self.state.setLanguages(self._dicts)
+
+    def compile(self):
+        "Compiles the enabled dictionaries into the cache in the background"
+        paths = [os.path.join(DICT_DIR, d+".bdic") for d in self._dicts]
+        if paths:
+            ex = makeExecutor(1)
+            ex.submit(compileAll, paths, CACHE_DIR)
+            ex.shutdown(wait=False)
+
+    def buildHashes(self):
+        "Hash arrays for batch checks in the audit, needs numpy"
+        paths = [os.path.join(DICT_DIR, d+".bdic") for d in self._dicts]
+        if paths and hashset.HAVE_NUMPY:
+            ex = makeExecutor(1)
+            ex.submit(hashset.buildAll, paths)
+            ex.shutdown(wait=False)
+
 
 
 
@@ -54,7 +129,9 @@ class DictionaryDialog(QDialog):
     def _setupDialog(self):
         self.setWindowTitle("Dictionaries")
         self.setWindowModality(Qt.WindowModal)
-        self.resize(250, 250)
+        self.resize(300, 250)
+        self.catalog = getCatalog()
+        self.catalog.changed.connect(self._update)
 
         layout = QVBoxLayout()
         self.list = QListWidget()
@@ -79,28 +156,32 @@ class DictionaryDialog(QDialog):
         layout.addLayout(control_box)
         self.setLayout(layout)
 
-    def _update(self):
-        self._dict = []
-        self.list.clear()
+    def done(self, r):
+        self.catalog.changed.disconnect(self._update)
+        QDialog.done(self, r)
 
-        try:
-            DICT_FILES=os.listdir(DICT_DIR)
-        except FileNotFoundError:
-            showInfo("Missing or no read/write permission to dictionary folder.")
-            return
+    def _update(self):
+        with timings.measure("DictionaryDialog._update"):
+            self._dict = []
+            self.list.clear()
 
-        for d in DICT_FILES:
-            if RE_DICT_EXT_ENABLED.search(d):
-                item = QListWidgetItem(d)
-                item.setData(Qt.UserRole, d)
-                self.list.addItem(item)
-                self._dict.append(d[:-5])
+            if not os.path.isdir(DICT_DIR):
+                showInfo("Missing or no read/write permission to dictionary folder.")
+                return
 
-        for d in DICT_FILES:
-            if RE_DICT_EXT_DISABLED.search(d):
+            for rec in self.catalog.entries():
+                d = rec["file"]
                 item = QListWidgetItem(d)
                 item.setData(Qt.UserRole, d)
+                item.setToolTip(describe(rec))
+                if not rec["checked"]:
+                    item.setText(d + " (checking...)")
+                elif not rec.get("valid"):
+                    item.setText(d + " (corrupt)")
+                    item.setForeground(QBrush(QColor("red")))
                 self.list.addItem(item)
+                if rec["enabled"]:
+                    self._dict.append(d[:-5])
 
     def _browse(self):
         if os.path.exists(DICT_DIR):
@@ -113,30 +194,52 @@ class DictionaryDialog(QDialog):
             showInfo(ALT_BUILD_INSTRUCTIONS, title="Instructions", textFormat="rich")
 
     def _enable(self):
-        sel = [i for i in range(self.list.count())
-                if self.list.item(i).isSelected()]
-        if sel:
-            for i in sel:
-                fn=self.list.item(i).text()
-                if RE_DICT_EXT_DISABLED.search(fn):
-                    f=os.path.join(DICT_DIR, fn)
-                    os.rename(f, f[:-9])
-        self._update()
+        with timings.measure("DictionaryDialog._enable"):
+            sel = [i for i in range(self.list.count())
+                    if self.list.item(i).isSelected()]
+            if sel:
+                for i in sel:
+                    fn=self.list.item(i).data(Qt.UserRole)
+                    if RE_DICT_EXT_DISABLED.search(fn):
+                        f=os.path.join(DICT_DIR, fn)
+                        os.rename(f, f[:-9])
+                auditcache.invalidate(DICT_DIR)
+            if not self.catalog.refresh():
+                self._update()
 
     def _disable(self):
-        sel = [i for i in range(self.list.count())
-                if self.list.item(i).isSelected()]
-        if sel:
-            for i in sel:
-                fn=self.list.item(i).text()
-                if RE_DICT_EXT_ENABLED.search(fn):
-                    f=os.path.join(DICT_DIR, fn)
-                    os.rename(f, f+'.disabled')
-        self._update()
+        with timings.measure("DictionaryDialog._disable"):
+            sel = [i for i in range(self.list.count())
+                    if self.list.item(i).isSelected()]
+            if sel:
+                for i in sel:
+                    fn=self.list.item(i).data(Qt.UserRole)
+                    if RE_DICT_EXT_ENABLED.search(fn):
+                        f=os.path.join(DICT_DIR, fn)
+                        os.rename(f, f+'.disabled')
+                auditcache.invalidate(DICT_DIR)
+            if not self.catalog.refresh():
+                self._update()
 
     def _toggle(self):
-        fn=self.list.currentItem().text()
+        fn=self.list.currentItem().data(Qt.UserRole)
         if RE_DICT_EXT_ENABLED.search(fn):
             self._disable()
         else:
             self._enable()
+
+
+def describe(rec):
+    lines = [
+        "Size: %.1f KB"%(rec["size"]/1024.0),
+        "Language: %s"%(rec.get("language") or "unknown"),
+    ]
+    if rec["checked"]:
+        lines += [
+            "BDICT version: %s"%(rec.get("version") or "?"),
+            "MD5: %s"%(rec.get("md5") or "none"),
+            "Words: %d"%rec.get("words", 0),
+        ]
+        if rec.get("error"):
+            lines.append("Error: %s"%rec["error"])
+    return "\n".join(lines)
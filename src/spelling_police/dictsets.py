@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2019-2021 Lovac42
+# Support: https://github.com/lovac42/SpellingPolice
+# License: GNU GPL, version 3 or later; http://www.gnu.org/copyleft/gpl.html
+
+
+# Named dictionary sets from the config, as a menu of checkable actions.
+# Shortcuts work from any window, so the editor of the browser or the
+# add dialog can switch too.
+
+
+from aqt.qt import *
+
+
+ALL = "All enabled dictionaries"
+
+
+def parseSets(conf):
+    """{"name": ["dict", ...]} or {"name": {"dictionaries": [...],
+    "shortcut": "Ctrl+Alt+1"}}, returns ({name: dicts}, {name: shortcut})"""
+    sets, keys = {}, {}
+    for name, v in (conf or {}).items():
+        if isinstance(v, dict):
+            sets[name] = list(v.get("dictionaries", []))
+            if v.get("shortcut"):
+                keys[name] = v["shortcut"]
+        elif isinstance(v, (list, tuple)):
+            sets[name] = list(v)
+    return sets, keys
+
+
+class DictionarySetMenu:
+    def __init__(self, parent, onSelect):
+        self.onSelect = onSelect
+        self.menu = parent.addMenu("Dictionary sets")
+        self.group = None
+
+    def update(self, sets, keys, active):
+        # the menu owns its actions, clear() deletes them
+        self.menu.clear()
+        if self.group:
+            self.group.deleteLater()
+        self.group = QActionGroup(self.menu)
+        for name in [None] + sorted(sets):
+            a = QAction(name or ALL, self.menu)
+            a.setCheckable(True)
+            a.setChecked(name == active)
+            if name in keys:
+                a.setShortcut(QKeySequence(keys[name]))
+                a.setShortcutContext(Qt.ApplicationShortcut)
+            a.triggered.connect(lambda _=None, name=name: self.onSelect(name))
+            self.group.addAction(a)
+            self.menu.addAction(a)
+        self.menu.setEnabled(bool(sets))
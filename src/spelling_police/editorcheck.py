@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2019-2021 Lovac42
+# Support: https://github.com/lovac42/SpellingPolice
+# License: GNU GPL, version 3 or later; http://www.gnu.org/copyleft/gpl.html
+
+
+# Spell checking of the editor fields in python, for the alternate builds
+# whose chromium can't load the dictionaries.
+#
+# The script below keeps the checked text of every top level node of a
+# field, a paragraph or a bare text node. Once typing pauses it sends the
+# nodes whose text changed, one message per field, and draws the ranges
+# that come back as underlines in a layer of its own. The field html is
+# never touched, so nothing ends up in the note.
+
+
+import json, os, weakref
+from collections import OrderedDict
+
+from .const import *
+from .checker import SpellChecker
+from .verdictcache import VerdictCache
+from .auditcache import dictFingerprint
+from .tokenizer import spans
+from .timing import timings
+
+
+CMD_PREFIX = "spellpolice:"
+MAX_CHECKERS = 4 # dictionary combinations kept open, fields may be routed
+
+EDITOR_JS = """
+if (!window.spellingPolice) window.spellingPolice = (function() {
+    var DELAY = 400;
+    var checked = new WeakMap(); // node: {text, ranges}
+    var marked = [];
+    var touched = [];
+    var sent = {};
+    var seq = 0, timer = null, layer = null;
+
+    function isField(node) {
+        return node && node.id && /^f\\d+$/.test(node.id);
+    }
+    function fieldOf(node) {
+        while (node && !isField(node)) node = node.parentNode;
+        return node;
+    }
+    function touch(field) {
+        if (touched.indexOf(field) < 0) touched.push(field);
+    }
+    function onInput(e) {
+        var field = fieldOf(e.target);
+        if (!field) return;
+        touch(field);
+        if (layer) layer.style.display = "none"; // text moves while typing
+        clearTimeout(timer);
+        timer = setTimeout(flush, DELAY);
+    }
+    // sends the top level nodes whose text changed since their last check
+    function flush() {
+        timer = null;
+        touched.forEach(function(field) {
+            if (!document.body.contains(field)) return;
+            var nodes = [], texts = [];
+            for (var i = 0; i < field.childNodes.length; i++) {
+                var node = field.childNodes[i];
+                var text = node.textContent;
+                var c = checked.get(node);
+                if (c && c.text === text) continue;
+                checked.delete(node);
+                if (!/\\S/.test(text)) continue;
+                nodes.push(node);
+                texts.push(text);
+            }
+            if (!nodes.length) return;
+            sent[++seq] = [nodes, texts];
+            pycmd("%s" + JSON.stringify({seq: seq,
+                ord: parseInt(field.id.substr(1)), texts: texts}));
+        });
+        touched = [];
+        draw();
+    }
+    function mark(n, ranges) {
+        var s = sent[n];
+        if (!s) return;
+        delete sent[n];
+        for (var i = 0; i < s[0].length; i++) {
+            var node = s[0][i];
+            if (node.textContent !== s[1][i]) {
+                touch(fieldOf(node)); // edited meanwhile, checked again
+                continue;
+            }
+            checked.set(node, {text: s[1][i], ranges: ranges[i]});
+            if (ranges[i].length && marked.indexOf(node) < 0) marked.push(node);
+        }
+        if (touched.length && !timer) timer = setTimeout(flush, DELAY);
+        draw();
+    }
+    function rangeAt(node, start, end) {
+        var r = document.createRange();
+        if (node.nodeType === 3) {
+            r.setStart(node, start);
+            r.setEnd(node, end);
+            return r;
+        }
+        var walker = document.createTreeWalker(node, NodeFilter.SHOW_TEXT,
+            null, false);
+        var pos = 0, t, started = false;
+        while ((t = walker.nextNode())) {
+            var len = t.nodeValue.length;
+            if (!started && start <= pos + len) {
+                r.setStart(t, start - pos);
+                started = true;
+            }
+            if (started && end <= pos + len) {
+                r.setEnd(t, end - pos);
+                return r;
+            }
+            pos += len;
+        }
+        return null;
+    }
+    function draw() {
+        if (!layer) {
+            layer = document.createElement("div");
+            layer.style.cssText = "position: absolute; left: 0; top: 0; "
+                + "pointer-events: none; z-index: 10000;";
+            document.body.appendChild(layer);
+        }
+        layer.innerHTML = "";
+        layer.style.display = "";
+        var sx = window.pageXOffset, sy = window.pageYOffset;
+        marked = marked.filter(function(node) {
+            var c = checked.get(node);
+            if (!c || !c.ranges.length || !document.body.contains(node))
+                return false;
+            if (c.text !== node.textContent) return true; // stale until checked
+            c.ranges.forEach(function(se) {
+                var r = rangeAt(node, se[0], se[1]);
+                if (!r) return;
+                var rects = r.getClientRects();
+                for (var i = 0; i < rects.length; i++) {
+                    var u = document.createElement("div");
+                    u.style.cssText = "position: absolute; height: 0; "
+                        + "border-bottom: 2px dotted red;"
+                        + "left: " + (rects[i].left + sx) + "px; "
+                        + "top: " + (rects[i].bottom + sy - 2) + "px; "
+                        + "width: " + rects[i].width + "px;";
+                    layer.appendChild(u);
+                }
+            });
+            return true;
+        });
+    }
+    // all fields, after a note was loaded or the dictionaries changed
+    function reset() {
+        checked = new WeakMap();
+        marked = [];
+        sent = {};
+        touched = [];
+        var fields = document.querySelectorAll("[id^=f]");
+        for (var i = 0; i < fields.length; i++)
+            if (isField(fields[i])) touch(fields[i]);
+        clearTimeout(timer);
+        flush();
+    }
+    document.addEventListener("input", onInput, true);
+    window.addEventListener("resize", function() { draw(); });
+    return {reset: reset, mark: mark};
+})();
+"""%CMD_PREFIX
+
+
+class EditorChecker:
+    def __init__(self, dictsFor, personal):
+        """dictsFor(note, ord) returns the dictionary names for a field,
+        words in personal are always correct"""
+        self.dictsFor = dictsFor
+        self.personal = personal
+        self.enabled = False
+        self._checkers = OrderedDict() # dictionary names: SpellChecker
+        self._editors = weakref.WeakSet()
+        self.stats = {"batches": 0, "texts": 0}
+
+    def setEnabled(self, enabled):
+        self.enabled = enabled
+        if not enabled:
+            self.close()
+
+    def reset(self):
+        "Dictionaries changed, the open editors check all fields again"
+        self.close()
+        if self.enabled:
+            for editor in list(self._editors):
+                if editor.web: # None once the editor is closed
+                    editor.web.eval(
+                        "if (window.spellingPolice) spellingPolice.reset();")
+
+    def close(self):
+        for c in self._checkers.values():
+            c.close()
+        self._checkers.clear()
+
+    def loadNote(self, editor):
+        if not self.enabled:
+            return
+        self._editors.add(editor)
+        editor.web.eval(EDITOR_JS + "spellingPolice.reset();")
+
+    def onBridgeCmd(self, editor, cmd):
+        "Returns True if cmd was ours"
+        if not cmd.startswith(CMD_PREFIX):
+            return False
+        if not self.enabled or not editor.note:
+            return True
+        with timings.measure("EditorChecker.check"):
+            data = json.loads(cmd[len(CMD_PREFIX):])
+            dicts = self.dictsFor(editor.note, data["ord"])
+            ranges = self.check(dicts, data["texts"])
+        editor.web.eval("spellingPolice.mark(%d, %s);"%(
+            data["seq"], json.dumps(ranges)))
+        return True
+
+    def _checker(self, dicts):
+        key = tuple(dicts)
+        c = self._checkers.get(key)
+        if c:
+            self._checkers.move_to_end(key)
+            return c
+        paths = [os.path.join(DICT_DIR, d+".bdic") for d in dicts]
+        c = self._checkers[key] = SpellChecker(paths, CACHE_DIR,
+            VerdictCache(dictFingerprint(DICT_DIR, dicts)))
+        if len(self._checkers) > MAX_CHECKERS:
+            self._checkers.popitem(last=False)[1].close()
+        return c
+
+    def check(self, dicts, texts):
+        "[[start, end], ...] of the misspelled words of each text"
+        if not dicts:
+            return [[] for t in texts]
+        self.stats["batches"] += 1
+        self.stats["texts"] += len(texts)
+        found = [list(spans(t)) for t in texts]
+        ok = self._checker(dicts).checkMany(
+            t[s:e] for t, sp in zip(texts, found) for s, e in sp)
+        bad = {w for w, v in ok.items() if not v and w not in self.personal}
+        return [[jsRange(t, s, e) for s, e in sp if t[s:e] in bad]
+            for t, sp in zip(texts, found)]
+
+
+def jsRange(text, start, end):
+    "Offsets in UTF-16 units, what the editor's script counts"
+    if not text or max(text) < "\U00010000":
+        return [start, end]
+    wide = lambda s: sum(2 if ord(c) >= 0x10000 else 1 for c in s)
+    return [wide(text[:start]), wide(text[:end])]
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2019-2021 Lovac42
+# Support: https://github.com/lovac42/SpellingPolice
+# License: GNU GPL, version 3 or later; http://www.gnu.org/copyleft/gpl.html
+
+
+# Must not import aqt, the writers run in worker processes.
+
+
+import os, tempfile
+from contextlib import contextmanager
+
+
+@contextmanager
+def replacing(path):
+    """Yields a file to write in place of path. It is a unique temp file
+    next to path, renamed over it once written and removed on errors,
+    so readers never see half a file and two writers never share one"""
+    fd, tmp = tempfile.mkstemp(".tmp", os.path.basename(path) + ".",
+        os.path.dirname(path) or ".")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            yield f
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2019-2021 Lovac42
+# Support: https://github.com/lovac42/SpellingPolice
+# License: GNU GPL, version 3 or later; http://www.gnu.org/copyleft/gpl.html
+
+
+# Word counts of the profile's collection, kept up to date as notes are
+# saved or deleted. The table is built once by a scan in small chunks:
+# the notes are read on the main thread and their words counted in a
+# worker, one chunk at a time. Notes saved during the scan are only
+# counted by the hooks once the scan has passed them, those of the chunk
+# being counted are held back until it's merged. Syncs change notes
+# behind our back, so the table is rebuilt after a while.
+
+
+import hashlib, os, time
+from aqt import mw
+from aqt.qt import *
+
+from .const import *
+from .checker import FIELD_SEP, makeExecutor
+from .wordfreq import FrequencyTable, countWords
+
+
+CHUNK_SIZE = 500
+REBUILD_AFTER = 7 * 86400 # seconds
+
+
+class CollectionFrequency(QObject):
+    # future, last note id of the chunk
+    _done = pyqtSignal(object, object)
+
+    def __init__(self):
+        QObject.__init__(self)
+        self.table = None
+        self.profile = None
+        self._scanned = None # last note id of a running scan
+        self._timer = None
+        self._executor = None
+        self._chunk = None # (future, last note id) being counted
+        self._deferred = [] # (old, new) fields of notes in that chunk
+        # emitted from the worker thread, delivered on the main thread
+        self._done.connect(self._merge)
+
+    def update(self, enabled):
+        "Opens the table of the current profile, or closes it"
+        if not enabled or not mw.col:
+            self.close()
+            return
+        if self.table and self.profile == mw.pm.name:
+            return
+        self.close()
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        key = hashlib.sha1(mw.pm.name.encode("utf-8")).hexdigest()[:12]
+        self.table = FrequencyTable(
+            os.path.join(CACHE_DIR, "wordfreq-%s.bin"%key))
+        self.profile = mw.pm.name
+        if self.table.built < time.time() - REBUILD_AFTER:
+            self._rebuild()
+
+    def _rebuild(self):
+        self.table.clear()
+        self._scanned = 0
+        self._executor = makeExecutor(1)
+        self._timer = QTimer(mw)
+        self._timer.timeout.connect(self._scan)
+        self._timer.start(20)
+
+    def _scan(self):
+        if not self.table or not mw.col:
+            self._stopScan()
+            return
+        if self._chunk:
+            return # still counting the last one
+        rows = mw.col.db.all(
+            "select id, flds from notes where id > ? order by id limit ?",
+            self._scanned, CHUNK_SIZE)
+        if not rows:
+            self._stopScan()
+            self.table.setBuilt(int(time.time()))
+            return
+        last = rows[-1][0]
+        f = self._executor.submit(countWords,
+            FIELD_SEP.join(flds for _, flds in rows))
+        self._chunk = (f, last)
+        f.add_done_callback(lambda f: self._done.emit(f, last))
+
+    def _merge(self, future, last):
+        if not self._chunk or future is not self._chunk[0]:
+            return # the scan was stopped
+        self._chunk = None
+        try:
+            counts = future.result()
+        except Exception as e:
+            print("SpellingPolice: can't count the collection's words: %s"%e)
+            self._stopScan()
+            return
+        self.table.add(counts)
+        self._scanned = last
+        for old, new in self._deferred:
+            self.table.update(old, new)
+        self._deferred = []
+
+    def _stopScan(self):
+        if self._timer:
+            self._timer.stop()
+            self._timer = None
+        if self._executor:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        self._chunk = None
+        self._deferred = []
+        self._scanned = None
+
+    def _counted(self, nid):
+        return self._scanned is None or nid <= self._scanned
+
+    def _counting(self, nid):
+        "In the chunk the worker is counting"
+        return bool(self._chunk) and self._scanned < nid <= self._chunk[1]
+
+    def _changed(self, nid, old, new):
+        if self._counted(nid):
+            self.table.update(old, new)
+        elif self._counting(nid):
+            # the worker counts the old fields, swapped once they're merged
+            self._deferred.append((old, new))
+
+    def noteSaving(self, note):
+        "Before the note is written, its old fields are still in the db"
+        if not self.table or not (
+                self._counted(note.id) or self._counting(note.id)):
+            return
+        old = note.col.db.scalar(
+            "select flds from notes where id = ?", note.id)
+        self._changed(note.id, old, FIELD_SEP.join(note.fields))
+
+    def notesChanged(self, changes):
+        "(nid, old flds, new flds) of notes written without Note.flush"
+        if not self.table:
+            return
+        for nid, old, new in changes:
+            self._changed(nid, old, new)
+
+    def notesRemoving(self, col, nids):
+        if not self.table:
+            return
+        nids = [n for n in nids if self._counted(n) or self._counting(n)]
+        for i in range(0, len(nids), CHUNK_SIZE):
+            for nid, flds in col.db.all(
+                    "select id, flds from notes where id in (%s)"%
+                    ",".join("%d"%n for n in nids[i:i+CHUNK_SIZE])):
+                self._changed(nid, flds, None)
+
+    def rank(self, words, limit=0):
+        "Suggestions most used in the collection first"
+        if not self.table:
+            return words[:limit] if limit else words
+        return self.table.rank(words, limit)
+
+    def close(self):
+        self._stopScan()
+        if self.table:
+            self.table.close()
+            self.table = None
+            self.profile = None
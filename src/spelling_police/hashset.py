@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2019-2021 Lovac42
+# Support: https://github.com/lovac42/SpellingPolice
+# License: GNU GPL, version 3 or later; http://www.gnu.org/copyleft/gpl.html
+
+
+# Batch membership with numpy.
+#
+# Every word form of a .bdic is hashed to 64 bits (FNV-1a over the utf-8
+# bytes) and the sorted, unique hashes are saved as an .npy file next to
+# the dictionary. Files are memory mapped, so all workers share one copy.
+#
+# A batch of tokens is hashed column by column over a padded byte matrix
+# and looked up with a single searchsorted per dictionary. Tokens that
+# miss are tried again with their lower case forms, the few left after
+# that are for the exact checker to confirm. A false hit needs a 64-bit
+# collision, at a few million forms that is about 1 in 10^12 per token.
+#
+# numpy is optional, without it HAVE_NUMPY is False and nothing is built.
+#
+# Must not import aqt.
+
+
+import os, hashlib
+
+try:
+    import numpy as np
+    HAVE_NUMPY = True
+except ImportError:
+    HAVE_NUMPY = False
+
+from .bdic import BDict, caseVariants
+from .dawg import sourceInfo
+
+
+PREFIX = "_sp_hash_"
+
+FNV_OFFSET = 0xcbf29ce484222325
+FNV_PRIME = 0x100000001b3
+
+CHUNK = 1 << 16 # words hashed at once while building
+
+
+def hashPath(bdicPath):
+    "Named by the source, so a changed dictionary gets a new file"
+    size, mtime, digest = sourceInfo(bdicPath)
+    key = hashlib.sha1(b"%d:%d:%s"%(size, mtime, digest)).hexdigest()[:12]
+    name = os.path.basename(bdicPath)[:-5]
+    return os.path.join(os.path.dirname(bdicPath),
+        "%s%s.%s.npy"%(PREFIX, name, key))
+
+
+def hashWords(words):
+    "FNV-1a of the utf-8 bytes of each word, as a uint64 array"
+    data = [w.encode("utf-8") for w in words]
+    n = len(data)
+    if not n:
+        return np.zeros(0, np.uint64)
+    lens = np.fromiter(map(len, data), np.int64, n)
+    width = int(lens.max()) or 1
+    buf = np.array(data, dtype="S%d"%width).view(np.uint8).reshape(n, width)
+    h = np.full(n, FNV_OFFSET, np.uint64)
+    prime = np.uint64(FNV_PRIME)
+    for col in range(width):
+        live = lens > col
+        if live.all():
+            h = (h ^ buf[:, col]) * prime
+        else:
+            h[live] = (h[live] ^ buf[live, col]) * prime
+    return h
+
+
+def buildHashes(bdicPath, force=False):
+    "Writes the hash array of bdicPath unless it exists, returns the path"
+    path = hashPath(bdicPath)
+    if not force and os.path.exists(path):
+        return path
+    with BDict(bdicPath) as d:
+        words = sorted(set(w for w in d.expand() if w))
+    parts = [hashWords(words[i:i+CHUNK]) for i in range(0, len(words), CHUNK)]
+    del words
+    hashes = np.unique(np.concatenate(parts)) if parts else np.zeros(0, np.uint64)
+
+    tmp = "%s.%d.tmp"%(path, os.getpid())
+    with open(tmp, "wb") as f:
+        np.save(f, hashes)
+    os.replace(tmp, path)
+
+    # older versions of this dictionary
+    dirName, fn = os.path.split(path)
+    stem = fn.rsplit(".", 2)[0] + "."
+    for old in os.listdir(dirName):
+        if old.startswith(stem) and old.endswith(".npy") and old != fn:
+            try:
+                os.remove(os.path.join(dirName, old))
+            except OSError:
+                pass
+    return path
+
+
+def buildAll(bdicPaths):
+    "Worker entry point"
+    ret = []
+    if not HAVE_NUMPY:
+        return ret
+    for p in bdicPaths:
+        try:
+            ret.append(buildHashes(p))
+        except Exception as e:
+            print("SpellingPolice: can't hash %s: %s"%(p, e))
+    return ret
+
+
+class BatchChecker:
+    "Hash arrays of the dictionaries that have one"
+
+    def __init__(self, arrays):
+        self.arrays = arrays
+        self.stats = {"tokens": 0, "hits": 0, "caseHits": 0, "misses": 0}
+
+    @classmethod
+    def load(cls, bdicPaths):
+        "None without numpy or without any hash arrays"
+        if not HAVE_NUMPY:
+            return None
+        arrays = []
+        for p in bdicPaths:
+            try:
+                path = hashPath(p)
+                if os.path.exists(path):
+                    arrays.append(np.load(path, mmap_mode="r"))
+            except (OSError, ValueError) as e:
+                print("SpellingPolice: can't load %s: %s"%(p, e))
+        return cls(arrays) if arrays else None
+
+    def _contains(self, words):
+        keys = hashWords(words)
+        found = np.zeros(len(keys), bool)
+        for a in self.arrays:
+            if not len(a):
+                continue
+            idx = np.searchsorted(a, keys)
+            idx[idx == len(a)] = 0
+            found |= a[idx] == keys
+        return found
+
+    def contains(self, words):
+        """A bool per word, True if a dictionary has the word. False only
+        means none of the hashed forms matched"""
+        words = list(words)
+        found = self._contains(words)
+        misses = np.flatnonzero(~found)
+        self.stats["tokens"] += len(words)
+        self.stats["hits"] += len(words) - len(misses)
+
+        # the case rules of BDict.isCorrect, one more pass for all of them
+        variants, owners = [], []
+        for i in misses:
+            for v in list(caseVariants(words[i]))[1:]:
+                variants.append(v)
+                owners.append(i)
+        if variants:
+            hit = self._contains(variants)
+            for i in set(o for o, h in zip(owners, hit) if h):
+                found[i] = True
+                self.stats["caseHits"] += 1
+        self.stats["misses"] += int(len(words) - found.sum())
+        return found
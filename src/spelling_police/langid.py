@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2019-2021 Lovac42
+# Support: https://github.com/lovac42/SpellingPolice
+# License: GNU GPL, version 3 or later; http://www.gnu.org/copyleft/gpl.html
+
+
+# Character trigram language identifier.
+#
+# Each dictionary gets a profile of the log frequencies of its most common
+# trigrams, counted over the stems of the .bdic. A text is scored against
+# every candidate profile, a few dict lookups per trigram. Profiles are
+# stored next to the compiled dictionaries and rebuilt when the source
+# changes.
+#
+# Must not import aqt, profiles are built in a worker process.
+
+
+import json, math, os
+from collections import Counter, OrderedDict
+
+from .bdic import BDict
+from .dawg import sourceInfo
+from .tokenizer import tokenize
+from .auditcache import fieldHash
+
+
+VERSION = 1
+TOP = 400         # trigrams kept per profile
+MARGIN = 0.25     # mean log prob per trigram a close second may trail by
+MIN_TRIGRAMS = 8  # less text than this is not worth guessing
+
+
+def trigrams(word):
+    w = " %s "%word.lower()
+    return [w[i:i+3] for i in range(len(w) - 2)]
+
+
+def profilePath(bdicPath, cacheDir):
+    name = os.path.basename(bdicPath)
+    return os.path.join(cacheDir, name[:-5] + ".langid")
+
+
+def buildProfile(bdicPath, cacheDir):
+    "Writes the profile of bdicPath unless it is up to date, returns the path"
+    path = profilePath(bdicPath, cacheDir)
+    size, mtime, _ = sourceInfo(bdicPath)
+    try:
+        with open(path, encoding="utf-8") as f:
+            old = json.load(f)
+        if old["version"] == VERSION and old["source"] == [size, mtime]:
+            return path
+    except (OSError, ValueError, KeyError):
+        pass
+
+    counts = Counter()
+    with BDict(bdicPath) as d:
+        for w in d.words():
+            counts.update(trigrams(w))
+    top = counts.most_common(TOP)
+    total = float(sum(c for _, c in top)) or 1.0
+    profile = {
+        "version": VERSION,
+        "source": [size, mtime],
+        # unseen trigrams count as half an occurrence of the rarest one
+        "floor": math.log(0.5 * (top[-1][1] if top else 1) / total),
+        "grams": {g: math.log(c / total) for g, c in top},
+    }
+    os.makedirs(cacheDir, exist_ok=True)
+    tmp = "%s.%d.tmp"%(path, os.getpid())
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(profile, f)
+    os.replace(tmp, path)
+    return path
+
+
+def buildProfiles(bdicPaths, cacheDir):
+    "Worker entry point"
+    ret = []
+    for p in bdicPaths:
+        try:
+            ret.append(buildProfile(p, cacheDir))
+        except Exception as e:
+            print("SpellingPolice: can't build language profile %s: %s"%(p, e))
+    return ret
+
+
+class LanguageIdentifier:
+    def __init__(self, cacheSize=4096):
+        self.profiles = {} # name: (grams, floor)
+        self._cache = OrderedDict()
+        self._cacheSize = cacheSize
+        self.stats = {"classified": 0, "cached": 0}
+
+    def load(self, name, path):
+        with open(path, encoding="utf-8") as f:
+            p = json.load(f)
+        self.profiles[name] = (p["grams"], p["floor"])
+        self._cache.clear()
+
+    def clear(self):
+        self.profiles = {}
+        self._cache.clear()
+
+    def scores(self, text, candidates):
+        "Mean log prob per trigram for each candidate with a profile"
+        grams = []
+        for w in tokenize(text):
+            grams.extend(trigrams(w))
+        if len(grams) < MIN_TRIGRAMS:
+            return {}
+        counts = Counter(grams)
+        n = float(len(grams))
+        ret = {}
+        for name in candidates:
+            prof = self.profiles.get(name)
+            if not prof:
+                continue
+            table, floor = prof
+            get = table.get
+            ret[name] = sum(get(g, floor) * c for g, c in counts.items()) / n
+        return ret
+
+    def pick(self, text, candidates):
+        """The candidates that fit text best, all of them when unsure.
+        Cached by the hash of the text, so unchanged fields are free"""
+        if len(candidates) < 2 or not text:
+            return candidates
+        key = (fieldHash(text), tuple(candidates))
+        ret = self._cache.get(key)
+        if ret is not None:
+            self._cache.move_to_end(key)
+            self.stats["cached"] += 1
+            return ret
+
+        self.stats["classified"] += 1
+        scores = self.scores(text, candidates)
+        if len(scores) < len(candidates):
+            ret = candidates # too short, or profiles still missing
+        else:
+            best = max(scores.values())
+            ret = [c for c in candidates if scores[c] >= best - MARGIN]
+        self._cache[key] = ret
+        if len(self._cache) > self._cacheSize:
+            self._cache.popitem(last=False)
+        return ret
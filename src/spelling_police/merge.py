@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2019-2021 Lovac42
+# Support: https://github.com/lovac42/SpellingPolice
+# License: GNU GPL, version 3 or later; http://www.gnu.org/copyleft/gpl.html
+
+
+import os
+from aqt.qt import *
+
+from .const import *
+from .checker import makeExecutor
+from .bdicmerge import mergeDictionaries, inputKey
+
+
+MERGED_PREFIX = HIDDEN_PREFIX + "merged_"
+
+
+class DictionaryMerger(QObject):
+    "One merged .bdic of the enabled dictionaries, built in the background"
+
+    # input names, merged name or None
+    merged = pyqtSignal(object, object)
+    _done = pyqtSignal(object, object, object)
+
+    def __init__(self):
+        QObject.__init__(self)
+        self.name = None
+        self._future = None
+        self._building = None # name of the merge being built
+        # emitted from the worker thread, delivered on the main thread
+        self._done.connect(self._built)
+
+    def update(self, dicts):
+        if len(dicts) < 2:
+            self._future = self._building = None
+            self._use(None, dicts)
+            return
+        paths = [os.path.join(DICT_DIR, d+".bdic") for d in dicts]
+        try:
+            name = MERGED_PREFIX + inputKey(paths)
+        except (OSError, ValueError) as e:
+            print("SpellingPolice: can't merge dictionaries: %s"%e)
+            self._future = self._building = None
+            self._use(None, dicts)
+            return
+        if name == self.name or name == self._building:
+            return
+        self._future = self._building = None
+        path = os.path.join(DICT_DIR, name+".bdic")
+        if os.path.exists(path):
+            self._use(name, dicts)
+            return
+
+        self._use(None, dicts) # the separate ones until it's done
+        ex = makeExecutor(1)
+        f = ex.submit(mergeDictionaries, paths, path)
+        self._future = f
+        self._building = name
+        f.add_done_callback(lambda f: self._done.emit(f, name, dicts))
+        ex.shutdown(wait=False)
+
+    def _built(self, future, name, dicts):
+        if future is not self._future:
+            return # superseded
+        self._future = self._building = None
+        try:
+            future.result()
+        except Exception as e:
+            print("SpellingPolice: can't merge dictionaries: %s"%e)
+            return
+        self._use(name, dicts)
+
+    def _use(self, name, dicts):
+        self.name = name
+        self.merged.emit(dicts, name)
+        # drop older merges, chromium may still hold them on windows
+        for fn in os.listdir(DICT_DIR):
+            if (fn.startswith(MERGED_PREFIX) and fn.endswith(".bdic")
+                    and fn[:-5] != name):
+                try:
+                    os.remove(os.path.join(DICT_DIR, fn))
+                except OSError:
+                    pass
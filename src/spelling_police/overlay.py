@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2019-2021 Lovac42
+# Support: https://github.com/lovac42/SpellingPolice
+# License: GNU GPL, version 3 or later; http://www.gnu.org/copyleft/gpl.html
+
+
+# Marks misspelled words on the review screen.
+#
+# The words of a note are checked from its fields in a background thread
+# and cached by note id and field hash, for the current dictionary set.
+# When a card is shown the next cards of the queue are checked ahead, so
+# showing them is a cache lookup and one eval that wraps the words in
+# spans.
+
+
+import json, os
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from aqt import mw
+from aqt.qt import *
+
+from .const import *
+from .checker import FIELD_SEP, SpellChecker
+from .verdictcache import VerdictCache
+from .auditcache import dictFingerprint, fieldHash
+from .tokenizer import tokenize
+
+
+CACHE_SIZE = 2000 # notes
+PREFETCH = 10     # cards ahead
+
+MARK_JS = """
+if (!window.spellingPoliceMark) window.spellingPoliceMark = function(words) {
+    var esc = words.map(function(w) {
+        return w.replace(/[.*+?^${}()|[\\]\\\\]/g, "\\\\$&");
+    }).sort(function(a, b) { return b.length - a.length; });
+    var re = new RegExp(esc.join("|"), "g");
+    var letter = function(c) { return c && c.toLowerCase() != c.toUpperCase(); };
+    if (!document.getElementById("sp-miss-style")) {
+        var st = document.createElement("style");
+        st.id = "sp-miss-style";
+        st.textContent = ".sp-miss { text-decoration: underline red; "
+            + "text-decoration-style: wavy; }";
+        document.head.appendChild(st);
+    }
+    var root = document.getElementById("qa") || document.body;
+    var walker = document.createTreeWalker(root, NodeFilter.SHOW_TEXT, null, false);
+    var nodes = [];
+    while (walker.nextNode()) nodes.push(walker.currentNode);
+    nodes.forEach(function(node) {
+        var p = node.parentNode;
+        if (!p || /^(SCRIPT|STYLE|TEXTAREA)$/.test(p.nodeName)
+                || p.className == "sp-miss") return;
+        var text = node.nodeValue, m, last = 0, frag = null;
+        re.lastIndex = 0;
+        while ((m = re.exec(text))) {
+            var s = m.index, e = s + m[0].length;
+            if (letter(text.charAt(s-1)) || letter(text.charAt(e))) continue;
+            frag = frag || document.createDocumentFragment();
+            frag.appendChild(document.createTextNode(text.slice(last, s)));
+            var span = document.createElement("span");
+            span.className = "sp-miss";
+            span.textContent = m[0];
+            frag.appendChild(span);
+            last = e;
+        }
+        if (frag) {
+            frag.appendChild(document.createTextNode(text.slice(last)));
+            p.replaceChild(frag, node);
+        }
+    });
+};
+(function(words) {
+    spellingPoliceMark(words);
+    // a card being shown replaces #qa later, after its fade or await
+    if (typeof onUpdateHook != "undefined") onUpdateHook.push(function() {
+        spellingPoliceMark(words);
+    });
+})(%s);
+"""
+
+
+class ReviewOverlay(QObject):
+    # key, fingerprint, misspelled words
+    _checked = pyqtSignal(object, object, object)
+
+    def __init__(self, personal):
+        QObject.__init__(self)
+        self.personal = personal
+        self.fingerprint = None
+        self._cache = OrderedDict() # (nid, field hash): words
+        self._pending = set()
+        self._worker = None
+        self._current = None
+        self.stats = {"hits": 0, "misses": 0, "prefetched": 0}
+        # emitted from the worker thread, delivered on the main thread
+        self._checked.connect(self._store)
+
+    def update(self, dicts):
+        "Checks against dicts from now on, none turns the overlay off"
+        fp = dictFingerprint(DICT_DIR, dicts) if dicts else None
+        if fp == self.fingerprint:
+            return
+        self.fingerprint = fp
+        self._cache.clear()
+        self._pending.clear()
+        if self._worker:
+            ex, holder = self._worker
+            ex.submit(self._close, holder)
+            ex.shutdown(wait=False)
+            self._worker = None
+        if fp:
+            paths = [os.path.join(DICT_DIR, d+".bdic") for d in dicts]
+            holder = {}
+            ex = ThreadPoolExecutor(1)
+            ex.submit(self._open, holder, paths, fp)
+            self._worker = (ex, holder)
+
+    # worker thread
+
+    def _open(self, holder, paths, fp):
+        try:
+            holder["checker"] = SpellChecker(paths, CACHE_DIR, VerdictCache(fp))
+        except Exception as e:
+            # reported once, the cards are then shown without marks
+            print("SpellingPolice: can't check the review screen: %s"%e)
+            holder["checker"] = None
+
+    def _close(self, holder):
+        checker = holder.pop("checker", None)
+        if checker:
+            checker.close()
+
+    def _check(self, holder, key, flds, fp):
+        checker = holder.get("checker")
+        bad = []
+        try:
+            if checker:
+                words = [w for f in flds.split(FIELD_SEP) for w in tokenize(f)]
+                ok = checker.checkMany(words)
+                bad = sorted(w for w, v in ok.items() if not v)
+        except Exception as e:
+            print("SpellingPolice: can't check note %s: %s"%(key[0], e))
+        finally:
+            # always answered, or the key would stay pending
+            self._checked.emit(key, fp, bad)
+
+    # main thread
+
+    def _request(self, key, flds):
+        if key in self._pending or not self._worker:
+            return
+        self._pending.add(key)
+        ex, holder = self._worker
+        ex.submit(self._check, holder, key, flds, self.fingerprint)
+
+    def _store(self, key, fp, words):
+        if fp != self.fingerprint:
+            return # dictionaries changed meanwhile
+        self._pending.discard(key)
+        self._cache[key] = words
+        if len(self._cache) > CACHE_SIZE:
+            self._cache.popitem(last=False)
+        if key == self._current:
+            self._mark(words)
+
+    def show(self, card):
+        "Marks the card on screen and checks the next ones ahead"
+        if not self.fingerprint or not card:
+            return
+        flds = FIELD_SEP.join(card.note().fields)
+        key = (card.nid, fieldHash(flds))
+        self._current = key
+        words = self._cache.get(key)
+        if words is None:
+            self.stats["misses"] += 1
+            self._request(key, flds)
+        else:
+            self.stats["hits"] += 1
+            self._cache.move_to_end(key)
+            self._mark(words)
+        self._prefetch(card.id)
+
+    def _mark(self, words):
+        # the cache keeps what the dictionaries found
+        words = [w for w in words if w not in self.personal]
+        if words and mw.state == "review":
+            mw.reviewer.web.eval(MARK_JS%json.dumps(words))
+
+    def _prefetch(self, current):
+        cids = [cid for cid in upcoming(mw.col.sched) if cid != current]
+        if not cids:
+            return
+        for nid, flds in mw.col.db.all(
+                "select distinct n.id, n.flds from cards c, notes n "
+                "where c.nid = n.id and c.id in (%s)"%
+                ",".join("%d"%c for c in cids[:PREFETCH])):
+            key = (nid, fieldHash(flds))
+            if key not in self._cache and key not in self._pending:
+                self.stats["prefetched"] += 1
+                self._request(key, flds)
+
+    def close(self):
+        self.update([])
+
+
+def upcoming(sched):
+    """Card ids the scheduler will likely show next. The queues are
+    internal to the scheduler, anything missing just means no prefetch"""
+    ret = []
+    # learning entries are (due, cid), the others are popped from the end
+    lrn = sorted(getattr(sched, "_lrnQueue", None) or [])
+    queues = ([item[1] for item in lrn if isinstance(item, (tuple, list))],
+        reversed(getattr(sched, "_revQueue", None) or []),
+        reversed(getattr(sched, "_newQueue", None) or []))
+    for queue in queues:
+        for cid in queue:
+            if isinstance(cid, int):
+                ret.append(cid)
+            if len(ret) >= PREFETCH:
+                return ret
+    return ret
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2019-2021 Lovac42
+# Support: https://github.com/lovac42/SpellingPolice
+# License: GNU GPL, version 3 or later; http://www.gnu.org/copyleft/gpl.html
+
+
+# The personal word list lives in the dictionary folder, so all profiles
+# share it. The python side checks look words up in the list itself.
+# Chromium only reads .bdic files, so it gets the list as a small hidden
+# dictionary, under a new name whenever it changes, since chromium doesn't
+# reload a language it already has. That reloads all of chromium's
+# languages, so the copy is only brought up to date by sync(), when the
+# editor moves on to another note, not for every word added.
+
+
+import hashlib, os
+from aqt.qt import *
+
+from .const import *
+from .wordlist import WordList
+from .bdicwriter import BDictWriter
+
+
+PERSONAL_PREFIX = HIDDEN_PREFIX + "personal_"
+WORDLIST_NAME = "spelling_police_personal"
+
+
+class PersonalDictionary(QObject):
+    # name of chromium's copy, None if the list is empty
+    changed = pyqtSignal(object)
+    # words were added, the python side checks know them already
+    added = pyqtSignal()
+
+    def __init__(self):
+        QObject.__init__(self)
+        self.words = WordList(os.path.join(DICT_DIR, WORDLIST_NAME))
+        self.name = None
+        self._stale = False # chromium's copy misses words
+        # batches the words added in quick succession
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self._commit)
+        self._write()
+
+    def add(self, word):
+        if self.words.add(word):
+            self._stale = True
+            self._timer.start(1000)
+
+    def __contains__(self, word):
+        return self.words.isCorrect(word)
+
+    def _commit(self):
+        self.words.flush()
+        self.added.emit()
+
+    def sync(self):
+        "Brings chromium's copy up to date"
+        if not self._stale:
+            return
+        self.flush()
+        self._stale = False
+        name = self.name
+        self._write()
+        if self.name != name:
+            self.changed.emit(self.name)
+
+    def _write(self):
+        words = self.words.words()
+        name = None
+        if words:
+            h = hashlib.sha1("\n".join(words).encode("utf-8")).hexdigest()
+            name = PERSONAL_PREFIX + h[:12]
+            path = os.path.join(DICT_DIR, name+".bdic")
+            if not os.path.exists(path):
+                w = BDictWriter()
+                w.comment = "personal word list"
+                w.otherCommands = ["SET UTF-8"]
+                w.addWords(words)
+                try:
+                    w.write(path)
+                except OSError as e:
+                    print("SpellingPolice: can't write personal dictionary: %s"%e)
+                    return
+        self.name = name
+        for fn in os.listdir(DICT_DIR):
+            if (fn.startswith(PERSONAL_PREFIX) and fn.endswith(".bdic")
+                    and fn[:-5] != name):
+                try:
+                    os.remove(os.path.join(DICT_DIR, fn))
+                except OSError:
+                    pass
+
+    def flush(self):
+        if self._timer.isActive():
+            self._timer.stop()
+            self._commit()
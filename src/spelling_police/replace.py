@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2019-2021 Lovac42
+# Support: https://github.com/lovac42/SpellingPolice
+# License: GNU GPL, version 3 or later; http://www.gnu.org/copyleft/gpl.html
+
+
+# Replaces a misspelling in every note the last audit found it in.
+# Only the matching word spans are rewritten, markup is left alone, and
+# all notes are written with one statement after a single checkpoint.
+# Where the collection can't update the field cache of raw writes (the
+# Rust backend, 2.1.28+), each note goes through Note.flush instead.
+
+
+from aqt import mw
+from aqt.qt import *
+from aqt.utils import askUser, showInfo, tooltip
+from anki.utils import intTime
+
+from .const import *
+from .checker import FIELD_SEP
+from .tokenizer import replaceWord
+from .auditcache import AuditCache
+
+
+CHUNK_SIZE = 500
+
+
+def replaceEverywhere(word, new, frequency=None):
+    "Returns the number of notes changed"
+    cache = AuditCache(DICT_DIR, mw.pm.name, None)
+    try:
+        nids = cache.notesWith(word)
+        if not nids:
+            return 0
+        mw.checkpoint("Replace Misspelling")
+        mw.progress.start(immediate=True)
+        try:
+            changed = _replace(nids, word, new, frequency)
+        finally:
+            mw.progress.finish()
+        cache.forget(word, nids)
+        cache.commit()
+    finally:
+        cache.close()
+    if changed:
+        mw.requireReset()
+    return len(changed)
+
+
+def _replace(nids, word, new, frequency=None):
+    changes = [] # (nid, old flds, new flds)
+    for i in range(0, len(nids), CHUNK_SIZE):
+        part = nids[i:i+CHUNK_SIZE]
+        for nid, flds in mw.col.db.all(
+                "select id, flds from notes where id in (%s)"%
+                ",".join("%d"%n for n in part)):
+            fields = flds.split(FIELD_SEP)
+            total = 0
+            for ord, fld in enumerate(fields):
+                fields[ord], n = replaceWord(fld, word, new)
+                total += n
+            if total: # the note may have been edited since the audit
+                changes.append((nid, flds, FIELD_SEP.join(fields)))
+    if not changes:
+        return []
+    if hasattr(mw.col, "updateFieldCache"):
+        usn = mw.col.usn()
+        mod = intTime()
+        mw.col.db.executemany(
+            "update notes set flds=?, mod=?, usn=? where id=?",
+            [(flds, mod, usn, nid) for nid, _, flds in changes])
+        mw.col.updateFieldCache([c[0] for c in changes])
+        if frequency: # raw writes miss the Note.flush hook
+            frequency.notesChanged(changes)
+    else:
+        # the Rust backend has no field cache update, the sort field and
+        # checksum are only kept right by its own note update
+        for nid, _, flds in changes:
+            note = mw.col.getNote(nid)
+            note.fields = flds.split(FIELD_SEP)
+            note.flush()
+    return [c[0] for c in changes]
+
+
+class ReplaceDialog(QDialog):
+    def __init__(self, suggester=None, personal=(), frequency=None):
+        QDialog.__init__(self, mw)
+        self.suggester = suggester
+        self.frequency = frequency
+        self.setWindowTitle("Replace Misspelling")
+        cache = AuditCache(DICT_DIR, mw.pm.name, None)
+        try:
+            # words added to the personal list since the audit are left out
+            self.counts = [(w, n) for w, n in cache.wordCounts()
+                if w not in personal]
+        finally:
+            cache.close()
+        if not self.counts:
+            showInfo("Run Tools > Spelling Police > Audit collection first, "
+                "misspellings are replaced in the notes it found them in.")
+            return
+        self._setupDialog()
+        self.exec_()
+
+    def _setupDialog(self):
+        layout = QFormLayout()
+        self.word = QComboBox()
+        for w, n in self.counts:
+            self.word.addItem("%s (%d)"%(w, n), w)
+        self.word.currentIndexChanged.connect(self._suggest)
+        layout.addRow("Misspelled:", self.word)
+        self.new = QLineEdit()
+        layout.addRow("Replace with:", self.new)
+        bb = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        bb.accepted.connect(self._replace)
+        bb.rejected.connect(self.reject)
+        layout.addRow(bb)
+        self.setLayout(layout)
+        self._suggest()
+
+    def _suggest(self):
+        word = self.word.currentData()
+        s = self.suggester.suggest(word, 1) if self.suggester else None
+        self.new.setText(s[0] if s else word)
+        self.new.selectAll()
+
+    def _replace(self):
+        word = self.word.currentData()
+        new = self.new.text().strip()
+        if not new or new == word:
+            return
+        n = dict(self.counts).get(word, 0)
+        if not askUser("Replace \"%s\" with \"%s\" in %d notes?"%(word, new, n)):
+            return
+        changed = replaceEverywhere(word, new, self.frequency)
+        tooltip("Replaced in %d notes."%changed)
+        self.accept()
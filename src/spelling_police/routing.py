@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2019-2021 Lovac42
+# Support: https://github.com/lovac42/SpellingPolice
+# License: GNU GPL, version 3 or later; http://www.gnu.org/copyleft/gpl.html
+
+
+# Picks the dictionaries for a field from the "dictionary_routing" config:
+#
+#   "dictionary_routing": {
+#       "Basic (Latin)": {"Front": ["la"], "*": ["en_US"]},
+#       "*": {"Deutsch": ["de_DE"]}
+#   }
+#
+# Note type first, then "*"; within those the field name, then "*". Only
+# enabled dictionaries are used, no match or an empty result means all.
+#
+# Must not import aqt.
+
+
+class DictionaryRouter:
+    def __init__(self, table=None):
+        self._cache = {}
+        self.setTable(table)
+
+    def setTable(self, table):
+        self.table = table or {}
+        self._cache.clear()
+
+    def invalidate(self):
+        self._cache.clear()
+
+    def _lookup(self, modelName, fieldName):
+        for m in (modelName, "*"):
+            fields = self.table.get(m)
+            if not isinstance(fields, dict):
+                continue
+            for f in (fieldName, "*"):
+                dicts = fields.get(f)
+                if dicts is not None:
+                    return dicts
+        return None
+
+    def route(self, mid, modelName, ord, fieldName, enabled):
+        "Dictionaries for a field, cached by note type id and field ord"
+        key = (mid, ord)
+        ret = self._cache.get(key)
+        if ret is None:
+            ret = enabled
+            dicts = self._lookup(modelName, fieldName)
+            if dicts:
+                if isinstance(dicts, str):
+                    dicts = [dicts]
+                ret = [d for d in enabled if d in dicts] or enabled
+            ret = self._cache[key] = list(ret)
+        return ret
+
+    def routeNote(self, note, ord, enabled):
+        if not self.table:
+            return enabled
+        model = note.model()
+        flds = model["flds"]
+        fieldName = flds[ord]["name"] if 0 <= ord < len(flds) else None
+        return self.route(model["id"], model["name"], ord, fieldName, enabled)
@@ -8,45 +8,251 @@
 #   Auto download dicts from github
 
 
+# Only hooks are registered on import, everything that touches the disk
+# or the menus waits for the config, which is loaded with the profile.
+
+
+import os
 from aqt.qt import *
 from aqt import mw
 from aqt.webview import AnkiWebView
+from aqt.editor import Editor
+from anki.notes import Note
 from anki.hooks import wrap, addHook
 from anki.lang import _
 from functools import partial
 
-from .dict import DictionaryManager
+from .const import *
 from .config import Config
+from . import startup
+from .timing import timings
 
 ADDON_NAME='SpellingPolice'
 conf = Config(ADDON_NAME)
 
-dictMan = DictionaryManager()
+dictMan = None
+spellState = None
+suggester = None
+router = None
+detector = None
+merger = None
+personal = None
+setMenu = None
+overlay = None
+converter = None
+editorChecker = None
+frequency = None
+
+STARTUP_LOG = os.path.join(ADDON_PATH, "user_files", "startup_times.json")
+
+
+def setup():
+    global dictMan, spellState, suggester, router, detector, merger, personal
+    global setMenu, overlay, converter, editorChecker, frequency
+    if dictMan:
+        return
+    startup.timer.start("setup")
+    from .dict import DictionaryManager
+    from .suggest import SuggestionEngine
+    from .routing import DictionaryRouter
+    from .detect import LanguageDetector
+    from .merge import DictionaryMerger
+    from .personal import PersonalDictionary
+    from .dictsets import DictionarySetMenu
+    from .overlay import ReviewOverlay
+    from .convert import DictionaryConverter
+    from .editorcheck import EditorChecker
+    from .frequency import CollectionFrequency
+    from .catalog import getCatalog
+
+    ensureDictDir()
+    dictMan = DictionaryManager()
+    spellState = dictMan.state
+    suggester = SuggestionEngine()
+    router = DictionaryRouter()
+    detector = LanguageDetector()
+    merger = DictionaryMerger()
+    merger.merged.connect(spellState.substitute)
+    personal = PersonalDictionary()
+    personal.changed.connect(onPersonalChanged)
+    onPersonalChanged(personal.name)
+    overlay = ReviewOverlay(personal)
+    editorChecker = EditorChecker(editorDictionaries, personal)
+    personal.added.connect(editorChecker.reset)
+    frequency = CollectionFrequency()
+    converter = DictionaryConverter()
+    converter.converted.connect(onConverted)
+    getCatalog().folderChanged.connect(converter.update)
+    converter.update()
+
+    setMenu = DictionarySetMenu(dictMan.menu, useDictionarySet)
+    a = QAction("Audit collection", mw)
+    a.triggered.connect(runAudit)
+    dictMan.menu.addAction(a)
+    a = QAction("Replace misspelling", mw)
+    a.triggered.connect(showReplace)
+    dictMan.menu.addAction(a)
+    a = QAction("Startup times", mw)
+    a.triggered.connect(showStartupTimes)
+    dictMan.menu.addAction(a)
+    a = QAction("Timings", mw)
+    a.triggered.connect(showTimings)
+    dictMan.menu.addAction(a)
+
+    # webviews made before the profile was loaded
+    if getattr(mw, "web", None):
+        setupBDIC(mw.web)
+    startup.timer.stop("setup")
+    startup.timer.save(STARTUP_LOG)
+
+
+@timings.timed("onDictionariesChanged")
+def onDictionariesChanged():
+    setup()
+    timings.enabled = conf.get("debug_timings", False)
+    timings.count("dictionaryReloads")
+    from .dictsets import parseSets
+    sets, keys = parseSets(conf.get("dictionary_sets"))
+    dictMan.setSets(sets, conf.get("active_dictionary_set"))
+    setMenu.update(sets, keys, dictMan.activeSet)
+    router.setTable(conf.get("dictionary_routing"))
+    detector.update(dictMan.getDictionaries()
+        if conf.get("detect_language", False) else [])
+    merger.update(dictMan.getDictionaries()
+        if conf.get("merge_dictionaries", False) else [])
+    if conf.get("suggestion_engine", "chromium") == "symspell":
+        # compiles the dictionaries as part of the build
+        suggester.update(dictMan.getDictionaries(),
+            conf.get("suggestion_distance", 2))
+    else:
+        dictMan.compile()
+    dictMan.buildHashes()
+    updateOverlay()
+    editorChecker.setEnabled(usePythonChecker())
+    editorChecker.reset()
+    frequency.update(conf.get("rank_by_collection", False))
+
+addHook(ADDON_NAME+'.configLoaded', onDictionariesChanged)
+addHook(ADDON_NAME+'.configUpdated', onDictionariesChanged)
+addHook(ADDON_NAME+'.dictionariesChanged', onDictionariesChanged)
+
+
+def useDictionarySet(name):
+    from aqt.utils import tooltip
+    conf.set("active_dictionary_set", name)
+    conf.save()
+    dictMan.useSet(name)
+    tooltip("Spell checking with %s"%(name or "all enabled dictionaries"))
+
+
+def onPersonalChanged(name):
+    # chromium's copy, the python side checks use the list itself
+    spellState.setExtra([name] if name else [])
+
+
+def onConverted(names):
+    from aqt.utils import tooltip
+    # the catalog picks the new files up, the manager loads them
+    tooltip("Converted dictionaries: %s"%", ".join(names))
+
+
+def updateOverlay():
+    if conf.get("review_overlay", False) and dictMan.getDictionaries():
+        overlay.update(dictMan.getDictionaries())
+    else:
+        overlay.update([])
+
+def onReviewerShow():
+    if overlay:
+        overlay.show(mw.reviewer.card)
+
+addHook("showQuestion", onReviewerShow)
+addHook("showAnswer", onReviewerShow)
+
+
+def onUnloadProfile():
+    if personal:
+        personal.flush()
+    if suggester:
+        suggester.flush()
+    if overlay:
+        overlay.close()
+    if frequency:
+        frequency.close()
+
+addHook("unloadProfile", onUnloadProfile)
+
+
+def onNoteFlush(note, *args, **kwargs):
+    if frequency:
+        frequency.noteSaving(note)
+
+Note.flush = wrap(Note.flush, onNoteFlush, "before")
+
+def onRemNotes(col, nids):
+    if frequency:
+        frequency.notesRemoving(col, nids)
+
+addHook("remNotes", onRemNotes)
+
+
+def runAudit():
+    from .audit import AuditJob
+    AuditJob(dictMan, personal).start()
+
+def showReplace():
+    from .replace import ReplaceDialog
+    ReplaceDialog(suggester, personal, frequency)
+
+def showStartupTimes():
+    from aqt.utils import showText
+    showText(startup.report(startup.load(STARTUP_LOG)),
+        title="Spelling Police startup times")
+
+def showTimings():
+    from .timingpanel import TimingDialog
+    TimingDialog(spellState)
 
 
 def replaceMisspelledWord(page, sug_word):
     page.replaceMisspelledWord(sug_word)
 
+@timings.timed("onContextMenuEvent")
 def onContextMenuEvent(web, menu):
+    if not dictMan:
+        return
     p=web._page.profile()
 
     # For Edit field during review
     if mw.state == "review":
         if not conf.get("check_during_review", False):
             return
-        p.setSpellCheckLanguages(dictMan.getDictionaries())
+    # suggestions need the languages loaded, no-op once they are
+    spellState.activate(p)
 
     b=p.isSpellCheckEnabled()
     menu.addSeparator()
     a=menu.addAction(_("Spelling Police"))
     a.setCheckable(True)
     a.setChecked(b)
-    a.triggered.connect(lambda:p.setSpellCheckEnabled(not b))
+    a.triggered.connect(lambda:spellState.setEnabled(p, not b))
+
+    if not b:
+        return
+    firstAct=menu.actions()[0]
+    data=web._page.contextMenuData()
+    word=data.misspelledWord()
 
-    if b and conf.get("duck_mode", False):
-        firstAct=menu.actions()[0]
-        data=web._page.contextMenuData()
-        for sug_word in data.spellCheckerSuggestions():
+    if conf.get("duck_mode", False):
+        suggestions=None
+        if conf.get("suggestion_engine", "chromium") == "symspell":
+            suggestions=suggester.suggest(word)
+        if suggestions is None:
+            suggestions=data.spellCheckerSuggestions()
+        # words the collection uses most come first
+        suggestions=frequency.rank(list(suggestions),
+            conf.get("max_suggestions", 0))
+        for sug_word in suggestions:
             a=menu.addAction(sug_word)
             menu.insertAction(firstAct, a)
             a.triggered.connect(partial(replaceMisspelledWord, web._page, sug_word))
@@ -54,16 +260,65 @@ def onContextMenuEvent(web, menu):
                 f=a.font()
                 f.setBold(True)
                 a.setFont(f)
+
+    if word:
+        a=menu.addAction("Add \"%s\" to dictionary"%word)
+        menu.insertAction(firstAct, a)
+        a.triggered.connect(partial(personal.add, word))
+
+    if word or conf.get("duck_mode", False):
         menu.insertSeparator(firstAct)
 
 addHook("EditorWebView.contextMenuEvent", onContextMenuEvent)
 addHook("AnkiWebView.contextMenuEvent", onContextMenuEvent)
 
 
+@timings.timed("setupBDIC")
 def setupBDIC(web, *args, **kwargs):
+    if not dictMan:
+        return
     p=web._page.profile()
-    p.setSpellCheckEnabled(conf.get("auto_startup", False))
-    p.setSpellCheckLanguages(dictMan.getDictionaries())
+    spellState.attach(p, conf.get("auto_startup", False))
 
 AnkiWebView.__init__=wrap(AnkiWebView.__init__, setupBDIC, "after")
 
+
+def usePythonChecker():
+    # chromium of the alternate builds often can't load the dictionaries
+    use = conf.get("python_editor_checker", "auto")
+    return ALT_BUILD_VERSION if use == "auto" else bool(use)
+
+def editorDictionaries(note, ord):
+    return router.routeNote(note, ord, dictMan.getDictionaries())
+
+def onLoadNote(editor):
+    if personal:
+        # words added on the last note, chromium can reload now
+        personal.sync()
+    if editorChecker:
+        editorChecker.loadNote(editor)
+
+addHook("loadNote", onLoadNote)
+
+def onBridgeCmd(self, cmd, _old):
+    if editorChecker and editorChecker.onBridgeCmd(self, cmd):
+        return
+    return _old(self, cmd)
+
+Editor.onBridgeCmd = wrap(Editor.onBridgeCmd, onBridgeCmd, "around")
+
+
+@timings.timed("onEditFocusGained")
+def onEditFocusGained(note, ord, *args):
+    if not dictMan:
+        return
+    # first use of an editable webview loads the dictionaries, after that
+    # only switching to a field with a different routing does anything
+    langs = router.routeNote(note, ord, dictMan.getDictionaries())
+    if conf.get("detect_language", False) and 0 <= ord < len(note.fields):
+        langs = detector.pick(note.fields[ord], langs)
+    spellState.setLanguages(langs)
+    spellState.activate()
+
+addHook("editFocusGained", onEditFocusGained)
+
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2019-2021 Lovac42
+# Support: https://github.com/lovac42/SpellingPolice
+# License: GNU GPL, version 3 or later; http://www.gnu.org/copyleft/gpl.html
+
+
+# Every setSpellCheckLanguages call may make Chromium reload its hunspell
+# dictionaries, even with the same list. This keeps track of what was
+# applied to each QWebEngineProfile and only calls into it on change.
+#
+# Webviews are attached when they are created, but the languages are only
+# loaded once an editable webview is used (activate), so startup and the
+# reviewer don't pay for dictionaries that may never be needed.
+
+
+from .timing import timings
+
+
+class _Profile:
+    __slots__ = ("profile", "languages", "active")
+
+    def __init__(self, profile):
+        self.profile = profile
+        self.languages = [] # chromium starts with none
+        self.active = False
+
+
+class SpellCheckState:
+    def __init__(self, languages=()):
+        self.languages = list(languages)
+        self._profiles = {}
+        self._merged = None
+        self._extra = []
+        self.stats = {
+            "enabled": 0,    # setSpellCheckEnabled calls made
+            "languages": 0,  # setSpellCheckLanguages calls made
+            "skipped": 0,    # calls avoided because nothing changed
+            "deferred": 0,   # webviews created before languages were needed
+        }
+
+    def _get(self, p):
+        s = self._profiles.get(id(p))
+        if s is None or s.profile is not p:
+            s = self._profiles[id(p)] = _Profile(p)
+        return s
+
+    def setEnabled(self, p, b):
+        if p.isSpellCheckEnabled() == b:
+            self.stats["skipped"] += 1
+            return
+        p.setSpellCheckEnabled(b)
+        self.stats["enabled"] += 1
+        timings.count("setSpellCheckEnabled")
+
+    def _apply(self, s, languages):
+        languages = list(languages)
+        if self._merged and len(languages) > 1:
+            names, merged = self._merged
+            if frozenset(languages) == names:
+                languages = [merged]
+        if languages:
+            languages += self._extra
+        if s.languages == languages:
+            self.stats["skipped"] += 1
+            return
+        s.profile.setSpellCheckLanguages(languages)
+        s.languages = languages
+        self.stats["languages"] += 1
+        timings.count("setSpellCheckLanguages")
+
+    def attach(self, p, enabled):
+        "A new webview on p, languages wait for activate"
+        self.setEnabled(p, enabled)
+        s = self._get(p)
+        if not s.active:
+            self.stats["deferred"] += 1
+
+    def activate(self, p=None):
+        "Loads the languages into p, or every attached profile"
+        states = [self._get(p)] if p is not None else list(self._profiles.values())
+        for s in states:
+            s.active = True
+            self._apply(s, self.languages)
+
+    def setLanguages(self, languages):
+        "New dictionary list, applied now to the profiles already in use"
+        self.languages = list(languages)
+        for s in list(self._profiles.values()):
+            if s.active:
+                self._apply(s, self.languages)
+
+    def substitute(self, names, merged):
+        "Loads merged in place of exactly names, None to stop"
+        self._merged = (frozenset(names), merged) if merged else None
+        self.setLanguages(self.languages)
+
+    def setExtra(self, languages):
+        "Generated dictionaries loaded along with any others"
+        self._extra = list(languages)
+        self.setLanguages(self.languages)
+
+    def release(self, p):
+        "Unloads the languages, so the dictionary files can be renamed"
+        self._apply(self._get(p), [])
+
+    def restore(self, p):
+        s = self._get(p)
+        if s.active:
+            self._apply(s, self.languages)
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2019-2021 Lovac42
+# Support: https://github.com/lovac42/SpellingPolice
+# License: GNU GPL, version 3 or later; http://www.gnu.org/copyleft/gpl.html
+
+
+# Startup cost of the addon: import and profile load are timed and the
+# last launches are kept in user_files, so regressions show up over time.
+#
+# Must stay cheap to import.
+
+
+import json, os, time
+
+
+HISTORY = 30
+
+
+class StartupTimer:
+    def __init__(self):
+        self.phases = {} # name: ms
+        self._started = {}
+
+    def start(self, phase):
+        self._started[phase] = time.perf_counter()
+
+    def stop(self, phase):
+        t = self._started.pop(phase, None)
+        if t is not None:
+            self.phases[phase] = round((time.perf_counter() - t) * 1000, 2)
+
+    def save(self, path):
+        "Appends this launch to the history in path"
+        history = load(path)
+        history.append({
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "phases": dict(self.phases),
+        })
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(history[-HISTORY:], f, indent=1)
+        except OSError as e:
+            print("SpellingPolice: can't save startup times: %s"%e)
+
+
+def load(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return []
+
+
+def report(history):
+    if not history:
+        return "No launches recorded yet."
+    phases = []
+    for h in history:
+        for p in h["phases"]:
+            if p not in phases:
+                phases.append(p)
+    lines = ["%-20s"%"launch" + "".join("%12s"%p for p in phases)]
+    for h in reversed(history):
+        lines.append("%-20s"%h["time"] + "".join(
+            "%10.1fms"%h["phases"][p] if p in h["phases"] else "%12s"%"-"
+            for p in phases))
+    return "\n".join(lines)
+
+
+timer = StartupTimer()
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2019-2021 Lovac42
+# Support: https://github.com/lovac42/SpellingPolice
+# License: GNU GPL, version 3 or later; http://www.gnu.org/copyleft/gpl.html
+
+
+import os
+from pathlib import Path
+from aqt.qt import *
+
+from .const import *
+from .auditcache import dictFingerprint
+from .checker import makeExecutor
+from .symspell import SymSpellIndex, buildIndex, VERSION
+from .verdictcache import VerdictCache, CACHE_NAME
+
+
+class SuggestionEngine(QObject):
+    "Symmetric delete index over the enabled dictionaries, built in the background"
+
+    _done = pyqtSignal(object, object)
+
+    def __init__(self):
+        QObject.__init__(self)
+        self.index = None
+        self.path = None
+        self._future = None
+        self._building = None # path of the index being built
+        self.cache = None
+        # emitted from the worker thread, delivered on the main thread, so
+        # the old index is never closed under a running lookup
+        self._done.connect(self._built)
+
+    def update(self, dicts, maxDistance=2):
+        if not dicts:
+            self._future = self._building = None
+            self._setIndex(None, None)
+            return
+        fp = dictFingerprint(DICT_DIR, dicts)
+        path = os.path.join(CACHE_DIR, "symspell-%d-%d-%s.idx"%(
+            VERSION, maxDistance, fp[:16]))
+        if path == self.path or path == self._building:
+            return
+        self._future = self._building = None
+        self._resetCache(fp, maxDistance)
+        if os.path.exists(path):
+            self._load(path)
+            return
+
+        self._setIndex(None, None)
+        paths = [os.path.join(DICT_DIR, d+".bdic") for d in dicts]
+        ex = makeExecutor(1)
+        f = ex.submit(buildIndex, paths, path, maxDistance, cacheDir=CACHE_DIR)
+        self._future = f
+        self._building = path
+        f.add_done_callback(lambda f: self._done.emit(f, path))
+        ex.shutdown(wait=False)
+
+    def _resetCache(self, fp, maxDistance):
+        key = "symspell-%d-%d-%s"%(VERSION, maxDistance, fp)
+        if self.cache:
+            self.cache.flush()
+            self.cache.reset(key)
+        else:
+            Path(CACHE_DIR).mkdir(parents=True, exist_ok=True)
+            self.cache = VerdictCache(key, os.path.join(CACHE_DIR, CACHE_NAME))
+
+    def flush(self):
+        if self.cache:
+            self.cache.flush()
+
+    def _built(self, future, path):
+        if future is not self._future:
+            return # superseded by a newer build
+        self._future = self._building = None
+        try:
+            future.result()
+        except Exception as e:
+            print("SpellingPolice: can't build suggestion index: %s"%e)
+            return
+        self._load(path)
+
+    def _load(self, path):
+        try:
+            self._setIndex(SymSpellIndex(path), path)
+        except (OSError, ValueError) as e:
+            print("SpellingPolice: can't load suggestion index: %s"%e)
+            return
+        for fn in os.listdir(CACHE_DIR):
+            old = os.path.join(CACHE_DIR, fn)
+            if fn.startswith("symspell-") and old != path:
+                try:
+                    os.remove(old)
+                except OSError:
+                    pass
+
+    def _setIndex(self, index, path):
+        old = self.index
+        self.index, self.path = index, path
+        if old:
+            old.close()
+
+    def isReady(self):
+        return self.index is not None
+
+    def suggest(self, word, limit=8):
+        "None until the index is ready, the caller falls back to chromium then"
+        index = self.index
+        if not index or not word:
+            return None
+        return self.cache.suggestions(word, limit, index.lookup)
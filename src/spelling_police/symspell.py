@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2019-2021 Lovac42
+# Support: https://github.com/lovac42/SpellingPolice
+# License: GNU GPL, version 3 or later; http://www.gnu.org/copyleft/gpl.html
+
+
+# Symmetric delete (SymSpell) suggestion index.
+#
+# Words are grouped by their first prefixLength chars. For every group,
+# all strings reachable by deleting up to maxDistance chars from the prefix
+# are hashed. A lookup generates the same deletes for the misspelled word
+# and each one is a binary search, so the cost doesn't depend on the size
+# of the dictionary.
+#
+# File layout, all little endian:
+#   header
+#   uint32[nWords+1]     offsets into the word blob
+#   uint32[nPrefixes+1]  first word id of each prefix group
+#   word blob            utf-8, sorted by lowercase prefix
+#   uint64[nEntries]     sorted, 40 bit delete hash << 24 | prefix id
+#
+# Must not import aqt, the index is built in a worker process.
+
+
+import hashlib, mmap, os, struct
+from array import array
+from bisect import bisect_left
+
+from .dawg import Dawg, compileDictionary
+from .fileutil import replacing
+
+
+MAGIC = b"SPSY"
+VERSION = 2
+HEADER = struct.Struct("<4sHHHHIIII")
+
+ID_BITS = 24
+ID_MASK = (1 << ID_BITS) - 1
+MAX_WORDS = 1 << ID_BITS
+
+
+def deleteHash(s):
+    return int.from_bytes(
+        hashlib.blake2b(s.encode("utf-8"), digest_size=5).digest(), "little")
+
+
+def deletes(word, maxDistance):
+    ret = {word}
+    edge = {word}
+    for _ in range(maxDistance):
+        nxt = set()
+        for w in edge:
+            if len(w) <= 1:
+                continue
+            for i in range(len(w)):
+                nxt.add(w[:i] + w[i+1:])
+        nxt -= ret
+        ret |= nxt
+        edge = nxt
+    return ret
+
+
+def editDistance(a, b, limit):
+    "Optimal string alignment distance, or limit+1 if it exceeds limit"
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev2 = None
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        rowMin = i
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i-1] == b[j-1] else 1
+            v = min(prev[j] + 1, cur[j-1] + 1, prev[j-1] + cost)
+            if (prev2 is not None and i > 1 and j > 1
+                    and a[i-1] == b[j-2] and a[i-2] == b[j-1]):
+                v = min(v, prev2[j-2] + 1)
+            cur[j] = v
+            rowMin = min(rowMin, v)
+        if rowMin > limit:
+            return limit + 1
+        prev2, prev = prev, cur
+    return prev[-1]
+
+
+def writeIndex(words, path, maxDistance=2, prefixLength=7):
+    words = set(w for w in words if w)
+    words = sorted(words, key=lambda w: (w.lower()[:prefixLength], w))
+    words = words[:MAX_WORDS]
+
+    offsets = array("I", [0])
+    groups = array("I")
+    blob = bytearray()
+    # entries are bucketed by their top bits and each bucket sorted
+    # on its own, this keeps the peak memory of the sort down
+    buckets = [array("Q") for _ in range(16)]
+    prev = None
+    for wid, w in enumerate(words):
+        blob += w.encode("utf-8")
+        offsets.append(len(blob))
+        key = w.lower()[:prefixLength]
+        if key == prev:
+            continue
+        prev = key
+        pid = len(groups)
+        groups.append(wid)
+        for d in deletes(key, maxDistance):
+            e = deleteHash(d) << ID_BITS | pid
+            buckets[e >> 60].append(e)
+    groups.append(len(words))
+
+    pad = -(HEADER.size + (len(offsets) + len(groups))*4 + len(blob)) % 8
+    blobSize = len(blob) + pad
+    count = 0
+    with replacing(path) as f:
+        f.write(bytes(HEADER.size))
+        f.write(offsets.tobytes())
+        f.write(groups.tobytes())
+        f.write(blob + bytes(pad))
+        del blob
+        for i, b in enumerate(buckets):
+            b = array("Q", sorted(set(b)))
+            buckets[i] = None
+            f.write(b.tobytes())
+            count += len(b)
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, VERSION, maxDistance, prefixLength, 0,
+            len(words), len(groups) - 1, count, blobSize))
+    return len(words)
+
+
+def buildIndex(dictPaths, path, maxDistance=2, prefixLength=7, cacheDir=None):
+    """Worker entry point, builds the index from all word forms of the
+    dictionaries, compiling them into cacheDir first if needed"""
+    words = set()
+    for p in dictPaths:
+        with Dawg(compileDictionary(p, cacheDir or os.path.dirname(path))) as d:
+            words.update(d.words())
+    return writeIndex(words, path, maxDistance, prefixLength)
+
+
+class SymSpellIndex:
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, ver, self.maxDistance, self.prefixLength, _,
+            nWords, nPrefixes, nEntries, blobSize) = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or ver != VERSION:
+            self._mm.close()
+            raise ValueError("Not a suggestion index: %s"%path)
+        mv = memoryview(self._mm)
+        pos = HEADER.size
+        self._offsets = mv[pos:pos+4*(nWords+1)].cast("I")
+        pos += 4*(nWords+1)
+        self._groups = mv[pos:pos+4*(nPrefixes+1)].cast("I")
+        pos += 4*(nPrefixes+1)
+        self._blob = pos
+        pos += blobSize
+        self._entries = mv[pos:pos+8*nEntries].cast("Q")
+
+    def close(self):
+        self._offsets.release()
+        self._groups.release()
+        self._entries.release()
+        self._mm.close()
+
+    def word(self, wid):
+        a = self._blob + self._offsets[wid]
+        b = self._blob + self._offsets[wid+1]
+        return self._mm[a:b].decode("utf-8")
+
+    def _candidates(self, key):
+        entries = self._entries
+        for d in deletes(key, self.maxDistance):
+            lo = deleteHash(d) << ID_BITS
+            i = bisect_left(entries, lo)
+            hi = lo | ID_MASK
+            while i < len(entries) and entries[i] <= hi:
+                pid = entries[i] & ID_MASK
+                for wid in range(self._groups[pid], self._groups[pid+1]):
+                    yield wid
+                i += 1
+
+    def lookup(self, word, limit=8):
+        "Suggestions for word, closest first"
+        lower = word.lower()
+        seen = set()
+        found = []
+        for wid in self._candidates(lower[:self.prefixLength]):
+            if wid in seen:
+                continue
+            seen.add(wid)
+            cand = self.word(wid)
+            dist = editDistance(lower, cand.lower(), self.maxDistance)
+            if dist <= self.maxDistance:
+                found.append((dist, abs(len(cand) - len(word)), cand))
+        found.sort()
+        ret = []
+        for dist, _, cand in found:
+            if cand == word:
+                continue
+            ret.append(matchCase(word, cand))
+            if len(ret) >= limit:
+                break
+        return ret
+
+
+def matchCase(word, cand):
+    if word.isupper() and len(word) > 1:
+        return cand.upper()
+    if word[:1].isupper() and cand[:1].islower():
+        return cand[:1].upper() + cand[1:]
+    return cand
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2019-2021 Lovac42
+# Support: https://github.com/lovac42/SpellingPolice
+# License: GNU GPL, version 3 or later; http://www.gnu.org/copyleft/gpl.html
+
+
+# Opt-in timings of the hot paths, for the debug panel.
+#
+# Each name keeps its last RING_SIZE durations in a ring buffer and a
+# call count, counters only count. While disabled a timed call costs one
+# attribute check.
+#
+# Must not import aqt.
+
+
+import functools, time
+from array import array
+
+
+RING_SIZE = 512
+
+
+class _Ring:
+    __slots__ = ("samples", "pos", "count", "total")
+
+    def __init__(self):
+        self.samples = array("q", bytes(8 * RING_SIZE))
+        self.pos = 0
+        self.count = 0
+        self.total = 0
+
+    def add(self, ns):
+        self.samples[self.pos] = ns
+        self.pos = (self.pos + 1) % RING_SIZE
+        self.count += 1
+        self.total += ns
+
+    def values(self):
+        "Kept samples, oldest first"
+        if self.count < RING_SIZE:
+            return list(self.samples[:self.count])
+        return list(self.samples[self.pos:]) + list(self.samples[:self.pos])
+
+
+def percentile(values, q):
+    "values sorted"
+    if not values:
+        return 0
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+class _Span:
+    __slots__ = ("timings", "name", "t")
+
+    def __init__(self, timings, name):
+        self.timings = timings
+        self.name = name
+
+    def __enter__(self):
+        self.t = time.perf_counter_ns()
+
+    def __exit__(self, *args):
+        self.timings.record(self.name, time.perf_counter_ns() - self.t)
+
+
+class _NoSpan:
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *args):
+        pass
+
+_noSpan = _NoSpan()
+
+
+class Timings:
+    def __init__(self):
+        self.enabled = False
+        self.reset()
+
+    def reset(self):
+        self.rings = {}
+        self.counters = {}
+
+    def record(self, name, ns):
+        r = self.rings.get(name)
+        if r is None:
+            r = self.rings[name] = _Ring()
+        r.add(ns)
+
+    def count(self, name, n=1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def measure(self, name):
+        "with timings.measure(name): ..."
+        return _Span(self, name) if self.enabled else _noSpan
+
+    def timed(self, name):
+        "Decorator, times every call of the function as name"
+        def deco(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                t = time.perf_counter_ns()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.record(name, time.perf_counter_ns() - t)
+            return wrapper
+        return deco
+
+    def summary(self):
+        "{name: stats in ms} over the kept samples, calls counts all"
+        ret = {}
+        for name, r in sorted(self.rings.items()):
+            v = sorted(r.values())
+            ret[name] = {
+                "calls": r.count,
+                "mean_ms": round(r.total / r.count / 1e6, 3),
+                "p50_ms": round(percentile(v, 0.5) / 1e6, 3),
+                "p90_ms": round(percentile(v, 0.9) / 1e6, 3),
+                "p99_ms": round(percentile(v, 0.99) / 1e6, 3),
+                "max_ms": round(v[-1] / 1e6, 3),
+            }
+        return ret
+
+    def export(self):
+        "Everything, including the raw samples in ms"
+        return {
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "timings": self.summary(),
+            "counters": dict(self.counters),
+            "samples_ms": {name: [round(s / 1e6, 3) for s in r.values()]
+                for name, r in sorted(self.rings.items())},
+        }
+
+
+timings = Timings()
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2019-2021 Lovac42
+# Support: https://github.com/lovac42/SpellingPolice
+# License: GNU GPL, version 3 or later; http://www.gnu.org/copyleft/gpl.html
+
+
+import json
+from aqt import mw
+from aqt.qt import *
+from aqt.utils import getSaveFile, tooltip
+
+from .timing import timings, RING_SIZE
+
+
+COLUMNS = ("calls", "mean_ms", "p50_ms", "p90_ms", "p99_ms", "max_ms")
+
+
+class TimingDialog(QDialog):
+    def __init__(self, spellState=None):
+        QDialog.__init__(self, mw)
+        self.spellState = spellState
+        self.setWindowTitle("Spelling Police Timings")
+        self.resize(640, 400)
+        self._setupDialog()
+        self._update()
+        self.exec_()
+
+    def _setupDialog(self):
+        layout = QVBoxLayout()
+        self.status = QLabel()
+        self.status.setWordWrap(True)
+        layout.addWidget(self.status)
+        self.table = QTableWidget(0, len(COLUMNS))
+        self.table.setHorizontalHeaderLabels(COLUMNS)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        layout.addWidget(self.table)
+        self.counters = QLabel()
+        self.counters.setWordWrap(True)
+        layout.addWidget(self.counters)
+
+        buttons = QHBoxLayout()
+        for label, slot in (("Refresh", self._update),
+                ("Reset", self._reset), ("Export JSON", self._export)):
+            b = QPushButton(label)
+            b.clicked.connect(slot)
+            buttons.addWidget(b)
+        buttons.addStretch()
+        close = QPushButton("Close")
+        close.clicked.connect(self.accept)
+        buttons.addWidget(close)
+        layout.addLayout(buttons)
+        self.setLayout(layout)
+
+    def _data(self):
+        data = timings.export()
+        if self.spellState:
+            data["spell_check_state"] = dict(self.spellState.stats)
+        return data
+
+    def _update(self):
+        if timings.enabled:
+            self.status.setText("Percentiles over the last %d calls of "
+                "each hook."%RING_SIZE)
+        else:
+            self.status.setText("Timings are off, set debug_timings "
+                "to true in the addon config to record them.")
+        summary = timings.summary()
+        self.table.setRowCount(len(summary))
+        self.table.setVerticalHeaderLabels(list(summary))
+        for row, stats in enumerate(summary.values()):
+            for col, key in enumerate(COLUMNS):
+                self.table.setItem(row, col, QTableWidgetItem(str(stats[key])))
+        self.table.resizeColumnsToContents()
+
+        data = self._data()
+        counts = dict(data["counters"])
+        counts.update(("state." + k, v)
+            for k, v in data.get("spell_check_state", {}).items())
+        self.counters.setText("  ".join("%s: %d"%kv for kv in sorted(counts.items()))
+            or "No calls counted.")
+
+    def _reset(self):
+        timings.reset()
+        self._update()
+
+    def _export(self):
+        path = getSaveFile(self, "Export Timings", "spelling_police_timings",
+            "JSON", ".json", "spelling_police_timings.json")
+        if not path:
+            return
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self._data(), f, indent=1)
+        tooltip("Saved %s"%path)
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2019-2021 Lovac42
+# Support: https://github.com/lovac42/SpellingPolice
+# License: GNU GPL, version 3 or later; http://www.gnu.org/copyleft/gpl.html
+
+
+# Tokenizer for note fields.
+#
+# One pattern of the things to skip, every one of them starts with a
+# markup character. tokenize() blanks them out and finds the words in one
+# more pass. spans() matches a word and the gap of skips and non-letters
+# up to the next word in one go, so every match is a word and its
+# (start, end) span into the original field, which is what replacing a
+# word in place needs. Both give the same words.
+#
+# Skipped: html tags and entities, <style>/<script> bodies, [sound:],
+# [latex], [$], [$$], MathJax \(..\) and \[..\], and furigana readings
+# right after CJK text, "漢字[かんじ]". Cloze markers are dropped and their
+# hints skipped, the answer is checked like any other text. Nested clozes
+# work since a hint can't contain braces.
+#
+# Must not import aqt.
+
+
+import re, sys
+
+
+# kana, CJK ideographs and their iteration marks
+CJK = "\u3005-\u3007\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff"
+
+# no groups, so the word is the only group of RE_SPAN. Alternatives
+# are grouped by their first character, which lets the regex engine skip
+# ahead to the next markup character. A cloze hint is "::" up to "}}"
+SKIP = r"""
+    <(?:style\b.*?</style\s*>
+      |script\b.*?</script\s*>
+      |[^>]*>)
+  | &[#\w]+;
+  | \[(?:sound:[^\]]*\]
+      |latex\].*?\[/latex\]
+      |\$\$\].*?\[/\$\$\]
+      |\$\].*?\[/\$\]
+      |(?<=[%s]\[)[^\s\[\]<>]+\])
+  | \\(?:\(.*?\\\)
+      |\[.*?\\\])
+  | \{\{c\d+::
+  | ::[^{}]*?\}\}
+  | \}\}
+"""%CJK
+
+WORD = r"[^\W\d_]+(?:['’][^\W\d_]+)*"
+
+RE_SKIP = re.compile(SKIP, re.S | re.I | re.X)
+RE_WORD = re.compile(WORD)
+
+# possessive, a gap never gives anything back. Same matches without it,
+# only slower, and Python before 3.11 doesn't have it
+GAP = r"(?:%s|[\W\d_])*%s"%(SKIP, "+" if sys.version_info >= (3, 11) else "")
+
+RE_GAP = re.compile(GAP, re.S | re.I | re.X)
+RE_SPAN = re.compile(r"(%s)%s"%(WORD, GAP), re.S | re.I | re.X)
+
+
+def spans(html):
+    "(start, end) of every word in html"
+    start = RE_GAP.match(html).end()
+    return [m.span(1) for m in RE_SPAN.finditer(html, start)]
+
+
+def tokenize(html):
+    "The words of html"
+    # a space keeps the words on both sides of a skip apart
+    return RE_WORD.findall(RE_SKIP.sub(" ", html))
+
+
+def replaceWord(html, word, new):
+    "Replaces every occurrence of word in html, returns (html, count)"
+    out = []
+    last = n = 0
+    for start, end in spans(html):
+        if html[start:end] == word:
+            out.append(html[last:start])
+            out.append(new)
+            last = end
+            n += 1
+    if not n:
+        return html, 0
+    out.append(html[last:])
+    return "".join(out), n
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2019-2021 Lovac42
+# Support: https://github.com/lovac42/SpellingPolice
+# License: GNU GPL, version 3 or later; http://www.gnu.org/copyleft/gpl.html
+
+
+# Word verdicts and suggestions of one dictionary set.
+#
+# A bounded LRU in memory answers the words that keep coming back, an
+# optional sqlite file keeps them across sessions and processes. Rows are
+# keyed by the fingerprint of the dictionary set, so changing the enabled
+# dictionaries starts from scratch, and rows of sets that were not used
+# for a while are dropped. New rows are written in batches on flush().
+#
+# Must not import aqt, used from worker processes.
+
+
+import json, sqlite3, time
+from collections import OrderedDict
+
+
+CACHE_NAME = "verdicts.db"
+
+CACHE_SIZE = 50000    # words kept in memory
+PRUNE_AFTER = 30*86400 # seconds a dictionary set may stay unused
+FLUSH_AFTER = 1000    # pending rows
+
+
+class VerdictCache:
+    def __init__(self, fingerprint, path=None, size=CACHE_SIZE):
+        self.size = size
+        self.db = None
+        self.stats = {"hits": 0, "misses": 0, "diskHits": 0}
+        if path:
+            try:
+                self.db = sqlite3.connect(path, timeout=10)
+                self.db.execute("pragma journal_mode=wal")
+                self.db.executescript("""
+create table if not exists used (fingerprint text primary key, time integer);
+create table if not exists verdicts (
+    fingerprint text not null,
+    word text not null,
+    ok integer not null,
+    primary key (fingerprint, word)
+) without rowid;
+create table if not exists suggestions (
+    fingerprint text not null,
+    word text not null,
+    lim integer not null,
+    result text not null,
+    primary key (fingerprint, word, lim)
+) without rowid;""")
+            except sqlite3.Error as e:
+                print("SpellingPolice: can't open word cache: %s"%e)
+                self.db = None
+        self.reset(fingerprint)
+
+    def reset(self, fingerprint):
+        "Switches to another dictionary set"
+        self.fingerprint = fingerprint
+        self._verdicts = OrderedDict()
+        self._suggestions = OrderedDict()
+        self._pendingVerdicts = []
+        self._pendingSuggestions = []
+        self._absent = set() # not on disk as of the last prefetch
+        if not self.db:
+            return
+        now = int(time.time())
+        try:
+            with self.db:
+                self.db.execute("insert or replace into used values (?,?)",
+                    (fingerprint, now))
+                old = [r[0] for r in self.db.execute(
+                    "select fingerprint from used where time<?",
+                    (now - PRUNE_AFTER,))]
+                for fp in old:
+                    self.db.execute("delete from verdicts where fingerprint=?", (fp,))
+                    self.db.execute("delete from suggestions where fingerprint=?", (fp,))
+                    self.db.execute("delete from used where fingerprint=?", (fp,))
+        except sqlite3.Error as e:
+            print("SpellingPolice: can't update word cache: %s"%e)
+
+    def _remember(self, lru, key, value):
+        lru[key] = value
+        if len(lru) > self.size:
+            lru.popitem(last=False)
+
+    def prefetch(self, words):
+        "Loads the verdicts of words from disk with one query"
+        if not self.db:
+            return
+        lru = self._verdicts
+        todo = list({w for w in words if w not in lru})
+        self._absent = set(todo)
+        for i in range(0, len(todo), 500):
+            part = todo[i:i+500]
+            try:
+                rows = self.db.execute(
+                    "select word, ok from verdicts where fingerprint=? "
+                    "and word in (%s)"%",".join("?"*len(part)),
+                    [self.fingerprint] + part).fetchall()
+            except sqlite3.Error:
+                return
+            self.stats["diskHits"] += len(rows)
+            for w, ok in rows:
+                self._remember(lru, w, bool(ok))
+                self._absent.discard(w)
+
+    def known(self, word):
+        "The verdict of word in memory or None, after prefetch()"
+        ok = self._verdicts.get(word)
+        if ok is not None:
+            self._verdicts.move_to_end(word)
+            self.stats["hits"] += 1
+        return ok
+
+    def put(self, word, ok):
+        "Records the verdict of a word that known() didn't have"
+        self.stats["misses"] += 1
+        self._remember(self._verdicts, word, ok)
+        if self.db:
+            self._pendingVerdicts.append((self.fingerprint, word, int(ok)))
+            if len(self._pendingVerdicts) >= FLUSH_AFTER:
+                self.flush()
+
+    def isCorrect(self, word, check):
+        "The cached verdict of word, check(word) decides on a miss"
+        lru = self._verdicts
+        ok = lru.get(word)
+        if ok is not None:
+            lru.move_to_end(word)
+            self.stats["hits"] += 1
+            return ok
+        if self.db and word not in self._absent:
+            try:
+                row = self.db.execute("select ok from verdicts where "
+                    "fingerprint=? and word=?", (self.fingerprint, word)).fetchone()
+            except sqlite3.Error:
+                row = None
+            if row:
+                self.stats["hits"] += 1
+                self.stats["diskHits"] += 1
+                ok = bool(row[0])
+                self._remember(lru, word, ok)
+                return ok
+        ok = bool(check(word))
+        self.put(word, ok)
+        return ok
+
+    def suggestions(self, word, limit, suggest):
+        """The cached suggestions for word, suggest(word, limit) makes them
+        on a miss. None from suggest means not ready and is not cached"""
+        key = (word, limit)
+        lru = self._suggestions
+        ret = lru.get(key)
+        if ret is not None:
+            lru.move_to_end(key)
+            self.stats["hits"] += 1
+            return ret
+        if self.db:
+            try:
+                row = self.db.execute("select result from suggestions where "
+                    "fingerprint=? and word=? and lim=?",
+                    (self.fingerprint, word, limit)).fetchone()
+            except sqlite3.Error:
+                row = None
+            if row:
+                self.stats["hits"] += 1
+                self.stats["diskHits"] += 1
+                ret = json.loads(row[0])
+                self._remember(lru, key, ret)
+                return ret
+        self.stats["misses"] += 1
+        ret = suggest(word, limit)
+        if ret is None:
+            return None
+        self._remember(lru, key, ret)
+        if self.db:
+            self._pendingSuggestions.append((self.fingerprint, word, limit,
+                json.dumps(ret, ensure_ascii=False)))
+            if len(self._pendingSuggestions) >= FLUSH_AFTER:
+                self.flush()
+        return ret
+
+    def hitRate(self):
+        n = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / n if n else 0.0
+
+    def flush(self):
+        if not self.db or not (self._pendingVerdicts or self._pendingSuggestions):
+            return
+        try:
+            with self.db:
+                self.db.executemany("insert or ignore into verdicts "
+                    "values (?,?,?)", self._pendingVerdicts)
+                self.db.executemany("insert or ignore into suggestions "
+                    "values (?,?,?,?)", self._pendingSuggestions)
+        except sqlite3.Error as e:
+            print("SpellingPolice: can't write word cache: %s"%e)
+        self._pendingVerdicts = []
+        self._pendingSuggestions = []
+
+    def close(self):
+        self.flush()
+        if self.db:
+            self.db.close()
+            self.db = None
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2019-2021 Lovac42
+# Support: https://github.com/lovac42/SpellingPolice
+# License: GNU GPL, version 3 or later; http://www.gnu.org/copyleft/gpl.html
+
+
+# How often each word occurs in the collection, for ranking suggestions.
+#
+# An open addressing hash table in a memory mapped file: a header, then
+# the 64-bit word hashes and after them the 32-bit counts, both read
+# through memoryviews of the map. Words are case folded and only their
+# hash is kept, a collision merges two counts, which ranking can live
+# with. Counts go down to 0 but keys stay until the table grows, so
+# probing never needs tombstones.
+#
+# Must not import aqt.
+
+
+import hashlib, mmap, os, struct
+from collections import Counter
+
+from .tokenizer import tokenize
+
+
+MAGIC = b"SPWF"
+VERSION = 1
+HEADER = struct.Struct("<4sHHIIQ") # magic, version, 0, capacity, used, built
+MIN_CAPACITY = 1 << 16
+MAX_LOAD = 0.7
+MAX_COUNT = 0xFFFFFFFF
+
+
+def wordKey(word):
+    "Nonzero 64-bit hash of the case folded word, 0 marks an empty slot"
+    h = hashlib.blake2b(word.casefold().encode("utf-8"), digest_size=8)
+    return int.from_bytes(h.digest(), "little") or 1
+
+
+def countWords(flds):
+    "Counter of the words of a note's fields"
+    return Counter(tokenize(flds))
+
+
+def _create(path, capacity, built=0, entries=()):
+    "Writes an empty table, or one with the (key, count) entries"
+    keys = memoryview(bytearray(8 * capacity)).cast("Q")
+    counts = memoryview(bytearray(4 * capacity)).cast("I")
+    mask = capacity - 1
+    used = 0
+    for key, n in entries:
+        i = key & mask
+        while keys[i]:
+            i = (i + 1) & mask
+        keys[i] = key
+        counts[i] = n
+        used += 1
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, 0, capacity, used, built))
+        f.write(keys.cast("B"))
+        f.write(counts.cast("B"))
+    os.replace(tmp, path)
+
+
+class FrequencyTable:
+    def __init__(self, path):
+        self.path = path
+        self._mm = None
+        try:
+            self._open()
+        except (OSError, ValueError):
+            _create(path, MIN_CAPACITY)
+            self._open()
+
+    def _open(self):
+        with open(self.path, "r+b") as f:
+            mm = mmap.mmap(f.fileno(), 0)
+        if len(mm) < HEADER.size:
+            mm.close()
+            raise ValueError("Truncated word frequency table")
+        magic, version, _, cap, used, built = HEADER.unpack_from(mm, 0)
+        size = HEADER.size + 12 * cap
+        if (magic != MAGIC or version != VERSION or not cap
+                or cap & (cap - 1) or len(mm) != size):
+            mm.close()
+            raise ValueError("Not a word frequency table")
+        self._mm = mm
+        self.capacity = cap
+        self.used = used
+        self.built = built
+        view = memoryview(mm)
+        self._keys = view[HEADER.size:HEADER.size + 8*cap].cast("Q")
+        self._counts = view[HEADER.size + 8*cap:size].cast("I")
+        view.release()
+
+    def close(self):
+        if self._mm is None:
+            return
+        self._keys.release()
+        self._counts.release()
+        self._writeHeader()
+        self._mm.close()
+        self._mm = None
+
+    def _writeHeader(self):
+        HEADER.pack_into(self._mm, 0, MAGIC, VERSION, 0,
+            self.capacity, self.used, self.built)
+
+    def flush(self):
+        if self._mm is not None:
+            self._writeHeader()
+            self._mm.flush()
+
+    def clear(self, built=0):
+        "Empties the table, for a rebuild"
+        self.close()
+        _create(self.path, MIN_CAPACITY, built)
+        self._open()
+
+    def setBuilt(self, built):
+        self.built = built
+        self.flush()
+
+    def _slot(self, key):
+        keys = self._keys
+        mask = self.capacity - 1
+        i = key & mask
+        while True:
+            k = keys[i]
+            if k == key or not k:
+                return i
+            i = (i + 1) & mask
+
+    def count(self, word):
+        i = self._slot(wordKey(word))
+        return self._counts[i] if self._keys[i] else 0
+
+    def add(self, counts, sign=1):
+        "counts: {word: occurrences}, added or with sign -1 taken away"
+        for word, n in counts.items():
+            key = wordKey(word)
+            i = self._slot(key)
+            if not self._keys[i]:
+                if sign < 0:
+                    continue
+                if self.used + 1 > self.capacity * MAX_LOAD:
+                    self._grow()
+                    i = self._slot(key)
+                self._keys[i] = key
+                self.used += 1
+            self._counts[i] = max(0, min(MAX_COUNT, self._counts[i] + sign*n))
+
+    def update(self, old, new):
+        "Applies the change of a note's fields, both as field strings"
+        before = countWords(old) if old else Counter()
+        after = countWords(new) if new else Counter()
+        self.add(after - before)
+        self.add(before - after, -1)
+
+    def _grow(self):
+        # rehashed into a file twice the size, words counted 0 are dropped
+        entries = [(k, n) for k, n in zip(self._keys, self._counts) if k and n]
+        capacity = self.capacity * 2
+        while len(entries) + 1 > capacity * MAX_LOAD:
+            capacity *= 2
+        built = self.built
+        self.close()
+        _create(self.path, capacity, built, entries)
+        self._open()
+
+    def rank(self, words, limit=0):
+        """words ordered by how often they occur, ties keep their order.
+        limit, if set, keeps that many"""
+        counts = [self.count(w) for w in words]
+        order = sorted(range(len(words)), key=lambda i: -counts[i])
+        ret = [words[i] for i in order]
+        return ret[:limit] if limit else ret
@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2019-2021 Lovac42
+# Support: https://github.com/lovac42/SpellingPolice
+# License: GNU GPL, version 3 or later; http://www.gnu.org/copyleft/gpl.html
+
+
+# Personal word list.
+#
+#   <name>.words  sorted utf-8 words, one per line, memory mapped and
+#                 binary searched
+#   <name>.log    words added since the last compaction, appended in
+#                 batches so adding a word never rewrites the list
+#
+# A Bloom filter over both answers most lookups of unknown words with a
+# few hash probes. The log is folded into the sorted file on compact().
+#
+# Must not import aqt.
+
+
+import hashlib, mmap, os
+
+
+BLOOM_BITS_PER_WORD = 10
+BLOOM_HASHES = 7
+COMPACT_AFTER = 500 # logged words
+
+
+class BloomFilter:
+    def __init__(self, capacity):
+        self.size = max(1024, capacity * BLOOM_BITS_PER_WORD)
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _probes(self, word):
+        d = hashlib.blake2b(word.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(d[:8], "little")
+        h2 = int.from_bytes(d[8:], "little") | 1
+        size = self.size
+        return [(h1 + i*h2) % size for i in range(BLOOM_HASHES)]
+
+    def add(self, word):
+        bits = self.bits
+        for p in self._probes(word):
+            bits[p >> 3] |= 1 << (p & 7)
+
+    def __contains__(self, word):
+        bits = self.bits
+        for p in self._probes(word):
+            if not bits[p >> 3] & (1 << (p & 7)):
+                return False
+        return True
+
+
+class WordList:
+    def __init__(self, basePath):
+        self.path = basePath + ".words"
+        self.logPath = basePath + ".log"
+        self._mm = None
+        self._count = 0
+        self._logged = set()
+        self._pending = []
+        self.stats = {"lookups": 0, "bloomRejected": 0}
+        self.reload()
+
+    def reload(self):
+        self._close()
+        try:
+            with open(self.path, "rb") as f:
+                if os.fstat(f.fileno()).st_size:
+                    self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except OSError:
+            pass
+        self._logged = set(self._readLog())
+        self._count = sum(1 for _ in self._sortedWords())
+        self._bloom = BloomFilter(self._count + len(self._logged) + 1000)
+        for w in self._sortedWords():
+            self._bloom.add(w)
+        for w in self._logged:
+            self._bloom.add(w)
+
+    def _readLog(self):
+        try:
+            with open(self.logPath, encoding="utf-8") as f:
+                return [l.strip() for l in f if l.strip()]
+        except OSError:
+            return []
+
+    def _sortedWords(self):
+        mm = self._mm
+        if mm is None:
+            return
+        pos = 0
+        n = len(mm)
+        while pos < n:
+            nl = mm.find(b"\n", pos)
+            if nl < 0:
+                nl = n
+            if nl > pos:
+                yield mm[pos:nl].decode("utf-8", "replace")
+            pos = nl + 1
+
+    def _close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+
+    def close(self):
+        self.flush()
+        self._close()
+
+    def __len__(self):
+        return self._count + len(self._logged)
+
+    def _search(self, key):
+        "Binary search of the sorted file for key (bytes)"
+        mm = self._mm
+        if mm is None:
+            return False
+        lo, hi = 0, len(mm)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = mm.rfind(b"\n", 0, mid) + 1
+            end = mm.find(b"\n", mid)
+            if end < 0:
+                end = len(mm)
+            line = mm[start:end]
+            if line == key:
+                return True
+            if line < key:
+                lo = end + 1
+            else:
+                hi = start
+        return False
+
+    def __contains__(self, word):
+        self.stats["lookups"] += 1
+        if word not in self._bloom:
+            self.stats["bloomRejected"] += 1
+            return False
+        if word in self._logged:
+            return True
+        return self._search(word.encode("utf-8"))
+
+    def isCorrect(self, word):
+        if word in self:
+            return True
+        lower = word.lower()
+        return lower != word and lower in self
+
+    def add(self, word):
+        word = word.strip()
+        if not word or "\n" in word or word in self:
+            return False
+        self._logged.add(word)
+        self._pending.append(word)
+        self._bloom.add(word)
+        return True
+
+    def words(self):
+        "All words, sorted"
+        return sorted(set(self._sortedWords()) | self._logged)
+
+    def flush(self):
+        "Appends the words added since the last flush to the log"
+        if not self._pending:
+            return
+        os.makedirs(os.path.dirname(self.logPath) or ".", exist_ok=True)
+        with open(self.logPath, "a", encoding="utf-8") as f:
+            f.write("".join(w + "\n" for w in self._pending))
+        self._pending = []
+        if len(self._logged) >= COMPACT_AFTER:
+            self.compact()
+
+    def compact(self):
+        "Folds the log into the sorted file"
+        self.flush()
+        words = self.words()
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(b"".join(w.encode("utf-8") + b"\n" for w in words))
+        self._close()
+        os.replace(tmp, self.path)
+        try:
+            os.remove(self.logPath)
+        except OSError:
+            pass
+        self.reload()